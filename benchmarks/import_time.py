@@ -0,0 +1,72 @@
+"""
+Module: import_time.py
+Description: Import-time benchmark guarding the cold start of the airstack package.
+
+Usage:
+    python benchmarks/import_time.py [--budget-ms 100] [--runs 5]
+
+Exits with a non zero status if importing airstack.execute_query pulls in
+graphql-core or aiohttp, or if the best cumulative import time measured with
+`python -X importtime` is above the budget.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')
+MODULE = 'airstack.execute_query'
+HEAVY_MODULES = ('graphql', 'aiohttp')
+
+
+def _run(args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = SRC_DIR + os.pathsep + env.get('PYTHONPATH', '')
+    return subprocess.run([sys.executable] + args, env=env, check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+
+
+def import_time_us():
+    """Func to measure the cumulative import time of the module
+
+    Returns:
+        int: cumulative import time in microseconds
+    """
+    result = _run(['-X', 'importtime', '-c', 'import ' + MODULE])
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == MODULE:
+            return int(parts[1])
+    raise RuntimeError('import time of {} not found'.format(MODULE))
+
+
+def heavy_modules_loaded():
+    """Func to list the heavy dependencies loaded by importing the module
+
+    Returns:
+        list: names of heavy modules found in sys.modules
+    """
+    code = ('import sys, {module}; print(",".join(name for name in {heavy} '
+            'if name in sys.modules))').format(module=MODULE, heavy=HEAVY_MODULES)
+    return [name for name in _run(['-c', code]).stdout.strip().split(',') if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--budget-ms', type=float, default=100.0)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    loaded = heavy_modules_loaded()
+    best_ms = min(import_time_us() for _ in range(args.runs)) / 1000.0
+    print('import {}: {:.1f} ms (budget {:.1f} ms)'.format(MODULE, best_ms, args.budget_ms))
+    if loaded:
+        print('eagerly imported: {}'.format(', '.join(loaded)))
+    if loaded or best_ms > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+"""
+Module: __main__.py
+Description: This module runs the bulk command line entry point with `python -m airstack`.
+"""
+
+import sys
+from airstack.cli import main
+
+sys.exit(main())
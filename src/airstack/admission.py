@@ -0,0 +1,203 @@
+"""
+Module: admission.py
+Description: This module contains the bounded admission queue used to shed excess requests and schedule them by priority and tenant.
+"""
+
+import heapq
+import itertools
+import time
+from airstack.constant import AirstackConstants
+from airstack.deadline import LatencyTracker
+
+
+class AdmissionQueue:
+    """Class to bound the number of in-flight and waiting requests
+
+    At most `max_concurrency` requests are sent at the same time and at most
+    `max_queue` more wait for a slot. Requests beyond that are shed right away
+    instead of piling up in memory. Either limit is unbounded when None.
+
+    A free slot goes to the waiting request of the most urgent priority
+    class ('interactive', then 'normal', then 'bulk'), so bulk jobs only use
+    the capacity left over. Within a class, tenants share the slots in
+    proportion to their weight (weighted fair queuing on virtual finish
+    times). When the queue is full, a request sheds the least urgent waiting
+    request of a lower class rather than being shed itself.
+    """
+
+    def __init__(self, max_concurrency=AirstackConstants.MAX_CONCURRENCY,
+                 max_queue=AirstackConstants.MAX_QUEUE, requests_per_second=None,
+                 tenant_weights=None):
+        """Init function for admission queue
+
+        Args:
+            max_concurrency (int, optional): requests sent at the same time, unbounded
+            if None. Defaults to AirstackConstants.MAX_CONCURRENCY.
+            max_queue (int, optional): requests allowed to wait for a slot, unbounded
+            if None. Defaults to AirstackConstants.MAX_QUEUE.
+            requests_per_second (float, optional): requests started per second.
+            Defaults to None.
+            tenant_weights (dict, optional): tenant to its share weight, 1 if missing.
+            Defaults to None.
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.tenant_weights = tenant_weights or {}
+        self.rate_limiter = None
+        if requests_per_second is not None:
+            from airstack.rate_limiter import TokenBucket
+            self.rate_limiter = TokenBucket(requests_per_second)
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+        self.waits = {priority: LatencyTracker() for priority in
+                      AirstackConstants.PRIORITY_CLASSES}
+        self.served = {}
+        self._queues = {priority: [] for priority in AirstackConstants.PRIORITY_CLASSES}
+        self._virtual_time = {priority: 0.0 for priority in AirstackConstants.PRIORITY_CLASSES}
+        self._finish_tags = {}
+        self._order = itertools.count()
+        self._timer = None
+
+    async def acquire(self, priority=None, tenant=None):
+        """Async function to wait for a request slot
+
+        Args:
+            priority (str, optional): 'interactive', 'normal' or 'bulk'.
+            Defaults to 'normal'.
+            tenant (str, optional): tenant sharing the slots of its class by weight.
+            Defaults to None.
+
+        Returns:
+            bool: False if the request was shed
+        """
+        import asyncio
+        priority = priority or AirstackConstants.PRIORITY_NORMAL
+        if priority not in self._queues:
+            raise ValueError("priority must be one of {}.".format(
+                ', '.join(AirstackConstants.PRIORITY_CLASSES)))
+        started = time.monotonic()
+        if not self.waiting and self._has_slot() and \
+                (self.rate_limiter is None or self.rate_limiter.try_acquire() == 0):
+            self._admit(priority, tenant, started)
+            return True
+        if self.max_queue is not None and self.waiting >= self.max_queue and \
+                not self._shed_lower(priority):
+            self.shed += 1
+            return False
+        waiter = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._queues[priority],
+                       (self._finish_tag(priority, tenant), next(self._order), waiter, tenant))
+        self.waiting += 1
+        self._dispatch()
+        try:
+            admitted = await waiter
+        except asyncio.CancelledError:
+            if not waiter.done() or waiter.cancelled():
+                self.waiting -= 1
+            elif waiter.result():
+                self.release()
+            raise
+        if admitted:
+            self._record(priority, tenant, started)
+        return admitted
+
+    def release(self):
+        """Func to give back a request slot
+        """
+        self.in_flight -= 1
+        self._dispatch()
+
+    def metrics(self):
+        """Func to get the queue state
+
+        Returns:
+            dict: in flight, waiting and shed counters, waiting requests and p99 queue
+            wait per priority class, requests admitted per tenant
+        """
+        return {
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'shed': self.shed,
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'priorities': {
+                priority: {
+                    'waiting': sum(1 for entry in queue if not entry[2].done()),
+                    'wait_p99': self.waits[priority].percentile(99)
+                } for priority, queue in self._queues.items()
+            },
+            'tenants': dict(self.served)
+        }
+
+    def _has_slot(self):
+        return self.max_concurrency is None or self.in_flight < self.max_concurrency
+
+    def _admit(self, priority, tenant, started):
+        self.in_flight += 1
+        self._record(priority, tenant, started)
+
+    def _record(self, priority, tenant, started):
+        self.waits[priority].record(time.monotonic() - started)
+        self.served[tenant] = self.served.get(tenant, 0) + 1
+
+    def _finish_tag(self, priority, tenant):
+        """Func to get the virtual finish time of a new request of a tenant, one
+        request costing 1 / weight of virtual time"""
+        key = (priority, tenant)
+        start = max(self._virtual_time[priority], self._finish_tags.get(key, 0.0))
+        self._finish_tags[key] = start + 1.0 / self.tenant_weights.get(tenant, 1)
+        return self._finish_tags[key]
+
+    def _shed_lower(self, priority):
+        for lower in reversed(AirstackConstants.PRIORITY_CLASSES):
+            if lower == priority:
+                return False
+            queue = self._queues[lower]
+            live = [entry for entry in queue if not entry[2].done()]
+            if live:
+                victim = max(live)
+                queue.remove(victim)
+                heapq.heapify(queue)
+                self.waiting -= 1
+                self.shed += 1
+                victim[2].set_result(False)
+                return True
+        return False
+
+    def _dispatch(self):
+        while self.waiting and self._has_slot():
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.try_acquire()
+                if wait > 0:
+                    self._schedule_dispatch(wait)
+                    return
+            entry = self._pop()
+            if entry is None:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.tokens += 1
+                return
+            self.waiting -= 1
+            self.in_flight += 1
+            entry[2].set_result(True)
+
+    def _pop(self):
+        for priority in AirstackConstants.PRIORITY_CLASSES:
+            queue = self._queues[priority]
+            while queue:
+                finish_tag, _order, waiter, _tenant = heapq.heappop(queue)
+                if waiter.done():
+                    continue
+                self._virtual_time[priority] = finish_tag
+                return finish_tag, _order, waiter, _tenant
+        return None
+
+    def _schedule_dispatch(self, delay):
+        if self._timer is not None:
+            return
+        import asyncio
+
+        def dispatch():
+            self._timer = None
+            self._dispatch()
+        self._timer = asyncio.get_event_loop().call_later(delay, dispatch)
@@ -0,0 +1,453 @@
+"""
+Module: aggregations.py
+Description: This module contains the streaming aggregators of transfer and holder rows, exact and approximate.
+"""
+
+import hashlib
+import heapq
+import itertools
+import math
+import sys
+from decimal import Decimal, InvalidOperation
+from airstack.constant import AirstackConstants
+
+
+def field(row, path):
+    """Func to read a dotted field of a row, taking the first element of lists
+
+    Args:
+        row (dict): row
+        path (str): dotted field path, e.g. 'from.addresses'
+
+    Returns:
+        object: field value or None
+    """
+    value = row
+    for name in path.split('.'):
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if not isinstance(value, dict):
+            return None
+        value = value.get(name)
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return value
+
+
+def to_decimal(value):
+    """Func to convert an amount to an exact decimal
+
+    Args:
+        value (str|int|float): amount
+
+    Returns:
+        Decimal: amount, 0 if it is missing, invalid or not finite
+    """
+    if value in (None, ''):
+        return Decimal(0)
+    try:
+        result = Decimal(str(value))
+    except InvalidOperation:
+        return Decimal(0)
+    # NaN would make every later comparison of the aggregators raise
+    return result if result.is_finite() else Decimal(0)
+
+
+def _getter(spec):
+    if spec is None or callable(spec):
+        return spec
+    return lambda row: field(row, spec)
+
+
+def _key(value):
+    """Func to normalize a group key, interning strings so millions of rows of the
+    same address share one key object"""
+    if isinstance(value, str):
+        return sys.intern(value.lower())
+    return value
+
+
+def _hashes(value, count, size):
+    digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=16).digest()
+    first = int.from_bytes(digest[:8], 'little')
+    second = int.from_bytes(digest[8:], 'little') | 1
+    return [(first + index * second) % size for index in range(count)]
+
+
+class GroupBy:
+    """Class for exact row counts and amount sums per key
+
+    Memory grows with the number of distinct keys, not with the number of
+    rows; use CountMinSketch or HeavyHitters when even the keys do not fit.
+    """
+
+    def __init__(self, key, value=None):
+        """Init function for group by
+
+        Args:
+            key (str|func): dotted field path or function of the row giving its key,
+            e.g. 'from.addresses'
+            value (str|func, optional): dotted field path or function of the row giving
+            the amount summed, e.g. 'formattedAmount'. Defaults to None.
+        """
+        self.key = _getter(key)
+        self.value = _getter(value)
+        self.counts = {}
+        self.sums = {}
+
+    def add(self, row):
+        """Func to add a row
+
+        Args:
+            row (dict): row
+        """
+        key = _key(self.key(row))
+        if key is None:
+            return
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if self.value is not None:
+            self.sums[key] = self.sums.get(key, Decimal(0)) + to_decimal(self.value(row))
+
+    def top(self, k=AirstackConstants.AGGREGATION_TOP_K, by_count=False):
+        """Func to get the keys with the largest sums or counts
+
+        Args:
+            k (int, optional): keys returned. Defaults to AirstackConstants.AGGREGATION_TOP_K.
+            by_count (bool, optional): rank by row count instead of sum. Defaults to False.
+
+        Returns:
+            list: (key, sum or count) from the largest
+        """
+        totals = self.counts if by_count or self.value is None else self.sums
+        return heapq.nlargest(k, totals.items(), key=lambda item: item[1])
+
+    def result(self):
+        """Func to get the aggregate so far
+
+        Returns:
+            dict: key to its row count and amount sum
+        """
+        return {key: {'count': count, 'sum': self.sums.get(key)}
+                for key, count in self.counts.items()}
+
+
+class TopK:
+    """Class to keep the k rows with the largest amount, e.g. the largest transfers
+    """
+
+    def __init__(self, value, k=AirstackConstants.AGGREGATION_TOP_K):
+        """Init function for top k
+
+        Args:
+            value (str|func): dotted field path or function of the row giving its amount
+            k (int, optional): rows kept. Defaults to AirstackConstants.AGGREGATION_TOP_K.
+        """
+        self.value = _getter(value)
+        self.k = k
+        self.heap = []
+        self._order = itertools.count()
+
+    def add(self, row):
+        """Func to add a row
+
+        Args:
+            row (dict): row
+        """
+        entry = (to_decimal(self.value(row)), next(self._order), row)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry[0] > self.heap[0][0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def result(self):
+        """Func to get the rows kept so far
+
+        Returns:
+            list: rows from the largest amount
+        """
+        return [row for _value, _order, row in sorted(self.heap, reverse=True)]
+
+
+class HyperLogLog:
+    """Class to estimate the number of distinct keys in a fixed 2^precision bytes,
+    within about 1.04 / sqrt(2^precision) relative error
+    """
+
+    def __init__(self, key, precision=AirstackConstants.HYPERLOGLOG_PRECISION):
+        """Init function for hyperloglog
+
+        Args:
+            key (str|func): dotted field path or function of the row giving its key
+            precision (int, optional): bits of the register index, between 4 and 18.
+            Defaults to AirstackConstants.HYPERLOGLOG_PRECISION.
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18.")
+        self.key = _getter(key)
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, row):
+        """Func to add a row
+
+        Args:
+            row (dict): row
+        """
+        key = _key(self.key(row))
+        if key is None:
+            return
+        digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'little')
+        index = hashed & ((1 << self.precision) - 1)
+        rest = hashed >> self.precision
+        bits = 64 - self.precision
+        rank = bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Func to merge the keys of another sketch of the same precision
+
+        Args:
+            other (HyperLogLog): sketch
+        """
+        self.registers = bytearray(max(pair) for pair in zip(self.registers, other.registers))
+
+    def count(self):
+        """Func to estimate the number of distinct keys
+
+        Returns:
+            int: estimated distinct keys
+        """
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+    def result(self):
+        """Func to get the aggregate so far
+
+        Returns:
+            int: estimated distinct keys
+        """
+        return self.count()
+
+
+class CountMinSketch:
+    """Class to estimate the row count or amount sum of any key in fixed memory
+
+    Estimates never undercount, and overcount by at most e / width of the
+    total with probability 1 - exp(-depth).
+    """
+
+    def __init__(self, key, value=None, width=AirstackConstants.COUNT_MIN_WIDTH,
+                 depth=AirstackConstants.COUNT_MIN_DEPTH):
+        """Init function for count-min sketch
+
+        Args:
+            key (str|func): dotted field path or function of the row giving its key
+            value (str|func, optional): dotted field path or function of the row giving
+            the amount summed, rows are counted if missing. Defaults to None.
+            width (int, optional): counters per row.
+            Defaults to AirstackConstants.COUNT_MIN_WIDTH.
+            depth (int, optional): rows of counters.
+            Defaults to AirstackConstants.COUNT_MIN_DEPTH.
+        """
+        self.key = _getter(key)
+        self.value = _getter(value)
+        self.width = width
+        self.depth = depth
+        zero = Decimal(0) if value is not None else 0
+        self.table = [[zero] * width for _ in range(depth)]
+        self.total = zero
+
+    def add(self, row):
+        """Func to add a row
+
+        Args:
+            row (dict): row
+
+        Returns:
+            Decimal|int: estimate of the key of the row after adding it, None without a key
+        """
+        key = _key(self.key(row))
+        if key is None:
+            return None
+        return self.add_key(key, to_decimal(self.value(row)) if self.value is not None else 1)
+
+    def add_key(self, key, amount=1):
+        """Func to add an amount to a key
+
+        Args:
+            key (object): key
+            amount (Decimal|int, optional): amount. Defaults to 1.
+
+        Returns:
+            Decimal|int: estimate of the key after adding the amount
+        """
+        self.total += amount
+        estimate = None
+        for table_row, index in zip(self.table, _hashes(key, self.depth, self.width)):
+            table_row[index] += amount
+            if estimate is None or table_row[index] < estimate:
+                estimate = table_row[index]
+        return estimate
+
+    def estimate(self, key):
+        """Func to estimate the count or sum of a key
+
+        Args:
+            key (object): key
+
+        Returns:
+            Decimal|int: estimate, never below the exact value
+        """
+        key = _key(key)
+        return min(table_row[index] for table_row, index
+                   in zip(self.table, _hashes(key, self.depth, self.width)))
+
+    def result(self):
+        """Func to get the aggregate so far
+
+        Returns:
+            dict: total count or sum added
+        """
+        return {'total': self.total}
+
+
+class HeavyHitters:
+    """Class to find the keys with the largest counts or sums in fixed memory, e.g.
+    the top senders of a token with millions of transfers
+
+    A count-min sketch estimates every key and the k keys with the largest
+    estimates are kept as candidates.
+    """
+
+    def __init__(self, key, value=None, k=AirstackConstants.AGGREGATION_TOP_K,
+                 width=AirstackConstants.COUNT_MIN_WIDTH,
+                 depth=AirstackConstants.COUNT_MIN_DEPTH):
+        """Init function for heavy hitters
+
+        Args:
+            key (str|func): dotted field path or function of the row giving its key
+            value (str|func, optional): dotted field path or function of the row giving
+            the amount summed, rows are counted if missing. Defaults to None.
+            k (int, optional): keys kept. Defaults to AirstackConstants.AGGREGATION_TOP_K.
+            width (int, optional): counters per sketch row.
+            Defaults to AirstackConstants.COUNT_MIN_WIDTH.
+            depth (int, optional): sketch rows. Defaults to AirstackConstants.COUNT_MIN_DEPTH.
+        """
+        self.sketch = CountMinSketch(key, value, width, depth)
+        self.k = k
+        self.candidates = {}
+        self._floor = None
+
+    def add(self, row):
+        """Func to add a row
+
+        Args:
+            row (dict): row
+        """
+        key = _key(self.sketch.key(row))
+        if key is None:
+            return
+        estimate = self.sketch.add_key(key, to_decimal(self.sketch.value(row))
+                                       if self.sketch.value is not None else 1)
+        if key in self.candidates or len(self.candidates) < self.k:
+            self.candidates[key] = estimate
+            self._floor = None
+            return
+        if self._floor is None:
+            self._floor = min(self.candidates.values())
+        if estimate <= self._floor:
+            return
+        smallest = min(self.candidates, key=self.candidates.get)
+        del self.candidates[smallest]
+        self.candidates[key] = estimate
+        self._floor = None
+
+    def result(self):
+        """Func to get the aggregate so far
+
+        Returns:
+            list: (key, estimated count or sum) from the largest
+        """
+        return sorted(self.candidates.items(), key=lambda item: item[1], reverse=True)
+
+
+def concentration(totals, top=AirstackConstants.AGGREGATION_TOP_K):
+    """Func to measure how concentrated holdings are
+
+    Args:
+        totals (dict): holder to its amount, e.g. GroupBy.sums
+        top (int, optional): holders of the top share.
+        Defaults to AirstackConstants.AGGREGATION_TOP_K.
+
+    Returns:
+        dict: holders, total amount, share of the `top` largest holders, Herfindahl
+        index and Gini coefficient, None when nothing is held
+    """
+    amounts = sorted((to_decimal(amount) for amount in totals.values()), reverse=True)
+    amounts = [amount for amount in amounts if amount > 0]
+    total = sum(amounts, Decimal(0))
+    if not total:
+        return {'holders': 0, 'total': total, 'top_share': None, 'hhi': None, 'gini': None}
+    count = len(amounts)
+    weighted = sum((index + 1) * amount for index, amount in enumerate(reversed(amounts)))
+    return {
+        'holders': count,
+        'total': total,
+        'top_share': sum(amounts[:top], Decimal(0)) / total,
+        'hhi': sum((amount / total) ** 2 for amount in amounts),
+        'gini': (2 * weighted) / (count * total) - Decimal(count + 1) / count
+    }
+
+
+async def aggregate_pages(query_response, root, items, aggregators):
+    """Async function to feed every row of a paginated response to aggregators,
+    one page in memory at a time
+
+    Args:
+        query_response (QueryResponse): first page, e.g. of get_token_transfers
+        root (str): root field of the response, e.g. 'TokenTransfers'
+        items (str): field holding the list of rows, e.g. 'TokenTransfer'
+        aggregators (list): aggregators, readable while the pages are fetched
+
+    Returns:
+        Tuple: rows added, error or None
+    """
+    added = 0
+    while True:
+        if query_response.error is not None:
+            return added, query_response.error
+        for row in ((query_response.data or {}).get(root) or {}).get(items) or []:
+            for aggregator in aggregators:
+                aggregator.add(row)
+            added += 1
+        if not query_response.has_next_page:
+            return added, None
+        query_response = await query_response.get_next_page
+
+
+async def aggregate_stream(stream, aggregators):
+    """Async function to feed the rows of a crawl to aggregators as they arrive
+
+    Args:
+        stream (async iterator): (row, error) pairs, e.g. PartitionedCrawler.stream
+        aggregators (list): aggregators, readable while the crawl runs
+
+    Returns:
+        Tuple: rows added, first error or None
+    """
+    added, error = 0, None
+    async for row, row_error in stream:
+        if row_error is not None:
+            error = error or row_error
+            continue
+        for aggregator in aggregators:
+            aggregator.add(row)
+        added += 1
+    return added, error
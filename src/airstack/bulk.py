@@ -0,0 +1,100 @@
+"""
+Module: bulk.py
+Description: This module contains the helpers to fan many lookups into `_in` filter queries and regroup their rows.
+"""
+
+
+def distinct(values):
+    """Func to drop duplicate values, comparing strings case-insensitively as
+    addresses and identities are
+
+    Args:
+        values (iterable): values
+
+    Returns:
+        list: first seen spelling of every distinct value
+    """
+    seen = {}
+    for value in values:
+        seen.setdefault(value.lower() if isinstance(value, str) else value, value)
+    return list(seen.values())
+
+
+def chunked(values, size):
+    """Func to split values in chunks, dropping duplicates
+
+    Args:
+        values (iterable): values to split
+        size (int): chunk size
+
+    Returns:
+        list: lists of at most `size` distinct values, in first seen order
+    """
+    values = distinct(values)
+    return [values[index:index + size] for index in range(0, len(values), size)]
+
+
+async def fetch_all_rows(query_response, root, items):
+    """Async function to collect the rows of every page of a paginated response
+
+    Args:
+        query_response (QueryResponse): first page
+        root (str): root field of the response
+        items (str): field holding the list of rows
+
+    Returns:
+        Tuple: rows, error or None
+    """
+    rows = []
+    while True:
+        if query_response.error is not None:
+            return rows, query_response.error
+        rows.extend(((query_response.data or {}).get(root) or {}).get(items) or [])
+        if not query_response.has_next_page:
+            return rows, None
+        query_response = await query_response.get_next_page
+
+
+def group_by_owner(rows, identities):
+    """Func to regroup token balance rows by the identity they were asked for
+
+    A row belongs to the identity equal to its owner's identity or one of its
+    addresses, compared case-insensitively; every spelling of the same identity
+    gets the same rows. Rows of identities resolved by the api (e.g. ens names)
+    are grouped under their owner's first address.
+
+    Args:
+        rows (list): TokenBalance rows selecting `owner { identity addresses }`
+        identities (list): identities of the request
+
+    Returns:
+        dict: identity to its rows, every identity present
+    """
+    lookup = {}
+    for identity in identities:
+        lookup.setdefault(identity.lower(), [])
+    grouped = {identity: lookup[identity.lower()] for identity in identities}
+    for row in rows:
+        owner = row.get('owner') or {}
+        candidates = [owner.get('identity')] + list(owner.get('addresses') or [])
+        candidates = [candidate for candidate in candidates if candidate]
+        identity_rows = next((lookup[candidate.lower()] for candidate in candidates
+                              if candidate.lower() in lookup), None)
+        if identity_rows is None:
+            identity_rows = grouped.setdefault(candidates[0] if candidates else None, [])
+        identity_rows.append(row)
+    return grouped
+
+
+def group_by_address(rows, addresses):
+    """Func to regroup token rows by address
+
+    Args:
+        rows (list): Token rows selecting `address`
+        addresses (list): addresses of the request
+
+    Returns:
+        dict: address to its token, None if it was not found
+    """
+    found = {(row.get('address') or '').lower(): row for row in rows}
+    return {address: found.get(address.lower()) for address in addresses}
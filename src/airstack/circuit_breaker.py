@@ -0,0 +1,148 @@
+"""
+Module: circuit_breaker.py
+Description: This module contains the circuit breaker guarding the airstack endpoint.
+"""
+
+import time
+from collections import deque
+from airstack.constant import AirstackConstants
+
+
+class CircuitBreaker:
+    """Class to fail fast while the endpoint is degraded
+
+    The breaker keeps a rolling window of request outcomes. A request counts
+    as failed when it could not reach the server, got a 5xx/429 status or
+    was slower than `slow_call_threshold`. When the failure rate of the
+    window goes above `error_rate` the breaker opens and rejects every
+    request for `open_seconds`, then lets `half_open_probes` requests
+    through; if they succeed the breaker closes again, otherwise it re-opens.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, error_rate=AirstackConstants.BREAKER_ERROR_RATE,
+                 min_requests=AirstackConstants.BREAKER_MIN_REQUESTS,
+                 window=AirstackConstants.BREAKER_WINDOW,
+                 window_seconds=AirstackConstants.BREAKER_WINDOW_SECONDS,
+                 slow_call_threshold=AirstackConstants.BREAKER_SLOW_CALL_THRESHOLD,
+                 open_seconds=AirstackConstants.BREAKER_OPEN_SECONDS,
+                 half_open_probes=AirstackConstants.BREAKER_HALF_OPEN_PROBES):
+        """Init function for circuit breaker
+
+        Args:
+            error_rate (float, optional): failure rate that opens the breaker.
+            min_requests (int, optional): outcomes needed before the rate is used.
+            window (int, optional): maximum number of outcomes kept.
+            window_seconds (float, optional): maximum age of an outcome.
+            slow_call_threshold (float, optional): latency counted as a failure,
+            None to ignore latency.
+            open_seconds (float, optional): how long the breaker stays open.
+            half_open_probes (int, optional): requests let through while half open.
+        """
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.slow_call_threshold = slow_call_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.outcomes = deque(maxlen=window)
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.probes_in_flight = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow_request(self):
+        """Func to check if a request may be sent
+
+        Returns:
+            bool: False if the request must fail fast
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self.probes_in_flight = 0
+        if self.state == self.HALF_OPEN:
+            if self.probes_in_flight >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self.probes_in_flight += 1
+        return True
+
+    def record(self, status_code, latency):
+        """Func to record the outcome of a request
+
+        Args:
+            status_code (int): response status code, None if no response
+            latency (float): request latency in seconds
+        """
+        failed = status_code is None or status_code >= 500 or \
+            status_code == AirstackConstants.TOO_MANY_REQUESTS_STATUS_CODE
+        if self.slow_call_threshold is not None and latency > self.slow_call_threshold:
+            failed = True
+
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            if failed:
+                self._open()
+            else:
+                self.state = self.CLOSED
+                self.outcomes.clear()
+            return
+
+        now = time.monotonic()
+        self.outcomes.append((now, failed))
+        self._prune(now)
+        if self.state == self.CLOSED and len(self.outcomes) >= self.min_requests and \
+                self.failure_rate() >= self.error_rate:
+            self._open()
+
+    def release(self):
+        """Func to give back a half open probe whose request was cancelled
+        """
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def failure_rate(self):
+        """Func to get the failure rate of the rolling window
+
+        Returns:
+            float: failure rate between 0 and 1
+        """
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for _at, failed in self.outcomes if failed) / len(self.outcomes)
+
+    def metrics(self):
+        """Func to get the breaker state
+
+        Returns:
+            dict: state, failure rate and counters
+        """
+        if self.state == self.OPEN and \
+                time.monotonic() - self.opened_at >= self.open_seconds:
+            state = self.HALF_OPEN
+        else:
+            state = self.state
+        return {
+            'state': state,
+            'failure_rate': self.failure_rate(),
+            'window_size': len(self.outcomes),
+            'rejected': self.rejected,
+            'times_opened': self.times_opened
+        }
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.probes_in_flight = 0
+        self.times_opened += 1
+        self.outcomes.clear()
+
+    def _prune(self, now):
+        while self.outcomes and now - self.outcomes[0][0] > self.window_seconds:
+            self.outcomes.popleft()
@@ -0,0 +1,367 @@
+"""
+Module: cli.py
+Description: This module contains the bulk command line entry point, run with `python -m airstack` or `airstack`.
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import time
+from airstack.constant import AirstackConstants
+
+_USAGE = """Run queries or popular queries read from NDJSON or CSV and print the results as NDJSON.
+
+Every NDJSON input line is an object with either a `query` or a popular query `method`
+(e.g. get_token_details), `variables` and an optional `id`. CSV inputs have the same
+columns, with `variables` as a JSON object; any other column is a variable, decoded as
+JSON when it is valid JSON. Every page of every input is printed as one line with the
+input `line` number, `id`, `page` number, `status`, `data` and `error`, in order of
+completion."""
+
+
+def read_requests(lines, input_format):
+    """Func to parse input lines into requests
+
+    Args:
+        lines (iterable): input lines
+        input_format (str): 'ndjson' or 'csv'
+
+    Yields:
+        dict: request with its input `line` number, `id`, `query` or `method`,
+        `variables`, and the `error` of a line that could not be parsed
+    """
+    if input_format == 'csv':
+        reader = csv.DictReader(lines)
+        rows = ((reader.line_num, row) for row in reader)
+    else:
+        rows = _ndjson_rows(lines)
+    for line, row in rows:
+        if isinstance(row, Exception):
+            yield {'line': line, 'id': None, 'error': 'Invalid input line: {}'.format(row)}
+            continue
+        if input_format == 'csv':
+            row = _csv_request(row)
+        request = {'line': line, 'id': row.get('id'), 'query': row.get('query') or None,
+                   'method': row.get('method') or None, 'variables': row.get('variables') or {}}
+        if isinstance(request['variables'], str):
+            try:
+                request['variables'] = json.loads(request['variables'])
+            except ValueError as exec:
+                request['error'] = 'Invalid variables: {}'.format(exec)
+        if (request['query'] is None) == (request['method'] is None):
+            request['error'] = 'Every input needs exactly one of query and method'
+        yield request
+
+
+def _ndjson_rows(lines):
+    # numbered before blank lines are skipped, to match the lines of the input file
+    for line, text in enumerate(lines, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+            yield line, row if isinstance(row, dict) else ValueError('not a json object')
+        except ValueError as exec:
+            yield line, exec
+
+
+def _csv_request(row):
+    request = {key: row.pop(key, None) for key in ('id', 'query', 'method', 'variables')}
+    variables = {}
+    for key, value in row.items():
+        if key is None or value in (None, ''):
+            continue
+        try:
+            variables[key] = json.loads(value)
+        except ValueError:
+            variables[key] = value
+    if variables and not request['variables']:
+        request['variables'] = variables
+    return request
+
+
+class BulkRunner:
+    """Class to execute the requests of a bulk run with pagination, retries and
+    reuse of identical requests
+    """
+
+    def __init__(self, client, pages=1, retries=AirstackConstants.CLI_RETRIES,
+                 retry_backoff=AirstackConstants.CLI_RETRY_BACKOFF, cache=False):
+        """Init function for bulk runner
+
+        Args:
+            client (AirstackClient): api client
+            pages (int, optional): pages fetched per input, 0 for every page.
+            Defaults to 1.
+            retries (int, optional): retries of a failed request.
+            Defaults to AirstackConstants.CLI_RETRIES.
+            retry_backoff (float, optional): seconds before the first retry, doubled on
+            every retry. Defaults to AirstackConstants.CLI_RETRY_BACKOFF.
+            cache (bool, optional): run identical inputs once and reuse their pages.
+            Defaults to False.
+        """
+        from airstack.popular_queries import get_popular_queries
+        self.client = client
+        self.queries = client.queries_object()
+        self.popular_queries = get_popular_queries()
+        self.pages = pages
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.cache = {} if cache else None
+        self.inputs = 0
+        self.fetched = 0
+        self.cached = 0
+        self.retried = 0
+        self.errors = 0
+
+    async def execute(self, request):
+        """Async iterator of the output records of a request, one per page
+
+        Args:
+            request (dict): request from read_requests
+
+        Yields:
+            dict: output record
+        """
+        import asyncio
+        self.inputs += 1
+        if request.get('error') is None and request['method'] is not None and \
+                request['method'] not in self.popular_queries:
+            request['error'] = 'Unknown popular query: {}'.format(request['method'])
+        if request.get('error') is not None:
+            self.errors += 1
+            yield self._record(request, 0, None, None, request['error'])
+            return
+        if self.cache is None:
+            async for page, query_response in self._fetch(request):
+                yield self._page_record(request, page, query_response)
+            return
+        key = json.dumps([request['query'], request['method'], request['variables']],
+                         sort_keys=True)
+        pages = self.cache.get(key)
+        if pages is None:
+            pages = self.cache[key] = asyncio.get_event_loop().create_future()
+            fetched = []
+            try:
+                async for page, query_response in self._fetch(request):
+                    fetched.append((query_response.data, query_response.status_code,
+                                    query_response.error))
+                    yield self._page_record(request, page, query_response)
+            finally:
+                pages.set_result(fetched)
+            return
+        for page, (data, status_code, error) in enumerate(await pages):
+            self.cached += 1
+            if error is not None:
+                self.errors += 1
+            yield self._record(request, page, data, status_code, error)
+
+    def metrics(self):
+        """Func to get the run counters
+
+        Returns:
+            dict: inputs, pages fetched, pages reused, retries and failed pages
+        """
+        return {'inputs': self.inputs, 'pages': self.fetched, 'cached': self.cached,
+                'retries': self.retried, 'errors': self.errors}
+
+    async def _fetch(self, request):
+        """Async iterator of the pages of a request, retrying failed requests"""
+        query_response = await self._with_retries(lambda: self._first_page(request))
+        page = 0
+        while True:
+            yield page, query_response
+            page += 1
+            if query_response.error is not None or not query_response.has_next_page or \
+                    page == self.pages:
+                return
+            previous = query_response
+            retry = [False]
+
+            def next_page():
+                if not retry[0]:
+                    retry[0] = True
+                    return previous.get_next_page
+                execute_query = self.client.create_execute_query_object(
+                    query=previous.query, variables=dict(request['variables']))
+                return execute_query.get_next_page(previous.query, None, previous.page_info)
+            query_response = await self._with_retries(next_page)
+
+    def _first_page(self, request):
+        if request['method'] is not None:
+            return self.popular_queries[request['method']](self.queries,
+                                                           dict(request['variables']))
+        execute_query = self.client.create_execute_query_object(
+            query=request['query'], variables=dict(request['variables']))
+        if self.pages == 1:
+            return execute_query.execute_query()
+        return execute_query.execute_paginated_query()
+
+    async def _with_retries(self, send):
+        import asyncio
+        attempt = 0
+        while True:
+            query_response = await send()
+            if attempt == self.retries or not self._retryable(query_response):
+                self.fetched += 1
+                if query_response.error is not None:
+                    self.errors += 1
+                return query_response
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt * (0.5 + random.random()))
+            attempt += 1
+            self.retried += 1
+
+    @staticmethod
+    def _retryable(query_response):
+        if query_response.error is None or \
+                query_response.error == AirstackConstants.MIRROR_MISS_ERROR:
+            return False
+        status_code = query_response.status_code
+        return status_code is None or \
+            status_code == AirstackConstants.TOO_MANY_REQUESTS_STATUS_CODE or status_code >= 500
+
+    def _page_record(self, request, page, query_response):
+        return self._record(request, page, query_response.data, query_response.status_code,
+                            query_response.error)
+
+    @staticmethod
+    def _record(request, page, data, status_code, error):
+        return {'line': request['line'], 'id': request['id'], 'page': page,
+                'status': status_code, 'data': data, 'error': error}
+
+
+def parse_args(argv=None):
+    """Func to parse the command line arguments
+
+    Args:
+        argv (list, optional): arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: arguments
+    """
+    parser = argparse.ArgumentParser(prog='airstack', description=_USAGE,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', nargs='?', default='-',
+                        help='NDJSON or CSV file, - for stdin (default)')
+    parser.add_argument('-f', '--format', choices=('auto', 'ndjson', 'csv'), default='auto',
+                        help='input format, from the file extension by default')
+    parser.add_argument('-o', '--output', default='-', help='NDJSON file, - for stdout')
+    parser.add_argument('--api-key', default=os.environ.get('AIRSTACK_API_KEY'),
+                        help='api key, $AIRSTACK_API_KEY by default')
+    parser.add_argument('--url', action='append', help='api url, repeat to route across urls')
+    parser.add_argument('-c', '--concurrency', type=int,
+                        default=AirstackConstants.CLI_CONCURRENCY,
+                        help='inputs executed at the same time')
+    parser.add_argument('--requests-per-second', type=float, help='request rate limit')
+    parser.add_argument('--timeout', type=float, help='timeout of a request in seconds')
+    parser.add_argument('--pages', type=int, default=1,
+                        help='pages fetched per input, 0 for every page (default 1)')
+    parser.add_argument('--retries', type=int, default=AirstackConstants.CLI_RETRIES,
+                        help='retries of a request failing with a timeout, 429 or 5xx')
+    parser.add_argument('--retry-backoff', type=float,
+                        default=AirstackConstants.CLI_RETRY_BACKOFF,
+                        help='seconds before the first retry, doubled on every retry')
+    parser.add_argument('--cache', action='store_true',
+                        help='run identical inputs once and reuse their pages')
+    parser.add_argument('--mirror', help='SQLite file of a local mirror of popular queries')
+    parser.add_argument('--metadata-store', help='directory of the token and nft metadata store')
+    parser.add_argument('--progress', type=float, default=AirstackConstants.CLI_PROGRESS_INTERVAL,
+                        help='seconds between progress lines on stderr, 0 for the summary only')
+    parser.add_argument('-q', '--quiet', action='store_true', help='print no progress or summary')
+    args = parser.parse_args(argv)
+    if not args.api_key:
+        parser.error('an api key is required, with --api-key or $AIRSTACK_API_KEY')
+    if args.concurrency < 1:
+        parser.error('--concurrency must be at least 1')
+    if args.format == 'auto':
+        args.format = 'csv' if args.input.lower().endswith('.csv') else 'ndjson'
+    return args
+
+
+async def run(args, lines, output, progress):
+    """Async function to execute a bulk run
+
+    Args:
+        args (argparse.Namespace): arguments from parse_args
+        lines (iterable): input lines
+        output (file): file the NDJSON records are written to
+        progress (file): file the progress lines are written to, None for none
+
+    Returns:
+        dict: run counters
+    """
+    import asyncio
+    from airstack.execute_query import AirstackClient
+    from airstack.pipeline import Pipeline, Stage
+    client = AirstackClient(url=args.url, api_key=args.api_key, timeout=args.timeout,
+                            max_concurrency=args.concurrency,
+                            requests_per_second=args.requests_per_second,
+                            mirror=args.mirror, metadata_store=args.metadata_store)
+    runner = BulkRunner(client, pages=args.pages, retries=args.retries,
+                        retry_backoff=args.retry_backoff, cache=args.cache)
+    pipeline = Pipeline([Stage('execute', runner.execute, workers=args.concurrency,
+                               queue_size=args.concurrency)])
+    started = time.monotonic()
+    reporter = None
+    if progress is not None and args.progress > 0:
+        async def report():
+            while True:
+                await asyncio.sleep(args.progress)
+                _print_progress(progress, runner.metrics(), time.monotonic() - started)
+        reporter = asyncio.ensure_future(report())
+    try:
+        async for record, error in pipeline.stream(read_requests(lines, args.format)):
+            if error is not None:
+                runner.errors += 1
+                record = {'line': None, 'id': None, 'page': None, 'status': None,
+                          'data': None, 'error': error}
+            output.write(json.dumps(record) + '\n')
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        output.flush()
+        await client.close()
+    metrics = dict(runner.metrics(), elapsed=time.monotonic() - started)
+    if progress is not None:
+        _print_progress(progress, metrics, metrics['elapsed'], summary=True)
+    return metrics
+
+
+def _print_progress(progress, metrics, elapsed, summary=False):
+    rate = metrics['pages'] / elapsed if elapsed else 0.0
+    progress.write('{}{} inputs, {} pages ({:.1f}/s), {} reused, {} retries, {} errors, '
+                   '{:.1f}s\n'.format('done: ' if summary else '', metrics['inputs'],
+                                      metrics['pages'], rate, metrics['cached'],
+                                      metrics['retries'], metrics['errors'], elapsed))
+    progress.flush()
+
+
+def main(argv=None):
+    """Func to run the command line entry point
+
+    Args:
+        argv (list, optional): arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: exit status, 1 if any page failed
+    """
+    import asyncio
+    args = parse_args(argv)
+    progress = None if args.quiet else sys.stderr
+    input_file = sys.stdin if args.input == '-' else \
+        open(args.input, newline='', encoding='utf-8')
+    output_file = sys.stdout if args.output == '-' else \
+        open(args.output, 'w', encoding='utf-8')
+    try:
+        metrics = asyncio.run(run(args, input_file, output_file, progress))
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    return 1 if metrics['errors'] else 0
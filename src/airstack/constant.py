@@ -8,5 +8,94 @@ class AirstackConstants:
     """
     API_ENDPOINT_PROD = 'https://api.airstack.xyz/gql'
     API_TIMEOUT = 60
+    API_CONNECT_TIMEOUT = 10
     SUCCESS_STATUS_CODE = 200
     UNPROCESSABLE_STATUS_CODE = 422
+    TOO_MANY_REQUESTS_STATUS_CODE = 429
+    LATENCY_WINDOW = 200
+    HEDGE_PERCENTILE = 95
+    HEDGE_MIN_SAMPLES = 20
+    HEDGE_MIN_DELAY = 0.05
+    HEDGE_DEFAULT_DELAY = 1.0
+    DEADLINE_EXCEEDED_ERROR = 'Deadline exceeded'
+    DEADLINE_MIN_TIMEOUT = 0.001
+    TIMEOUT_ERROR = 'Request timed out'
+    BREAKER_ERROR_RATE = 0.5
+    BREAKER_MIN_REQUESTS = 20
+    BREAKER_WINDOW = 100
+    BREAKER_WINDOW_SECONDS = 60
+    BREAKER_SLOW_CALL_THRESHOLD = 30
+    BREAKER_OPEN_SECONDS = 30
+    BREAKER_HALF_OPEN_PROBES = 1
+    MAX_CONCURRENCY = 64
+    MAX_QUEUE = 10000
+    CIRCUIT_OPEN_ERROR = 'Circuit breaker is open'
+    REQUEST_SHED_ERROR = 'Request shed: admission queue is full'
+    SCHEMA_CACHE_SIZE = 512
+    DEFAULT_QUERY_LIMIT = 50
+    MAX_QUERY_LIMIT = 200
+    ENDPOINT_EWMA_ALPHA = 0.2
+    ENDPOINT_ERROR_PENALTY = 10.0
+    ENDPOINT_LOAD_PENALTY = 0.1
+    METADATA_STORE_MAX_BYTES = 512 * 1024 * 1024
+    METADATA_STORE_COMPACT_RATIO = 2
+    METADATA_STORE_MUTABLE_TTL = 24 * 60 * 60
+    MEDIA_URL_KEYS = ('tokenURI', 'image', 'animationUrl', 'original')
+    IPFS_GATEWAYS = ('https://ipfs.io/ipfs/', 'https://cloudflare-ipfs.com/ipfs/',
+                     'https://gateway.pinata.cloud/ipfs/', 'https://dweb.link/ipfs/')
+    MEDIA_CONCURRENCY = 256
+    MEDIA_PER_HOST = 16
+    MEDIA_MAX_BYTES = 50 * 1024 * 1024
+    MEDIA_TIMEOUT = 120
+    MEDIA_CHUNK_SIZE = 64 * 1024
+    MEDIA_JSON_SNIFF_BYTES = 64 * 1024
+    MEDIA_TOO_LARGE_ERROR = 'Media is larger than the size cap'
+    ENTITY_STORE_MAX_ENTITIES = 100000
+    SYNC_PAGE_LIMIT = 200
+    SYNC_EPOCH = '1970-01-01T00:00:00Z'
+    WATCH_MIN_INTERVAL = 15
+    WATCH_MAX_INTERVAL = 900
+    WATCH_BACKOFF = 1.5
+    WATCH_REQUESTS_PER_SECOND = 10
+    WATCH_MAX_CONCURRENT_POLLS = 32
+    OFFLOAD_THREAD = 'thread'
+    OFFLOAD_PROCESS = 'process'
+    OFFLOAD_THRESHOLD_BYTES = 256 * 1024
+    LOOP_LAG_INTERVAL = 0.05
+    BULK_CHUNK_SIZE = 100
+    CRAWL_CONCURRENCY = 8
+    CRAWL_SHARDS = 8
+    CRAWL_TOKEN_SHARD_SIZE = 200
+    HOLDER_BLOOM_CAPACITY = 100000
+    HOLDER_BLOOM_FALSE_POSITIVE_RATE = 0.01
+    MIRROR_STALENESS = {
+        'get_token_details': 24 * 60 * 60,
+        'get_nfts': 60 * 60,
+        'get_holders_of_collection': 10 * 60,
+        'get_ens_subdomains': 60 * 60
+    }
+    MIRROR_MISS_ERROR = 'Not in the local mirror'
+    PRIORITY_INTERACTIVE = 'interactive'
+    PRIORITY_NORMAL = 'normal'
+    PRIORITY_BULK = 'bulk'
+    PRIORITY_CLASSES = ('interactive', 'normal', 'bulk')
+    PAGE_CACHE_MAX_PAGES = 32
+    PAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    PAGE_CACHE_STALENESS = 60
+    PIPELINE_ASYNC = 'async'
+    PIPELINE_QUEUE_SIZE = 64
+    CLI_CONCURRENCY = 16
+    CLI_RETRIES = 3
+    CLI_RETRY_BACKOFF = 0.5
+    CLI_PROGRESS_INTERVAL = 5
+    TRANSPORT_AIOHTTP = 'aiohttp'
+    TRANSPORT_HTTP2 = 'http2'
+    AGGREGATION_TOP_K = 10
+    HYPERLOGLOG_PRECISION = 14
+    COUNT_MIN_WIDTH = 4096
+    COUNT_MIN_DEPTH = 4
+    COORDINATOR_SOCKET = '/tmp/airstack-coordinator.sock'
+    COORDINATOR_CACHE_TTL = 60
+    COORDINATOR_CACHE_MAX_ENTRIES = 10000
+    COORDINATOR_MAX_MESSAGE = 64 * 1024 * 1024
+    COORDINATOR_RECONNECT = 1.0
@@ -0,0 +1,425 @@
+"""
+Module: coordinator.py
+Description: This module contains the Unix socket sidecar sharing a rate limit, in-flight requests and a response cache between the processes of a host.
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import sys
+import time
+from collections import OrderedDict, deque
+from airstack.constant import AirstackConstants
+
+
+def request_key(api_key, data):
+    """Func to build the key identifying a request across processes
+
+    Args:
+        api_key (str): api key of the request
+        data (str): json request body
+
+    Returns:
+        str: sha256 of the api key and body
+    """
+    digest = hashlib.sha256((api_key or '').encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(data.encode('utf-8') if isinstance(data, str) else data)
+    return digest.hexdigest()
+
+
+class CoordinatorServer:
+    """Class for the sidecar coordinating every process of a host using one api key
+
+    Processes connect to a Unix socket and exchange newline delimited json
+    messages. `acquire` waits for a token of the host-wide bucket, first come
+    first served. `lookup` answers from the shared cache, waits for the same
+    request already in flight in another process, or makes the caller the
+    owner of the request, who reports its response with `complete`. A failed
+    or dropped owner hands the request over to the next waiting process.
+    """
+
+    def __init__(self, path, requests_per_second=None, burst=None,
+                 cache_ttl=AirstackConstants.COORDINATOR_CACHE_TTL,
+                 max_entries=AirstackConstants.COORDINATOR_CACHE_MAX_ENTRIES):
+        """Init function for coordinator server
+
+        Args:
+            path (str): Unix socket path
+            requests_per_second (float, optional): requests started per second by the
+            whole host, unlimited if missing. Defaults to None.
+            burst (float, optional): bucket size. Defaults to one second of requests.
+            cache_ttl (float, optional): seconds a successful response is served for,
+            0 to only share in-flight requests.
+            Defaults to AirstackConstants.COORDINATOR_CACHE_TTL.
+            max_entries (int, optional): responses cached.
+            Defaults to AirstackConstants.COORDINATOR_CACHE_MAX_ENTRIES.
+        """
+        self.path = path
+        self.bucket = None
+        if requests_per_second is not None:
+            from airstack.rate_limiter import TokenBucket
+            self.bucket = TokenBucket(requests_per_second, burst)
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.connections = 0
+        self.granted = 0
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+        self._bucket_lock = None
+        self._server = None
+        self._connection_ids = itertools.count()
+
+    async def start(self):
+        """Async function to listen on the socket, replacing a stale socket file
+        """
+        import asyncio
+        import os
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._bucket_lock = asyncio.Lock()
+        self._server = await asyncio.start_unix_server(
+            self._handle, path=self.path, limit=AirstackConstants.COORDINATOR_MAX_MESSAGE)
+
+    async def serve_forever(self):
+        """Async function to serve until cancelled
+        """
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """Async function to stop listening
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def metrics(self):
+        """Func to get the coordinator counters
+
+        Returns:
+            dict: connected processes, tokens granted, cache hits, requests shared with
+            an in-flight request, misses, cached responses and requests in flight
+        """
+        return {
+            'connections': self.connections,
+            'granted': self.granted,
+            'hits': self.hits,
+            'shared': self.shared,
+            'misses': self.misses,
+            'cached': len(self.cache),
+            'in_flight': len(self.in_flight)
+        }
+
+    async def _handle(self, reader, writer):
+        import asyncio
+        connection = next(self._connection_ids)
+        self.connections += 1
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                task = asyncio.ensure_future(self._answer(connection, writer, message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.CancelledError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            for task in tasks:
+                task.cancel()
+            for key in [key for key, entry in self.in_flight.items()
+                        if entry['owner'] == connection]:
+                self._hand_over(key, dropped=connection)
+            writer.close()
+
+    async def _answer(self, connection, writer, message):
+        operation = message.get('op')
+        if operation == 'acquire':
+            if self.bucket is not None:
+                async with self._bucket_lock:
+                    await self.bucket.acquire()
+            self.granted += 1
+            reply = {}
+        elif operation == 'lookup':
+            reply = await self._lookup(connection, writer, message)
+            if reply is None:
+                return
+        elif operation == 'complete':
+            self._complete(connection, message['key'], message.get('response'))
+            return
+        elif operation == 'metrics':
+            reply = self.metrics()
+        else:
+            reply = {'error': 'Unknown operation: {}'.format(operation)}
+        self._send(writer, dict(reply, id=message.get('id')))
+
+    async def _lookup(self, connection, writer, message):
+        key = message['key']
+        cached = self.cache.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return {'state': 'hit', 'key': key, 'response': cached[1]}
+            del self.cache[key]
+        entry = self.in_flight.get(key)
+        if entry is None:
+            self.in_flight[key] = {'owner': connection, 'waiters': deque()}
+            self.misses += 1
+            return {'state': 'miss', 'key': key}
+        self.shared += 1
+        entry['waiters'].append((connection, writer, message.get('id')))
+        return None
+
+    def _complete(self, connection, key, response):
+        entry = self.in_flight.get(key)
+        if entry is None or entry['owner'] != connection:
+            return
+        if response is None:
+            self._hand_over(key)
+            return
+        del self.in_flight[key]
+        if self.cache_ttl > 0:
+            self.cache[key] = (time.monotonic() + self.cache_ttl, response)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        for _connection, writer, message_id in entry['waiters']:
+            self._send(writer, {'id': message_id, 'state': 'hit', 'key': key,
+                                'response': response, 'shared': True})
+
+    def _hand_over(self, key, dropped=None):
+        """Func to give a request whose owner failed to its next waiting process"""
+        entry = self.in_flight[key]
+        while entry['waiters']:
+            connection, writer, message_id = entry['waiters'].popleft()
+            if connection == dropped or writer.is_closing():
+                continue
+            entry['owner'] = connection
+            self._send(writer, {'id': message_id, 'state': 'miss', 'key': key})
+            return
+        del self.in_flight[key]
+
+    @staticmethod
+    def _send(writer, reply):
+        if not writer.is_closing():
+            writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+
+class Coordinator:
+    """Class to reach the coordinator sidecar from a client
+
+    Requests are sent uncoordinated while the sidecar cannot be reached, and
+    the connection is retried every `reconnect` seconds.
+    """
+
+    def __init__(self, path, reconnect=AirstackConstants.COORDINATOR_RECONNECT):
+        """Init function for coordinator
+
+        Args:
+            path (str): Unix socket path of the sidecar
+            reconnect (float, optional): seconds between connection attempts.
+            Defaults to AirstackConstants.COORDINATOR_RECONNECT.
+        """
+        self.path = path
+        self.reconnect = reconnect
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+        self.unavailable = 0
+        self._writer = None
+        self._reader_task = None
+        self._loop = None
+        self._lock = None
+        self._pending = {}
+        self._ids = itertools.count()
+        self._failed_at = None
+
+    async def acquire(self):
+        """Async function to wait for a token of the host-wide bucket
+        """
+        await self._call({'op': 'acquire'})
+
+    async def send(self, api_key, data, send):
+        """Async function to send a request once for the whole host
+
+        Args:
+            api_key (str): api key of the request
+            data (str): json request body
+            send (func): coroutine function sending the request, returning the JSON
+            response or None, status code, error message or None
+
+        Returns:
+            Tuple: JSON response or None, response status code, error message or None
+        """
+        key = request_key(api_key, data)
+        reply = await self._call({'op': 'lookup', 'key': key})
+        if reply is None:
+            self.unavailable += 1
+            return await send()
+        if reply['state'] == 'hit':
+            if reply.get('shared'):
+                self.shared += 1
+            self.hits += 1
+            response = reply['response']
+            return response[0], response[1], None
+        self.misses += 1
+        result = None
+        try:
+            result = await send()
+        finally:
+            shared = [result[0], result[1]] if result is not None and \
+                result[2] is None else None
+            await self._call({'op': 'complete', 'key': key, 'response': shared}, reply=False)
+        return result
+
+    async def metrics_of_server(self):
+        """Async function to get the counters of the sidecar
+
+        Returns:
+            dict: sidecar counters, None if it cannot be reached
+        """
+        reply = await self._call({'op': 'metrics'})
+        if reply is not None:
+            reply.pop('id', None)
+        return reply
+
+    def metrics(self):
+        """Func to get the counters of this process
+
+        Returns:
+            dict: responses served by the sidecar, of which shared with a request in
+            flight in another process, requests sent for the host and requests sent
+            uncoordinated
+        """
+        return {'hits': self.hits, 'shared': self.shared, 'misses': self.misses,
+                'unavailable': self.unavailable}
+
+    async def close(self):
+        """Async function to close the connection to the sidecar
+        """
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        self._writer = None
+        self._reader_task = None
+
+    async def _call(self, message, reply=True):
+        import asyncio
+        if not await self._connect():
+            return None
+        message_id = next(self._ids)
+        future = None
+        if reply:
+            future = asyncio.get_event_loop().create_future()
+            self._pending[message_id] = future
+        try:
+            self._writer.write(json.dumps(dict(message, id=message_id)).encode('utf-8') + b'\n')
+            await self._writer.drain()
+            return await future if future is not None else None
+        except ConnectionError:
+            self._disconnect()
+            return None
+        finally:
+            self._pending.pop(message_id, None)
+
+    async def _connect(self):
+        import asyncio
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._writer = None
+        async with self._lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return True
+            if self._failed_at is not None and \
+                    time.monotonic() - self._failed_at < self.reconnect:
+                return False
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(
+                    self.path, limit=AirstackConstants.COORDINATOR_MAX_MESSAGE)
+            except OSError:
+                self._failed_at = time.monotonic()
+                self._writer = None
+                return False
+            self._failed_at = None
+            self._reader_task = asyncio.ensure_future(self._read(reader))
+            return True
+
+    async def _read(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                future = self._pending.get(reply.get('id'))
+                if future is not None and not future.done():
+                    future.set_result(reply)
+                elif reply.get('state') == 'miss' and self._writer is not None:
+                    self._writer.write(json.dumps({'op': 'complete', 'key': reply['key'],
+                                                   'response': None}).encode('utf-8') + b'\n')
+        except (ConnectionError, ValueError):
+            pass
+        self._disconnect()
+
+    def _disconnect(self):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError('Coordinator connection lost'))
+        self._pending.clear()
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
+        self._failed_at = time.monotonic()
+
+
+def main(argv=None):
+    """Func to run the coordinator sidecar, with `python -m airstack.coordinator`
+
+    Args:
+        argv (list, optional): arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: exit status
+    """
+    import asyncio
+    parser = argparse.ArgumentParser(
+        prog='python -m airstack.coordinator',
+        description='Share a rate limit, in-flight requests and a response cache between '
+                    'the processes of a host using AirstackClient(coordinator=socket).')
+    parser.add_argument('--socket', default=AirstackConstants.COORDINATOR_SOCKET,
+                        help='Unix socket path')
+    parser.add_argument('--requests-per-second', type=float, help='host-wide request rate')
+    parser.add_argument('--burst', type=float, help='requests allowed in a burst')
+    parser.add_argument('--cache-ttl', type=float,
+                        default=AirstackConstants.COORDINATOR_CACHE_TTL,
+                        help='seconds a response is shared, 0 to only share in-flight requests')
+    parser.add_argument('--max-entries', type=int,
+                        default=AirstackConstants.COORDINATOR_CACHE_MAX_ENTRIES,
+                        help='responses cached')
+    args = parser.parse_args(argv)
+    server = CoordinatorServer(args.socket, args.requests_per_second, args.burst,
+                               args.cache_ttl, args.max_entries)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,384 @@
+"""
+Module: crawler.py
+Description: This module contains the range partitioned parallel crawler of transfers and holders.
+"""
+
+import time
+from datetime import datetime, timezone
+from airstack.constant import AirstackConstants
+from airstack.delta_sync import SyncSpec
+
+_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+TOKEN_TRANSFERS_QUERY = """
+    query CrawlTokenTransfers($tokenAddress: Address, $blockchain: TokenBlockchain!, {variables}, $limit: Int) {{
+        TokenTransfers(
+            input: {{filter: {{tokenAddress: {{_eq: $tokenAddress}}, {filter}}}, blockchain: $blockchain, order: {{blockTimestamp: ASC}}, limit: $limit}}
+        ) {{
+            TokenTransfer {{
+            amount
+            blockNumber
+            blockTimestamp
+            from {{
+                addresses
+            }}
+            to {{
+                addresses
+            }}
+            tokenAddress
+            transactionHash
+            tokenId
+            tokenType
+            blockchain
+            }}
+            pageInfo {{
+            nextCursor
+            prevCursor
+            }}
+        }}
+    }}
+"""
+
+HOLDERS_QUERY = """
+    query CrawlHolders($tokenAddress: Address, $blockchain: TokenBlockchain!, {variables}, $limit: Int) {{
+        TokenBalances(
+            input: {{filter: {{tokenAddress: {{_eq: $tokenAddress}}, {filter}}}, blockchain: $blockchain, order: {{lastUpdatedTimestamp: ASC}}, limit: $limit}}
+        ) {{
+            TokenBalance {{
+            owner {{
+                addresses
+            }}
+            amount
+            formattedAmount
+            tokenAddress
+            tokenId
+            tokenType
+            blockchain
+            lastUpdatedBlock
+            lastUpdatedTimestamp
+            }}
+            pageInfo {{
+            nextCursor
+            prevCursor
+            }}
+        }}
+    }}
+"""
+
+
+def _crawl_spec(query, root, items, timestamp_field, block_field, id_fields):
+    def _range_query(value_type, field):
+        return query.format(variables='$from: {}, $to: {}'.format(value_type, value_type),
+                            filter=field + ': {_gte: $from, _lt: $to}')
+
+    return {
+        'time': SyncSpec(_range_query('Time', timestamp_field), root, items,
+                         timestamp_field, block_field, id_fields),
+        'block': SyncSpec(_range_query('Int', block_field), root, items,
+                          timestamp_field, block_field, id_fields),
+        'token': SyncSpec(query.format(variables='$tokenIds: [String!]',
+                                       filter='tokenId: {_in: $tokenIds}'), root, items,
+                          timestamp_field, block_field, id_fields)
+    }
+
+
+CRAWL_SPECS = {
+    'token_transfers': _crawl_spec(TOKEN_TRANSFERS_QUERY, 'TokenTransfers', 'TokenTransfer',
+                                   'blockTimestamp', 'blockNumber',
+                                   ('transactionHash', 'tokenId', 'from', 'to', 'amount')),
+    'holders': _crawl_spec(HOLDERS_QUERY, 'TokenBalances', 'TokenBalance',
+                           'lastUpdatedTimestamp', 'lastUpdatedBlock', ('owner', 'tokenId'))
+}
+
+
+def _to_number(value, partition):
+    if partition in ('block', 'token'):
+        return int(value)
+    parsed = datetime.strptime(value[:19] + 'Z', _TIME_FORMAT)
+    return int(parsed.replace(tzinfo=timezone.utc).timestamp())
+
+
+def _to_value(number, partition):
+    if partition == 'block':
+        return number
+    return datetime.fromtimestamp(number, timezone.utc).strftime(_TIME_FORMAT)
+
+
+def _boundary_key(value, partition):
+    # the second (or block) of a row, as compared with the split points
+    if partition == 'block':
+        return int(value)
+    return value[:19]
+
+
+class Shard:
+    """Class for a half-open range [start, end) of the partition field
+    """
+
+    def __init__(self, start, end):
+        """Init function for shard
+
+        Args:
+            start (int): first block number, epoch second or tokenId of the shard
+            end (int): block number, epoch second or tokenId after the shard
+        """
+        self.start = start
+        self.end = end
+
+
+class PartitionedCrawler:
+    """Class to crawl all transfers or holders of a token with concurrent shards
+
+    The block number or timestamp range is split in `shards` ranges crawled
+    concurrently, each with its own cursor. Rows come back oldest first, so
+    when a shard still has pages and a worker is idle, the rest of the shard
+    (from the last row seen) is split in two and handed to the idle workers.
+    Only rows sharing the timestamp or block of a split point can be returned
+    by two shards, so only those are remembered to yield them once.
+
+    With the 'token' partition, a range of numeric tokenIds is split in lists
+    of at most `AirstackConstants.CRAWL_TOKEN_SHARD_SIZE` ids. Rows are not
+    ordered by tokenId, so these shards are never split again, and each row
+    belongs to a single shard.
+    """
+
+    def __init__(self, client, concurrency=AirstackConstants.CRAWL_CONCURRENCY,
+                 shards=AirstackConstants.CRAWL_SHARDS,
+                 limit=AirstackConstants.SYNC_PAGE_LIMIT):
+        """Init function for partitioned crawler
+
+        Args:
+            client (AirstackClient): api client
+            concurrency (int, optional): shards crawled at the same time.
+            Defaults to AirstackConstants.CRAWL_CONCURRENCY.
+            shards (int, optional): initial number of shards.
+            Defaults to AirstackConstants.CRAWL_SHARDS.
+            limit (int, optional): page size. Defaults to AirstackConstants.SYNC_PAGE_LIMIT.
+        """
+        self.client = client
+        self.concurrency = concurrency
+        self.shards = shards
+        self.limit = limit
+        self.pages = 0
+        self.splits = 0
+        self.duplicates = 0
+
+    async def crawl_token_transfers(self, variables, start=None, end=None, partition='time'):
+        """Async function to get all transfers of a token
+
+        Args:
+            variables (dict): Variables required for the query.
+            - tokenAddress (Address): Token address.
+            - blockchain (TokenBlockchain): The blockchain type.
+            start (str|int, optional): first timestamp, block number or tokenId.
+            Defaults to the epoch for timestamps.
+            end (str|int, optional): timestamp, block number or tokenId after the crawl.
+            Defaults to now for timestamps.
+            partition (str, optional): 'time', 'block' or 'token'. Defaults to 'time'.
+
+        Returns:
+            Tuple: transfers, error or None
+        """
+        return await self.crawl('token_transfers', variables, start, end, partition)
+
+    async def crawl_holders(self, variables, start=None, end=None, partition='time'):
+        """Async function to get all holders of a collection
+
+        Args:
+            variables (dict): Variables required for the query.
+            - tokenAddress (Address): Token address.
+            - blockchain (TokenBlockchain): The blockchain type.
+            start (str|int, optional): first update timestamp, block number or tokenId.
+            Defaults to the epoch for timestamps.
+            end (str|int, optional): update timestamp, block number or tokenId after
+            the crawl. Defaults to now for timestamps.
+            partition (str, optional): 'time', 'block' or 'token'. Defaults to 'time'.
+
+        Returns:
+            Tuple: token balances, error or None
+        """
+        return await self.crawl('holders', variables, start, end, partition)
+
+    async def crawl(self, kind, variables, start=None, end=None, partition='time'):
+        """Async function to collect every row of a crawl
+
+        Args:
+            kind (str): key of CRAWL_SPECS
+            variables (dict): variables of the query, without the range
+            start (str|int, optional): start of the range. Defaults to None.
+            end (str|int, optional): end of the range. Defaults to None.
+            partition (str, optional): 'time', 'block' or 'token'. Defaults to 'time'.
+
+        Returns:
+            Tuple: rows, first error or None
+        """
+        rows, error = [], None
+        async for row, row_error in self.stream(kind, variables, start, end, partition):
+            if row_error is not None:
+                error = error or row_error
+            else:
+                rows.append(row)
+        return rows, error
+
+    async def stream(self, kind, variables, start=None, end=None, partition='time'):
+        """Async iterator of the rows of a crawl, in order of arrival
+
+        Args:
+            kind (str): key of CRAWL_SPECS
+            variables (dict): variables of the query, without the range
+            start (str|int, optional): start of the range. Defaults to None.
+            end (str|int, optional): end of the range. Defaults to None.
+            partition (str, optional): 'time', 'block' or 'token'. Defaults to 'time'.
+
+        Yields:
+            Tuple: row or None, error or None
+        """
+        import asyncio
+        if partition not in ('time', 'block', 'token'):
+            raise ValueError("partition must be 'time', 'block' or 'token'.")
+        if partition != 'time' and (start is None or end is None):
+            raise ValueError("start and end are required for a {} partition.".format(partition))
+        spec = CRAWL_SPECS[kind][partition]
+        start = _to_number(AirstackConstants.SYNC_EPOCH if start is None else start, partition)
+        end = int(time.time()) + 1 if end is None else _to_number(end, partition)
+        shards = asyncio.Queue()
+        for shard in self._initial_shards(start, end, partition):
+            shards.put_nowait(shard)
+        output = asyncio.Queue(maxsize=self.concurrency * 2)
+        state = {'pending': shards.qsize(), 'idle': 0}
+        if not state['pending']:
+            return
+        workers = [asyncio.ensure_future(self._worker(spec, partition, variables, shards,
+                                                      output, state))
+                   for _ in range(self.concurrency)]
+        field = spec.block_field if partition == 'block' else spec.timestamp_field
+        # ids of the rows at each split point, the only rows two shards can share
+        boundaries = {}
+        finished = 0
+        try:
+            while finished < len(workers):
+                page_rows, error = await output.get()
+                if page_rows is None and error is None:
+                    finished += 1
+                elif error is not None:
+                    yield None, error
+                elif isinstance(page_rows, _Boundary):
+                    boundaries.setdefault(page_rows.key, set()).update(page_rows.row_ids)
+                else:
+                    for row in page_rows:
+                        if boundaries and row.get(field) is not None:
+                            seen = boundaries.get(_boundary_key(row[field], partition))
+                            if seen is not None:
+                                row_id = spec.item_id(row)
+                                if row_id in seen:
+                                    self.duplicates += 1
+                                    continue
+                                seen.add(row_id)
+                        yield row, None
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    def metrics(self):
+        """Func to get the crawl counters
+
+        Returns:
+            dict: pages fetched, shard splits and duplicate rows dropped
+        """
+        return {'pages': self.pages, 'splits': self.splits, 'duplicates': self.duplicates}
+
+    def _initial_shards(self, start, end, partition):
+        if partition == 'token':
+            size = AirstackConstants.CRAWL_TOKEN_SHARD_SIZE
+            return [Shard(first, min(first + size, end)) for first in range(start, end, size)]
+        count = max(1, min(self.shards, end - start))
+        bounds = [start + (end - start) * index // count for index in range(count + 1)]
+        return [Shard(bounds[index], bounds[index + 1]) for index in range(count)
+                if bounds[index] < bounds[index + 1]]
+
+    async def _worker(self, spec, partition, variables, shards, output, state):
+        while True:
+            state['idle'] += 1
+            shard = await shards.get()
+            state['idle'] -= 1
+            if shard is None:
+                break
+            try:
+                await self._crawl_shard(spec, partition, variables, shard, shards,
+                                        output, state)
+            except Exception as exec:
+                await output.put((None, str(exec)))
+            state['pending'] -= 1
+            if not state['pending']:
+                for _ in range(self.concurrency):
+                    shards.put_nowait(None)
+        await output.put((None, None))
+
+    async def _crawl_shard(self, spec, partition, variables, shard, shards, output, state):
+        shard_variables = dict(variables, limit=variables.get('limit', self.limit))
+        if partition == 'token':
+            shard_variables['tokenIds'] = [str(token_id)
+                                           for token_id in range(shard.start, shard.end)]
+        else:
+            shard_variables['from'] = _to_value(shard.start, partition)
+            shard_variables['to'] = _to_value(shard.end, partition)
+        execute_query = self.client.create_execute_query_object(
+            query=spec.query, variables=shard_variables,
+            priority=AirstackConstants.PRIORITY_BULK)
+        query_response = await execute_query.execute_paginated_query()
+        field = spec.block_field if partition == 'block' else spec.timestamp_field
+        # rows sharing the partition value of the last row, across pages
+        tail_key, tail = None, []
+        while True:
+            self.pages += 1
+            if query_response.error is not None:
+                await output.put((None, query_response.error))
+                return
+            rows = ((query_response.data or {}).get(spec.root) or {}).get(spec.items) or []
+            await output.put((rows, None))
+            if not query_response.has_next_page or not rows:
+                return
+            if partition == 'token':
+                query_response = await query_response.get_next_page
+                continue
+            for row in rows:
+                if row.get(field) is None:
+                    continue
+                key = _boundary_key(row[field], partition)
+                if key != tail_key:
+                    tail_key, tail = key, []
+                tail.append(row)
+            if state['idle'] and tail and await self._split(spec, partition, tail, shard,
+                                                            shards, output, state):
+                return
+            query_response = await query_response.get_next_page
+
+    async def _split(self, spec, partition, tail, shard, shards, output, state):
+        field = spec.block_field if partition == 'block' else spec.timestamp_field
+        resume = _to_number(tail[-1][field], partition)
+        if resume <= shard.start or shard.end - resume < 2:
+            return False
+        # the rows at the split point go first, so the new shards find them
+        await output.put((_Boundary(_boundary_key(tail[-1][field], partition),
+                                    [spec.item_id(row) for row in tail]), None))
+        middle = resume + (shard.end - resume) // 2
+        shards.put_nowait(Shard(resume, middle))
+        shards.put_nowait(Shard(middle, shard.end))
+        state['pending'] += 2
+        self.splits += 1
+        return True
+
+
+class _Boundary:
+    """Class for the rows already yielded at a split point
+    """
+
+    def __init__(self, key, row_ids):
+        """Init function for boundary
+
+        Args:
+            key (str|int): second or block of the split point
+            row_ids (list): ids of the rows yielded at the split point
+        """
+        self.key = key
+        self.row_ids = row_ids
@@ -0,0 +1,163 @@
+"""
+Module: deadline.py
+Description: This module contains the deadline, latency tracking and request hedging helpers.
+"""
+
+import time
+from collections import deque
+from airstack.constant import AirstackConstants
+
+
+class Deadline:
+    """Class to track a time budget shared by one or more requests
+    """
+
+    def __init__(self, seconds):
+        """Init function for deadline
+
+        Args:
+            seconds (float): time budget in seconds, starting now.
+        """
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        """Func to get the remaining time budget
+
+        Returns:
+            float: remaining seconds, never negative
+        """
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        """Func to check if the time budget is used up
+
+        Returns:
+            bool: True if no time is left
+        """
+        return self.remaining() <= 0
+
+
+def to_deadline(deadline):
+    """Func to normalise a deadline argument
+
+    Args:
+        deadline (Deadline|float|None): deadline object or budget in seconds
+
+    Returns:
+        Deadline: deadline object or None
+    """
+    if deadline is None or isinstance(deadline, Deadline):
+        return deadline
+    return Deadline(deadline)
+
+
+def build_timeout(total=None, connect=None, read=None, deadline=None):
+    """Func to build the aiohttp timeout for a single request
+
+    The total timeout is capped by whatever is left of the deadline, so a
+    request started late in a crawl never outlives the crawl budget. It is
+    never 0, which aiohttp reads as no timeout: an expired deadline gives the
+    smallest timeout, AirstackConstants.DEADLINE_MIN_TIMEOUT.
+
+    Args:
+        total (float, optional): total timeout for the request. Defaults to None.
+        connect (float, optional): connection timeout. Defaults to None.
+        read (float, optional): socket read timeout. Defaults to None.
+        deadline (Deadline, optional): shared deadline. Defaults to None.
+
+    Returns:
+        aiohttp.ClientTimeout: timeout object
+    """
+    import aiohttp
+    if deadline is not None:
+        remaining = max(AirstackConstants.DEADLINE_MIN_TIMEOUT, deadline.remaining())
+        total = remaining if total is None else min(total, remaining)
+    return aiohttp.ClientTimeout(total=total, sock_connect=connect, sock_read=read)
+
+
+class LatencyTracker:
+    """Class to keep a rolling window of request latencies
+    """
+
+    def __init__(self, window=AirstackConstants.LATENCY_WINDOW):
+        """Init function for latency tracker
+
+        Args:
+            window (int, optional): number of samples to keep.
+            Defaults to AirstackConstants.LATENCY_WINDOW.
+        """
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        """Func to record a request latency
+
+        Args:
+            seconds (float): request latency in seconds
+        """
+        self.samples.append(seconds)
+
+    def percentile(self, percent):
+        """Func to get a latency percentile
+
+        Args:
+            percent (float): percentile between 0 and 100
+
+        Returns:
+            float: latency in seconds or None if there are no samples
+        """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    def hedge_delay(self, percent=AirstackConstants.HEDGE_PERCENTILE):
+        """Func to get the delay before a hedged request is fired
+
+        Args:
+            percent (float, optional): latency percentile to wait for.
+            Defaults to AirstackConstants.HEDGE_PERCENTILE.
+
+        Returns:
+            float: delay in seconds
+        """
+        if len(self.samples) < AirstackConstants.HEDGE_MIN_SAMPLES:
+            return AirstackConstants.HEDGE_DEFAULT_DELAY
+        return max(AirstackConstants.HEDGE_MIN_DELAY, self.percentile(percent))
+
+
+async def hedge_request(request, delay):
+    """Async function to run a request with a hedged duplicate
+
+    The request is started once, and if it has not finished after `delay`
+    seconds a duplicate is fired. The first successful response wins and
+    the other request is cancelled.
+
+    Args:
+        request (func): coroutine function returning a QueryResponse
+        delay (float): seconds to wait before firing the duplicate
+
+    Returns:
+        object: first successful QueryResponse, or the last failed one
+    """
+    import asyncio
+    pending = {asyncio.ensure_future(request())}
+    hedged = False
+    response = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=None if hedged else delay,
+                return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                response = task.result()
+                if response.error is None:
+                    return response
+            if not hedged:
+                hedged = True
+                pending.add(asyncio.ensure_future(request()))
+        return response
+    finally:
+        for task in pending:
+            task.cancel()
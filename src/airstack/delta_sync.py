@@ -0,0 +1,342 @@
+"""
+Module: delta_sync.py
+Description: This module contains the incremental delta sync of token transfers and balances.
+"""
+
+import json
+import os
+import time
+from airstack.constant import AirstackConstants
+
+TOKEN_TRANSFERS_QUERY = """
+    query SyncTokenTransfers($tokenAddress: Address, $blockchain: TokenBlockchain!, $since: Time, $limit: Int) {
+        TokenTransfers(
+            input: {filter: {tokenAddress: {_eq: $tokenAddress}, blockTimestamp: {_gte: $since}}, blockchain: $blockchain, order: {blockTimestamp: DESC}, limit: $limit}
+        ) {
+            TokenTransfer {
+            amount
+            blockNumber
+            blockTimestamp
+            from {
+                addresses
+            }
+            to {
+                addresses
+            }
+            tokenAddress
+            transactionHash
+            tokenId
+            tokenType
+            blockchain
+            }
+            pageInfo {
+            nextCursor
+            prevCursor
+            }
+        }
+    }
+"""
+
+NFT_TRANSFERS_QUERY = """
+    query SyncNftTransfers($tokenAddress: Address, $tokenId: String, $blockchain: TokenBlockchain!, $since: Time, $limit: Int) {
+        TokenTransfers(
+            input: {filter: {tokenAddress: {_eq: $tokenAddress}, tokenId: {_eq: $tokenId}, blockTimestamp: {_gte: $since}}, blockchain: $blockchain, order: {blockTimestamp: DESC}, limit: $limit}
+        ) {
+            TokenTransfer {
+            amount
+            blockNumber
+            blockTimestamp
+            from {
+                addresses
+            }
+            to {
+                addresses
+            }
+            tokenAddress
+            transactionHash
+            tokenId
+            tokenType
+            blockchain
+            }
+            pageInfo {
+            nextCursor
+            prevCursor
+            }
+        }
+    }
+"""
+
+TOKEN_BALANCES_QUERY = """
+    query SyncTokenBalances($tokenAddress: Address, $blockchain: TokenBlockchain!, $since: Time, $limit: Int) {
+        TokenBalances(
+            input: {filter: {tokenAddress: {_eq: $tokenAddress}, lastUpdatedTimestamp: {_gte: $since}}, blockchain: $blockchain, order: {lastUpdatedTimestamp: DESC}, limit: $limit}
+        ) {
+            TokenBalance {
+            owner {
+                addresses
+            }
+            amount
+            formattedAmount
+            tokenAddress
+            tokenId
+            tokenType
+            blockchain
+            lastUpdatedBlock
+            lastUpdatedTimestamp
+            }
+            pageInfo {
+            nextCursor
+            prevCursor
+            }
+        }
+    }
+"""
+
+
+class SyncSpec:
+    """Class to describe how one kind of items is synced
+    """
+
+    def __init__(self, query, root, items, timestamp_field, block_field, id_fields):
+        """Init function for sync spec
+
+        Args:
+            query (str): GraphQL query, newest first, taking a `$since` filter
+            root (str): root field of the response
+            items (str): field holding the list of items
+            timestamp_field (str): field used as high-water mark
+            block_field (str): block number field kept alongside the timestamp
+            id_fields (tuple): fields identifying an item
+        """
+        self.query = query
+        self.root = root
+        self.items = items
+        self.timestamp_field = timestamp_field
+        self.block_field = block_field
+        self.id_fields = id_fields
+
+    def item_id(self, item):
+        """Func to get the identity of an item
+
+        Args:
+            item (dict): item of the response
+
+        Returns:
+            str: json encoded identity
+        """
+        return json.dumps([item.get(field) for field in self.id_fields], sort_keys=True)
+
+
+SYNC_SPECS = {
+    'token_transfers': SyncSpec(TOKEN_TRANSFERS_QUERY, 'TokenTransfers', 'TokenTransfer',
+                                'blockTimestamp', 'blockNumber',
+                                ('transactionHash', 'tokenId', 'from', 'to', 'amount')),
+    'nft_transfers': SyncSpec(NFT_TRANSFERS_QUERY, 'TokenTransfers', 'TokenTransfer',
+                              'blockTimestamp', 'blockNumber',
+                              ('transactionHash', 'tokenId', 'from', 'to', 'amount')),
+    'token_balances': SyncSpec(TOKEN_BALANCES_QUERY, 'TokenBalances', 'TokenBalance',
+                               'lastUpdatedTimestamp', 'lastUpdatedBlock',
+                               ('owner', 'tokenId', 'lastUpdatedBlock', 'amount'))
+}
+
+
+class SyncResult:
+    """Class for the outcome of one incremental sync
+    """
+
+    def __init__(self, items, pages, high_water_mark, error=None):
+        """Init function for sync result
+
+        Args:
+            items (list): new items since the previous sync, newest first
+            pages (int): pages fetched
+            high_water_mark (dict): high-water mark after the sync
+            error (str, optional): error if there. Defaults to None.
+        """
+        self.items = items
+        self.pages = pages
+        self.high_water_mark = high_water_mark
+        self.error = error
+
+
+class SyncState:
+    """Class to persist the high-water marks in a json file
+    """
+
+    def __init__(self, path=None):
+        """Init function for sync state
+
+        Args:
+            path (str, optional): json file of the state, kept in memory only if None.
+            Defaults to None.
+        """
+        self.path = path
+        self.marks = {}
+        if path is not None and os.path.exists(path):
+            with open(path, encoding='utf-8') as state_file:
+                self.marks = json.load(state_file)
+
+    def get(self, key):
+        """Func to get the high-water mark of a key
+
+        Args:
+            key (str): sync key
+
+        Returns:
+            dict: high-water mark or None on the first sync
+        """
+        return self.marks.get(key)
+
+    def set(self, key, mark):
+        """Func to save the high-water mark of a key
+
+        Args:
+            key (str): sync key
+            mark (dict): high-water mark
+        """
+        self.marks[key] = mark
+        if self.path is None:
+            return
+        temporary_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temporary_path, 'w', encoding='utf-8') as state_file:
+            json.dump(self.marks, state_file)
+        os.replace(temporary_path, self.path)
+
+
+class DeltaSync:
+    """Class to fetch only the transfers and balances that changed since the last run
+
+    Every (kind, blockchain, token) keeps a high-water mark: the newest
+    timestamp and block seen, with the ids of the items at that timestamp.
+    The next sync asks for items at or after the mark, newest first, skips
+    the items already seen at the mark and stops paginating at the first
+    older item. The mark only moves forward once a sync completed.
+    """
+
+    def __init__(self, client, state_path=None, limit=AirstackConstants.SYNC_PAGE_LIMIT):
+        """Init function for delta sync
+
+        Args:
+            client (AirstackClient): api client
+            state_path (str, optional): json file the high-water marks are kept in.
+            Defaults to None.
+            limit (int, optional): page size. Defaults to AirstackConstants.SYNC_PAGE_LIMIT.
+        """
+        self.client = client
+        self.state = SyncState(state_path)
+        self.limit = limit
+
+    async def sync_token_transfers(self, variables):
+        """Async function to get the new transfers of a token
+
+        Args:
+            variables (dict): Variables required for the query.
+            - tokenAddress (Address): Token address.
+            - blockchain (TokenBlockchain): The blockchain type.
+
+        Returns:
+            SyncResult: new transfers, newest first
+        """
+        return await self.sync('token_transfers', variables)
+
+    async def sync_nft_transfers(self, variables):
+        """Async function to get the new transfers of a token NFT
+
+        Args:
+            variables (dict): Variables required for the query.
+            - tokenAddress (Address): Token address.
+            - tokenId (String): tokenId.
+            - blockchain (TokenBlockchain): The blockchain type.
+
+        Returns:
+            SyncResult: new transfers, newest first
+        """
+        return await self.sync('nft_transfers', variables)
+
+    async def sync_token_balances(self, variables):
+        """Async function to get the balances of a token that changed
+
+        Args:
+            variables (dict): Variables required for the query.
+            - tokenAddress (Address): Token address.
+            - blockchain (TokenBlockchain): The blockchain type.
+
+        Returns:
+            SyncResult: changed balances, most recently updated first
+        """
+        return await self.sync('token_balances', variables)
+
+    async def sync(self, kind, variables):
+        """Async function to run an incremental sync
+
+        Args:
+            kind (str): key of SYNC_SPECS
+            variables (dict): variables of the query, without `since`
+
+        Returns:
+            SyncResult: new items, newest first
+        """
+        spec = SYNC_SPECS[kind]
+        key = self.sync_key(kind, variables)
+        mark = self.state.get(key)
+        seen_ids = set(mark['ids']) if mark else set()
+        query_variables = dict(variables)
+        query_variables.setdefault('limit', self.limit)
+        query_variables['since'] = mark['timestamp'] if mark else AirstackConstants.SYNC_EPOCH
+
+        execute_query = self.client.create_execute_query_object(
+            query=spec.query, variables=query_variables)
+        query_response = await execute_query.execute_paginated_query()
+        items, pages, done = [], 0, False
+        while True:
+            if query_response.error is not None:
+                return SyncResult(items, pages, mark, query_response.error)
+            pages += 1
+            page_items = ((query_response.data or {}).get(spec.root) or {}).get(spec.items) or []
+            for item in page_items:
+                if mark and (item.get(spec.timestamp_field) or '') < mark['timestamp']:
+                    done = True
+                    break
+                if spec.item_id(item) not in seen_ids:
+                    items.append(item)
+            if done or not query_response.has_next_page:
+                break
+            query_response = await query_response.get_next_page
+
+        new_mark = self._high_water_mark(spec, items, mark)
+        if new_mark is not mark:
+            self.state.set(key, new_mark)
+        return SyncResult(items, pages, new_mark)
+
+    @staticmethod
+    def sync_key(kind, variables):
+        """Func to build the state key of a sync
+
+        Args:
+            kind (str): key of SYNC_SPECS
+            variables (dict): variables of the query
+
+        Returns:
+            str: sync key
+        """
+        return ':'.join([kind, str(variables.get('blockchain')),
+                         str(variables.get('tokenAddress') or '').lower(),
+                         str(variables.get('tokenId') or '')])
+
+    @staticmethod
+    def _high_water_mark(spec, items, mark):
+        if not items:
+            return mark
+        timestamp = max(item.get(spec.timestamp_field) or '' for item in items)
+        at_mark = [item for item in items if item.get(spec.timestamp_field) == timestamp]
+        ids = [spec.item_id(item) for item in at_mark]
+        if mark and mark['timestamp'] == timestamp:
+            ids = list(set(ids) | set(mark['ids']))
+        blocks = [item.get(spec.block_field) for item in at_mark
+                  if item.get(spec.block_field) is not None]
+        return {
+            'timestamp': timestamp,
+            'block': max(blocks) if blocks else None,
+            'ids': ids,
+            'updated_at': time.time()
+        }
@@ -0,0 +1,96 @@
+"""
+Module: endpoint_router.py
+Description: This module contains the latency aware routing of requests across several endpoints.
+"""
+
+from airstack.constant import AirstackConstants
+
+
+class Endpoint:
+    """Class to keep the recent latency and error score of one endpoint
+    """
+
+    def __init__(self, url, alpha=AirstackConstants.ENDPOINT_EWMA_ALPHA):
+        """Init function for endpoint
+
+        Args:
+            url (str): endpoint url
+            alpha (float, optional): weight of the newest sample in the moving averages.
+            Defaults to AirstackConstants.ENDPOINT_EWMA_ALPHA.
+        """
+        self.url = url
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+
+    def record(self, latency, failed):
+        """Func to update the moving averages with a request outcome
+
+        Args:
+            latency (float): request latency in seconds
+            failed (bool): True if the endpoint could not answer
+        """
+        self.requests += 1
+        self.failures += int(failed)
+        self.error_rate += self.alpha * (float(failed) - self.error_rate)
+        if not failed:
+            self.latency = latency if self.latency is None else \
+                self.latency + self.alpha * (latency - self.latency)
+
+    def score(self):
+        """Func to get the routing score, lower is better
+
+        Returns:
+            float: expected latency penalised by the recent error rate
+        """
+        if self.latency is None:
+            # never measured successfully: try it unless it keeps failing
+            return self.error_rate * AirstackConstants.ENDPOINT_ERROR_PENALTY
+        return self.latency * (1 + self.in_flight * AirstackConstants.ENDPOINT_LOAD_PENALTY) + \
+            self.error_rate * AirstackConstants.ENDPOINT_ERROR_PENALTY
+
+    def metrics(self):
+        """Func to get the endpoint stats
+
+        Returns:
+            dict: latency, error rate and counters
+        """
+        return {
+            'latency': self.latency,
+            'error_rate': self.error_rate,
+            'requests': self.requests,
+            'failures': self.failures,
+            'in_flight': self.in_flight
+        }
+
+
+class EndpointRouter:
+    """Class to pick the endpoint with the best recent score for every request
+    """
+
+    def __init__(self, urls):
+        """Init function for endpoint router
+
+        Args:
+            urls (list): endpoint urls, in order of preference
+        """
+        self.endpoints = [Endpoint(url) for url in urls]
+
+    def candidates(self):
+        """Func to get the endpoints in the order they should be tried
+
+        Returns:
+            list: endpoints sorted by score, ties kept in preference order
+        """
+        return sorted(self.endpoints, key=lambda endpoint: endpoint.score())
+
+    def metrics(self):
+        """Func to get the stats of every endpoint
+
+        Returns:
+            dict: endpoint url to its stats
+        """
+        return {endpoint.url: endpoint.metrics() for endpoint in self.endpoints}
@@ -0,0 +1,223 @@
+"""
+Module: entity_store.py
+Description: This module contains the normalized entity cache built from query results.
+"""
+
+import copy
+from collections import OrderedDict
+from functools import lru_cache
+from airstack.constant import AirstackConstants
+
+TOKEN_KEYS = ('token',)
+NFT_KEYS = ('tokenNft', 'tokenNfts')
+
+
+class EntityStore:
+    """Class to merge token and nft entities across query responses
+
+    Every token (keyed by blockchain + address) and nft (keyed by blockchain
+    + address + tokenId) met in a response is merged into one entity owned
+    by the store, so the fields known from every query can answer later
+    lookups without a request. Responses are never rewritten and never share
+    dicts with the store: a lookup returns a copy projected to the fields
+    the query selected.
+    """
+
+    def __init__(self, max_entities=AirstackConstants.ENTITY_STORE_MAX_ENTITIES):
+        """Init function for entity store
+
+        Args:
+            max_entities (int, optional): entities kept, least recently used first out.
+            Defaults to AirstackConstants.ENTITY_STORE_MAX_ENTITIES.
+        """
+        self.max_entities = max_entities
+        self.entities = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+
+    @staticmethod
+    def token_key(blockchain, address):
+        """Func to build the key of a token entity
+
+        Args:
+            blockchain (str): blockchain
+            address (str): token address
+
+        Returns:
+            tuple: entity key
+        """
+        return ('token', blockchain, (address or '').lower())
+
+    @staticmethod
+    def nft_key(blockchain, address, token_id):
+        """Func to build the key of an nft entity
+
+        Args:
+            blockchain (str): blockchain
+            address (str): token address
+            token_id (str): token id
+
+        Returns:
+            tuple: entity key
+        """
+        return ('nft', blockchain, (address or '').lower(), str(token_id))
+
+    def normalize(self, data):
+        """Func to merge the entities of a response into the store
+
+        Args:
+            data (dict|list): query response data, left unchanged
+
+        Returns:
+            dict|list: the same data
+        """
+        self._normalize(data, None, None)
+        return data
+
+    def lookup(self, key, fields):
+        """Func to get an entity if every requested field is already known
+
+        Args:
+            key (tuple): entity key
+            fields (iterable): field names the caller needs, or (name, nested fields)
+            pairs as returned by `selected_fields` for fields with a selection set
+
+        Returns:
+            dict: copy of the requested fields of the entity or None
+        """
+        entity = self.entities.get(key)
+        selection = _project(entity, fields) if entity is not None else None
+        if selection is None:
+            self.misses += 1
+            return None
+        self.entities.move_to_end(key)
+        self.hits += 1
+        return selection
+
+    def metrics(self):
+        """Func to get the store counters
+
+        Returns:
+            dict: entity count, lookup hits and misses, occurrences merged into a
+            known entity
+        """
+        return {
+            'entities': len(self.entities),
+            'hits': self.hits,
+            'misses': self.misses,
+            'deduplicated': self.deduplicated
+        }
+
+    def _normalize(self, node, field, parent):
+        if isinstance(node, list):
+            for item in node:
+                self._normalize(item, field, parent)
+            return
+        if not isinstance(node, dict):
+            return
+        for child_field, child_value in node.items():
+            if isinstance(child_value, (dict, list)):
+                self._normalize(child_value, child_field, node)
+        key = _entity_key(node, field, parent)
+        if key:
+            self._merge(key, node)
+
+    def _merge(self, key, node):
+        entity = self.entities.get(key)
+        if entity is None:
+            self.entities[key] = copy.deepcopy(node)
+            if len(self.entities) > self.max_entities:
+                self.entities.popitem(last=False)
+            return
+        _deep_merge(entity, node)
+        self.deduplicated += 1
+        self.entities.move_to_end(key)
+
+
+def _deep_merge(entity, node):
+    """Func to merge a copy of a dict into an entity, nested dicts field by field
+    so a narrower selection does not drop the fields of a richer one"""
+    for field, value in node.items():
+        known = entity.get(field)
+        if isinstance(known, dict) and isinstance(value, dict):
+            _deep_merge(known, value)
+        else:
+            entity[field] = copy.deepcopy(value)
+
+
+def _project(node, fields):
+    """Func to copy the selected fields of a node, None if one of them is missing"""
+    if isinstance(node, list):
+        items = [_project(item, fields) for item in node]
+        return None if any(item is None for item in items) else items
+    if not isinstance(node, dict):
+        return None
+    selection = {}
+    for field in fields:
+        name, nested = (field, None) if isinstance(field, str) else field
+        if name not in node:
+            return None
+        value = node[name]
+        if nested and value is not None:
+            value = _project(value, nested)
+            if value is None:
+                return None
+        elif isinstance(value, (dict, list)):
+            value = copy.deepcopy(value)
+        selection[name] = value
+    return selection
+
+
+def _entity_key(node, field, parent):
+    """Func to find the entity key of a dict, using its parent row when the
+    entity itself does not carry its address (e.g. `token` in a TokenBalance)"""
+    blockchain = node.get('blockchain')
+    address = node.get('address')
+    token_id = node.get('tokenId')
+    if parent is not None and (field in TOKEN_KEYS or field in NFT_KEYS):
+        blockchain = blockchain or parent.get('blockchain')
+        address = address or parent.get('tokenAddress')
+        if field in NFT_KEYS and token_id is None:
+            token_id = parent.get('tokenId')
+        if field in TOKEN_KEYS:
+            token_id = None
+    if not blockchain or not isinstance(address, str):
+        return None
+    if token_id is not None:
+        return EntityStore.nft_key(blockchain, address, token_id)
+    return EntityStore.token_key(blockchain, address)
+
+
+@lru_cache(maxsize=64)
+def selected_fields(query):
+    """Func to get the fields selected under the first root field of a query
+
+    Args:
+        query (str): GraphQL query string
+
+    Returns:
+        tuple: root field name or alias, and its selected fields: the name or alias of
+        a leaf field, (name or alias, nested fields) for a field with a selection set
+    """
+    from graphql import parse
+    from graphql.language.ast import OperationDefinition
+    for definition in parse(query).definitions:
+        if isinstance(definition, OperationDefinition):
+            root = definition.selection_set.selections[0]
+            return (root.alias or root.name).value, _selection(root.selection_set)
+    return None, ()
+
+
+def _selection(selection_set):
+    from graphql.language.ast import Field
+    fields = []
+    for selection in selection_set.selections:
+        if not isinstance(selection, Field):
+            continue
+        name = (selection.alias or selection.name).value
+        if selection.selection_set is None:
+            fields.append(name)
+        else:
+            fields.append((name, _selection(selection.selection_set)))
+    return tuple(fields)
@@ -4,20 +4,15 @@ Description: This module contains the methods to execute the query.
 """
 
 import json
+import time
 import warnings
 import re
-from graphql import parse, print_ast, visit
 from airstack.send_request import SendRequest
-from airstack.generic import (
-    find_page_info,
-    add_cursor_to_input_field,
-    replace_cursor_value,
-    has_cursor,
-    RemoveQueryByStartingName,
-    add_page_info_to_queries,
-    remove_unused_variables
-)
 from airstack.constant import AirstackConstants
+from airstack.deadline import LatencyTracker, build_timeout, hedge_request, to_deadline
+from airstack.circuit_breaker import CircuitBreaker
+from airstack.admission import AdmissionQueue
+from airstack.endpoint_router import EndpointRouter
 
 warnings.filterwarnings("ignore", message="coroutine .* was never awaited")
 
@@ -25,7 +20,7 @@ class QueryResponse:
     """Class for generate the query response
     """
     def __init__(self, response, status_code, error, has_next_page=None, has_prev_page=None,
-    get_next_page=None, get_prev_page=None):
+    get_next_page=None, get_prev_page=None, query=None, page_info=None):
         """Init function
 
         Args:
@@ -36,6 +31,8 @@ class QueryResponse:
             has_prev_page (bool, optional): if previous page is there. Defaults to None.
             get_next_page (func, optional): func to get the next page data. Defaults to None.
             get_prev_page (func, optional): func to get the previous page data. Defaults to None.
+            query (str, optional): paginated query the page was fetched with. Defaults to None.
+            page_info (dict, optional): page info of every root field. Defaults to None.
         """
         self.data = response
         self.status_code = status_code
@@ -44,52 +41,329 @@ class QueryResponse:
         self.has_prev_page = has_prev_page
         self.get_next_page = get_next_page
         self.get_prev_page = get_prev_page
+        self.query = query
+        self.page_info = page_info
 
 class AirstackClient:
     """Class to create api client for airstack api's
     """
 
-    def __init__(self, url=None, api_key=None):
+    def __init__(self, url=None, api_key=None, timeout=None, connect_timeout=None,
+    read_timeout=None, hedge=False, circuit_breaker=False, max_concurrency=None,
+    max_queue=None, schema=None, max_query_cost=None, metadata_store=None,
+    entity_store=False, executor=None, offload_threshold=None, monitor_loop_lag=False,
+    mirror=None, requests_per_second=None, tenant_weights=None, page_cache=False,
+    transport=None, coordinator=None):
         """Init function for api client
 
         Args:
-            url (str, optional): base url for server. Defaults to None.
+            url (str|list, optional): base url for server, or several urls to route
+            requests across by recent latency and error rate, failing over on connection
+            errors. Defaults to None.
             api_key (str, required): api key. Defaults to None.
+            timeout (float, optional): total timeout of a single request in seconds.
+            Defaults to AirstackConstants.API_TIMEOUT.
+            connect_timeout (float, optional): timeout for opening a connection.
+            Defaults to AirstackConstants.API_CONNECT_TIMEOUT.
+            read_timeout (float, optional): timeout for reading from the socket.
+            Defaults to None.
+            hedge (bool, optional): fire a duplicate request for idempotent lookups
+            that are slower than the recent p95 latency. Defaults to False.
+            circuit_breaker (bool|CircuitBreaker, optional): fail fast while the endpoint
+            is degraded, or a configured breaker. Defaults to False.
+            max_concurrency (int, optional): requests sent at the same time, unbounded
+            if None. Defaults to None.
+            max_queue (int, optional): requests allowed to wait for a slot before new
+            ones are shed, unbounded if None. Defaults to None.
+            schema (str|dict, optional): cached introspection schema used to validate
+            queries and variables before they are sent. Defaults to None.
+            max_query_cost (int, optional): estimated cost budget of one request, queries
+            with several root fields above it are split into concurrent requests and
+            their results merged. Defaults to None.
+            metadata_store (str|MetadataStore, optional): directory of the on-disk store
+            consulted first for immutable token and nft metadata. Defaults to None.
+            entity_store (bool|EntityStore, optional): deduplicate token and nft entities
+            across responses and answer lookups from the fields already known.
+            Defaults to False.
+            executor (str|Executor, optional): 'thread', 'process' or an executor used to
+            decode large responses and rewrite paginated queries off the event loop.
+            Defaults to None.
+            offload_threshold (int, optional): response size in bytes decoded in the
+            executor. Defaults to AirstackConstants.OFFLOAD_THRESHOLD_BYTES.
+            monitor_loop_lag (bool, optional): measure the event loop lag, reported by
+            metrics(). Defaults to False.
+            mirror (str|LocalMirror, optional): SQLite file of the local mirror answering
+            get_token_details, get_nfts, get_holders_of_collection and get_ens_subdomains
+            while their stored results are fresh. Defaults to None.
+            requests_per_second (float, optional): requests started per second, shared by
+            every priority class and tenant. Defaults to None.
+            tenant_weights (dict, optional): tenant to its share of the requests of its
+            priority class, 1 if missing. Defaults to None.
+            page_cache (bool|dict, optional): keep the recently visited pages of every
+            paginated query for prev/next navigation, or the PageCache arguments
+            (max_pages, max_bytes, staleness). Defaults to False.
+            transport (str|Transport, optional): 'aiohttp' for a pooled HTTP/1.1 session,
+            'http2' for HTTP/2 multiplexing with the http2 extra, or a Transport such as
+            ASGITransport or CallableTransport to answer in process. Defaults to an
+            aiohttp session per request.
+            coordinator (str|Coordinator, optional): Unix socket of the coordinator
+            sidecar sharing a host-wide rate limit, in-flight requests and a response
+            cache with the other processes of the host. Defaults to None.
 
         Raises:
             ValueError: _description_
         """
-        self.url = AirstackConstants.API_ENDPOINT_PROD if url is None else url
+        if url is None:
+            url = AirstackConstants.API_ENDPOINT_PROD
+        self.endpoints = [url] if isinstance(url, str) else list(url)
+        self.url = self.endpoints[0]
+        self.router = EndpointRouter(self.endpoints)
         if api_key is None:
             raise ValueError("API key must be provided.")
 
-        self.timeout = AirstackConstants.API_TIMEOUT
+        self.timeout = AirstackConstants.API_TIMEOUT if timeout is None else timeout
+        self.connect_timeout = AirstackConstants.API_CONNECT_TIMEOUT if \
+            connect_timeout is None else connect_timeout
+        self.read_timeout = read_timeout
+        self.hedge = hedge
+        self.latency = LatencyTracker()
+        if circuit_breaker is True:
+            circuit_breaker = CircuitBreaker()
+        self.circuit_breaker = circuit_breaker or None
+        self.admission = AdmissionQueue(
+            max_concurrency=max_concurrency, max_queue=max_queue,
+            requests_per_second=requests_per_second, tenant_weights=tenant_weights)
+        self.schema = schema
+        self.max_query_cost = max_query_cost
+        self.metadata_store = metadata_store
+        self.mirror = mirror
+        self._opened_stores = []
+        self.page_cache = page_cache
+        if entity_store is True:
+            from airstack.entity_store import EntityStore
+            entity_store = EntityStore()
+        self.entity_store = entity_store or None
+        self.offloader = None
+        if executor is not None:
+            from airstack.offload import Offloader
+            self.offloader = Offloader(executor, threshold=AirstackConstants.
+            OFFLOAD_THRESHOLD_BYTES if offload_threshold is None else offload_threshold)
+        self.loop_lag = None
+        if monitor_loop_lag:
+            from airstack.offload import LoopLagMonitor
+            self.loop_lag = LoopLagMonitor()
+        from airstack.transport import build_transport
+        self.transport = build_transport(transport)
+        if isinstance(coordinator, str):
+            from airstack.coordinator import Coordinator
+            coordinator = Coordinator(coordinator)
+        self.coordinator = coordinator
+        self._schema_validator = None
+        self._queries_objects = {}
         self.api_key = api_key
 
-    def create_execute_query_object(self, query=None, variables=None):
+    def create_execute_query_object(self, query=None, variables=None, deadline=None,
+    priority=None, tenant=None):
         """Create execute query object for every query
 
         Args:
             query (str, optional): query. Defaults to None.
             variables (dict, optional): variables for the query. Defaults to None.
+            deadline (Deadline|float, optional): time budget shared by every request
+            made through the object, including all pages. Defaults to None.
+            priority (str, optional): 'interactive', 'normal' or 'bulk' scheduling class
+            of every request made through the object. Defaults to 'normal'.
+            tenant (str, optional): tenant the requests are fairly shared with.
+            Defaults to None.
 
         Returns:
             object: execute query obiect
         """
         execute_query = ExecuteQuery(query=query, variables=variables, url=self.url,
-        api_key=self.api_key, timeout=self.timeout)
+        api_key=self.api_key, timeout=self.timeout, deadline=deadline, client=self,
+        priority=priority, tenant=tenant)
         return execute_query
 
-    def queries_object(self):
+    async def send_request(self, headers, data, timeout, priority=None, tenant=None):
+        """Async function to send a request through the client's load controls
+
+        Args:
+            headers (dict): headers.
+            data (str): json request body.
+            timeout (aiohttp.ClientTimeout): timeout for the request.
+            priority (str, optional): scheduling class. Defaults to 'normal'.
+            tenant (str, optional): tenant of the request. Defaults to None.
+
+        Returns:
+            Tuple: JSON response or None, response status code, error message or None
+        """
+        if self.coordinator is not None:
+            return await self.coordinator.send(self.api_key, data, lambda: self._send_request(
+                headers, data, timeout, priority, tenant))
+        return await self._send_request(headers, data, timeout, priority, tenant)
+
+    async def _send_request(self, headers, data, timeout, priority, tenant):
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow_request():
+            return None, None, AirstackConstants.CIRCUIT_OPEN_ERROR
+        if self.loop_lag is not None:
+            self.loop_lag.start()
+        admitted = False
+        recorded = False
+        try:
+            admitted = await self.admission.acquire(priority, tenant)
+            if not admitted:
+                return None, None, AirstackConstants.REQUEST_SHED_ERROR
+            if self.coordinator is not None:
+                await self.coordinator.acquire()
+            started = time.monotonic()
+            response, status_code, error = await self._send_to_endpoints(headers, data, timeout)
+            latency = time.monotonic() - started
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record(status_code, latency)
+                recorded = True
+            if error is None:
+                self.latency.record(latency)
+            return response, status_code, error
+        finally:
+            if admitted:
+                self.admission.release()
+            if not recorded and self.circuit_breaker is not None:
+                self.circuit_breaker.release()
+
+    async def _send_to_endpoints(self, headers, data, timeout):
+        """Async function to send a request to the best endpoint, failing over on
+        connection errors
+
+        Args:
+            headers (dict): headers.
+            data (str): json request body.
+            timeout (aiohttp.ClientTimeout): timeout for the request.
+
+        Returns:
+            Tuple: JSON response or None, response status code, error message or None
+        """
+        for endpoint in self.router.candidates():
+            started = time.monotonic()
+            endpoint.in_flight += 1
+            try:
+                response, status_code, error = await SendRequest.send_post_request(
+                    url=endpoint.url, headers=headers, data=data, timeout=timeout,
+                    offloader=self.offloader, transport=self.transport)
+            finally:
+                endpoint.in_flight -= 1
+            failed = status_code is None or status_code >= 500
+            endpoint.record(time.monotonic() - started, failed)
+            if status_code is not None or error == AirstackConstants.TIMEOUT_ERROR:
+                break
+        return response, status_code, error
+
+    def get_schema_validator(self):
+        """Func to get the schema validator, built on first use
+
+        Returns:
+            object: SchemaValidator or None if no schema was given
+        """
+        if self._schema_validator is None and self.schema is not None:
+            from airstack.schema_validation import SchemaValidator
+            self._schema_validator = SchemaValidator(self.schema)
+        return self._schema_validator
+
+    def get_metadata_store(self):
+        """Func to get the metadata store, opened on first use
+
+        Returns:
+            object: MetadataStore or None if no store was given
+        """
+        if isinstance(self.metadata_store, str):
+            from airstack.metadata_store import MetadataStore
+            self.metadata_store = MetadataStore(self.metadata_store)
+            self._opened_stores.append(self.metadata_store)
+        return self.metadata_store
+
+    def get_mirror(self):
+        """Func to get the local mirror, opened on first use
+
+        Returns:
+            object: LocalMirror or None if no mirror was given
+        """
+        if isinstance(self.mirror, str):
+            from airstack.mirror import LocalMirror
+            self.mirror = LocalMirror(self.mirror)
+            self._opened_stores.append(self.mirror)
+        return self.mirror
+
+    async def download_schema(self, path):
+        """Async function to save the introspection schema for offline validation
+
+        Args:
+            path (str): path of the introspection json file
+
+        Returns:
+            str: error message or None
+        """
+        from airstack.schema_validation import download_schema
+        return await download_schema(self, path)
+
+    def metrics(self):
+        """Func to get the client metrics
+
+        Returns:
+            dict: latency percentiles, circuit breaker and admission queue state,
+            per endpoint stats, entity store and offloading counters, event loop lag,
+            transport and coordinator counters
+        """
+        return {
+            'latency': {
+                'count': len(self.latency.samples),
+                'p50': self.latency.percentile(50),
+                'p95': self.latency.percentile(95),
+                'p99': self.latency.percentile(99)
+            },
+            'circuit_breaker': self.circuit_breaker.metrics() if
+            self.circuit_breaker is not None else None,
+            'admission': self.admission.metrics(),
+            'endpoints': self.router.metrics(),
+            'entity_store': self.entity_store.metrics() if
+            self.entity_store is not None else None,
+            'offload': self.offloader.metrics() if self.offloader is not None else None,
+            'loop_lag': self.loop_lag.metrics() if self.loop_lag is not None else None,
+            'transport': self.transport.metrics(),
+            'coordinator': self.coordinator.metrics() if
+            self.coordinator is not None else None
+        }
+
+    async def close(self):
+        """Async function to close the connections kept open by the transport and to
+        the coordinator, stop the loop lag monitor, shut the executor down and close
+        the metadata store and mirror opened from a path
+        """
+        await self.transport.close()
+        if self.coordinator is not None:
+            await self.coordinator.close()
+        if self.loop_lag is not None:
+            self.loop_lag.stop()
+        if self.offloader is not None:
+            self.offloader.shutdown()
+        while self._opened_stores:
+            self._opened_stores.pop().close()
+
+    def queries_object(self, priority=None, tenant=None):
         """Create popular query object for popular queries
 
+        Args:
+            priority (str, optional): scheduling class of the queries. Defaults to 'normal'.
+            tenant (str, optional): tenant of the queries. Defaults to None.
+
         Returns:
             object: execute popular query obiect
         """
-        from airstack.popular_queries import ExecutePopularQueries
-        execute_popular_query = ExecutePopularQueries(url=self.url,api_key=self.api_key,
-        timeout=self.timeout)
-        return execute_popular_query
+        key = (priority, tenant)
+        if key not in self._queries_objects:
+            from airstack.popular_queries import ExecutePopularQueries
+            self._queries_objects[key] = ExecutePopularQueries(url=self.url,
+            api_key=self.api_key, timeout=self.timeout, client=self, priority=priority,
+            tenant=tenant)
+        return self._queries_objects[key]
 
 class ExecuteQuery:
     """Class to execute query functions
@@ -97,21 +371,36 @@ class ExecuteQuery:
     Returns:
         object: object of execute query
     """
-    def __init__(self, query=None, variables=None, url=None, api_key=None, timeout=None):
+    def __init__(self, query=None, variables=None, url=None, api_key=None, timeout=None,
+    deadline=None, client=None, priority=None, tenant=None):
         self.deleted_queries = []
         self.query = query
         self.variables = variables
         self.url = url
         self.api_key = api_key
         self.timeout = timeout
-
-    async def execute_query(self, query=None):
+        self.deadline = to_deadline(deadline)
+        self.client = client
+        self.priority = priority
+        self.tenant = tenant
+        self.page_cache = None
+        if client is not None and client.page_cache:
+            from airstack.page_cache import PageCache
+            self.page_cache = PageCache(**client.page_cache) if \
+                isinstance(client.page_cache, dict) else PageCache()
+
+    async def execute_query(self, query=None, timeout=None, hedge=False, validate=True):
         """Async function to run a GraphQL query and get the data
 
         Args:
             query (str): GraphQL query string. Defaults to None
-            variables (dict, optional): Variables for the query. Defaults to
-            None.
+            timeout (float, optional): total timeout for this call, capped by the
+            deadline of the object. Defaults to None.
+            hedge (bool, optional): fire a duplicate request after the recent p95
+            latency and keep the first success, only for idempotent queries.
+            Defaults to False.
+            validate (bool, optional): validate the query against the client's cached
+            schema before sending it. Defaults to True.
 
         Returns:
             Tuple: GraphQL response data or None, GraphQL response status code,
@@ -120,19 +409,105 @@ class ExecuteQuery:
         if query is None:
             query = self.query
 
+        if validate and self.client is not None:
+            schema_validator = self.client.get_schema_validator()
+            if schema_validator is not None:
+                errors = schema_validator.validate(query, self.variables)
+                if errors:
+                    return QueryResponse(None, None, errors)
+
+        if self.deadline is not None and self.deadline.expired():
+            return QueryResponse(None, None, AirstackConstants.DEADLINE_EXCEEDED_ERROR)
+
+        chunks = None
+        if self.client is not None and self.client.max_query_cost is not None:
+            from airstack.query_cost import split_query
+            chunks = split_query(query, self.client.max_query_cost, self.variables)
+
+        if chunks is not None and len(chunks) > 1:
+            import asyncio
+            from airstack.query_cost import merge_responses
+            responses = await asyncio.gather(*[
+                self._send_hedged_query(chunk_query, timeout, hedge, chunk_variables)
+                for chunk_query, chunk_variables in chunks])
+            query_response = QueryResponse(*merge_responses(responses))
+        else:
+            query_response = await self._send_hedged_query(query, timeout, hedge, self.variables)
+
+        if self.client is not None and self.client.entity_store is not None and \
+                query_response.error is None and query_response.data:
+            self.client.entity_store.normalize(query_response.data)
+        return query_response
+
+    async def _send_hedged_query(self, query, timeout, hedge, variables):
+        """Async function to send the query, hedged if asked for
+
+        Args:
+            query (str): GraphQL query string.
+            timeout (float): total timeout for this call.
+            hedge (bool): fire a duplicate request after the recent p95 latency.
+            variables (dict): variables for the query.
+
+        Returns:
+            object: QueryResponse
+        """
+        if hedge and self.client is not None:
+            return await hedge_request(lambda: self._send_query(query, timeout, variables),
+            self.client.latency.hedge_delay())
+        return await self._send_query(query, timeout, variables)
+
+    async def _send_query(self, query, timeout=None, variables=None):
+        """Async function to send the query once
+
+        Args:
+            query (str): GraphQL query string.
+            timeout (float, optional): total timeout for this call. Defaults to None.
+            variables (dict, optional): variables for the query. Defaults to None.
+
+        Returns:
+            object: QueryResponse
+        """
         headers = {
             'Content-Type': 'application/json',
             'Authorization': self.api_key
         }
         payload = {
             'query': query,
-            'variables': self.variables
+            'variables': variables
         }
 
-        response, status_code, error = await SendRequest.send_post_request(
-            url=self.url, headers=headers, data=json.dumps(payload), timeout=self.timeout)
+        if self.deadline is not None and self.deadline.expired():
+            return QueryResponse(None, None, AirstackConstants.DEADLINE_EXCEEDED_ERROR)
+        client_timeout = build_timeout(
+            total=self.timeout if timeout is None else timeout,
+            connect=self.client.connect_timeout if self.client is not None else None,
+            read=self.client.read_timeout if self.client is not None else None,
+            deadline=self.deadline)
+
+        if self.client is not None:
+            response, status_code, error = await self.client.send_request(
+                headers=headers, data=json.dumps(payload), timeout=client_timeout,
+                priority=self.priority, tenant=self.tenant)
+        else:
+            response, status_code, error = await SendRequest.send_post_request(
+                url=self.url, headers=headers, data=json.dumps(payload), timeout=client_timeout)
+        if error == AirstackConstants.TIMEOUT_ERROR and self.deadline is not None \
+                and self.deadline.expired():
+            error = AirstackConstants.DEADLINE_EXCEEDED_ERROR
         return QueryResponse(response, status_code, error)
 
+    def estimate_cost(self, query=None):
+        """Func to estimate the cost of the query from its AST
+
+        Args:
+            query (str, optional): GraphQL query string. Defaults to None.
+
+        Returns:
+            object: QueryCost with the total, per root field cost, depth and alias count
+        """
+        from airstack.query_cost import estimate_query_cost
+        return estimate_query_cost(self.query if query is None else query, self.variables)
+
     async def execute_paginated_query(self, query=None, variables=None):
         """Async function to execute paginated query.
 
@@ -146,6 +521,7 @@ class ExecuteQuery:
             error message or None, next cursor,
             previous cursor
         """
+        from airstack.generic import add_page_info_to_queries, find_page_infos
         if query is None:
             query = self.query
 
@@ -159,17 +535,37 @@ class ExecuteQuery:
             return QueryResponse(None, query_response.status_code, query_response.error,
             None, None, None, None)
 
-        page_info = {}
-        for _key, value in query_response.data.items():
-            page_info[_key] = find_page_info(query_response.data[_key])
+        # found in the executor when the client decoded a large body there
+        page_info = getattr(query_response.data, 'page_info', None)
+        if page_info is None:
+            page_info = find_page_infos(query_response.data)
+
+        query_response = self._page_response(query, variables, query_response.data,
+                                             query_response.status_code, page_info)
+        if self.page_cache is not None:
+            self.page_cache.put(query_response, self.variables)
+        return query_response
+
+    def _page_response(self, query, variables, data, status_code, page_info):
+        """Func to build the response of a page, navigable to the next and previous pages
 
+        Args:
+            query (str): paginated query of the page.
+            variables (dict): Variables for the query.
+            data (dict): response data.
+            status_code (int): response status code.
+            page_info (dict): Page info dictionary.
+
+        Returns:
+            object: QueryResponse
+        """
         has_next_page = any(page_info['nextCursor'] != '' for page_info in page_info.values())
         has_prev_page = any(page_info['prevCursor'] != '' for page_info in page_info.values())
 
-        return QueryResponse(query_response.data, query_response.status_code,
-                            query_response.error, has_next_page, has_prev_page,
+        return QueryResponse(data, status_code, None, has_next_page, has_prev_page,
                             self.get_next_page(query, variables, page_info),
-                            self.get_prev_page(query, variables, page_info))
+                            self.get_prev_page(query, variables, page_info),
+                            query, page_info)
 
     async def get_next_page(self, query, variables, page_info):
         """Async function to get the next page data.
@@ -186,28 +582,19 @@ class ExecuteQuery:
             error message or None, next cursor,
             previous cursor
         """
-        next_query = query
-        stored = False
-        for _page_info_key, _page_info_value in page_info.items():
-            document_ast = parse(next_query)
-            if _page_info_value['nextCursor'] == "":
-                self.deleted_queries.append(next_query)
-                stored = True
-                visitor = RemoveQueryByStartingName(query_start=_page_info_key)
-                document_ast = visit(document_ast, visitor)
-                next_query = remove_unused_variables(document_ast=document_ast,
-                query=print_ast(document_ast))
-            else:
-                if not stored:
-                    self.deleted_queries.append(None)
-                if has_cursor(document_ast, _page_info_key):
-                    replace_cursor_value(document_ast, _page_info_key,
-                    _page_info_value['nextCursor'], self.variables)
-                else:
-                    add_cursor_to_input_field(document_ast, _page_info_key,
-                    _page_info_value['nextCursor'])
-                next_query = print_ast(document_ast)
-        return await self.execute_paginated_query(next_query, variables)
+        from airstack.generic import build_next_page_query
+        previous_variables = dict(self.variables or {})
+        navigation = self._follow_page('next', query, page_info)
+        if isinstance(navigation, QueryResponse):
+            return navigation
+        next_query, deleted_queries, next_variables = await self._rewrite_page_query(
+            build_next_page_query, query, page_info)
+        self.deleted_queries.extend(deleted_queries)
+        self._update_variables(next_variables)
+        query_response = await self.execute_paginated_query(next_query, variables)
+        self._link_pages(navigation, query, previous_variables, query_response,
+                         deleted_queries)
+        return query_response
 
     async def get_prev_page(self, query, variables, page_info):
         """Async function to get the previous page data.
@@ -222,18 +609,87 @@ class ExecuteQuery:
                 error message or None, next cursor,
                 previous cursor
             """
+        from airstack.generic import build_prev_page_query
+        previous_variables = dict(self.variables or {})
+        navigation = self._follow_page('prev', query, page_info)
         deleted_query = self.deleted_queries.pop()
+        if isinstance(navigation, QueryResponse):
+            return navigation
         if deleted_query:
             next_query = deleted_query
         else:
             next_query = query
-        for _page_info_key, _page_info_value in page_info.items():
-            document_ast = parse(next_query)
-            if has_cursor(document_ast, _page_info_key):
-                replace_cursor_value(document_ast, _page_info_key,
-                _page_info_value['prevCursor'], self.variables)
-            else:
-                add_cursor_to_input_field(document_ast, _page_info_key,
-                _page_info_value['prevCursor'])
-            next_query = print_ast(document_ast)
-        return await self.execute_paginated_query(next_query, variables)
+        next_query, next_variables = await self._rewrite_page_query(
+            build_prev_page_query, next_query, page_info)
+        self._update_variables(next_variables)
+        query_response = await self.execute_paginated_query(next_query, variables)
+        self._link_pages(navigation, query, previous_variables, query_response,
+                         [deleted_query])
+        return query_response
+
+    async def _rewrite_page_query(self, build_page_query, query, page_info):
+        """Async function to rewrite a query for another page, in the client's
+        executor if it has one
+
+        Args:
+            build_page_query (func): build_next_page_query or build_prev_page_query
+            query (str): GraphQL query string.
+            page_info (dict): Page info dictionary.
+
+        Returns:
+            Tuple: result of build_page_query
+        """
+        offloader = self.client.offloader if self.client is not None else None
+        if offloader is not None:
+            return await offloader.run(build_page_query, query, page_info, self.variables)
+        return build_page_query(query, page_info, self.variables)
+
+    def _follow_page(self, direction, query, page_info):
+        """Func to serve a move between pages from the page cache
+
+        Args:
+            direction (str): 'next' or 'prev'
+            query (str): paginated query of the page moved from.
+            page_info (dict): Page info dictionary of the page moved from.
+
+        Returns:
+            object: QueryResponse of the cached page, otherwise the navigation key to
+            link once the page is fetched, or None without a page cache
+        """
+        if self.page_cache is None:
+            return None
+        from airstack.page_cache import navigation_key
+        navigation = navigation_key(direction, query, self.variables or {}, page_info)
+        followed = self.page_cache.follow(navigation)
+        if followed is None:
+            return navigation
+        page, deleted_queries = followed
+        if direction == 'next':
+            self.deleted_queries.extend(deleted_queries)
+        self._update_variables(page.variables)
+        return self._page_response(page.query, None, page.data, page.status_code,
+                                   page.page_info)
+
+    def _link_pages(self, navigation, query, variables, query_response, deleted_queries):
+        """Func to link a fetched page with the page it was reached from, both ways
+
+        Args:
+            navigation (tuple): navigation key of the move, None without a page cache
+            query (str): paginated query of the page moved from.
+            variables (dict): variables of the page moved from.
+            query_response (QueryResponse): page moved to.
+            deleted_queries (list): deleted queries entries of the move.
+        """
+        if navigation is None or query_response.error is not None:
+            return
+        from airstack.page_cache import navigation_key
+        self.page_cache.link(navigation, query_response.query, self.variables or {},
+                             deleted_queries)
+        back = 'prev' if navigation[0] == 'next' else 'next'
+        self.page_cache.link(navigation_key(back, query_response.query, self.variables or {},
+                                            query_response.page_info),
+                             query, variables, deleted_queries)
+
+    def _update_variables(self, variables):
+        if self.variables is not None and variables is not None:
+            self.variables.update(variables)
@@ -35,6 +35,18 @@ def find_page_info(json_data):
     return None
 
 
+def find_page_infos(data):
+    """Func to find the pageInfo of every root field of a response
+
+    Args:
+        data (dict): api response data
+
+    Returns:
+        dict: pageInfo per root field
+    """
+    return {key: find_page_info(value) for key, value in data.items()}
+
+
 def modify_query_with_cursor(query, key, cursor):
     """Modify the GraphQL query by adding or replacing the cursor input for the specified key."""
     pattern = rf'(\b{key}\b[^}}]+cursor:\s")[^"]+'
@@ -225,3 +237,66 @@ def remove_unused_variables(document_ast, query):
             if query.count(_variable.variable.name.value) == 1:
                 del document_ast.definitions[0].variable_definitions[_count]
     return print_ast(document_ast)
+
+def build_next_page_query(query, page_info, variables):
+    """Func to rewrite a paginated query to fetch the next page, without side
+    effects so it can run in an executor
+
+    Args:
+        query (str): GraphQL query string
+        page_info (dict): page info of every root field
+        variables (dict): variables of the query
+
+    Returns:
+        Tuple: next page query, entries for the deleted queries, updated variables
+    """
+    from graphql import visit
+    variables = dict(variables) if variables is not None else None
+    deleted_queries = []
+    next_query = query
+    stored = False
+    for _page_info_key, _page_info_value in page_info.items():
+        document_ast = parse(next_query)
+        if _page_info_value['nextCursor'] == "":
+            deleted_queries.append(next_query)
+            stored = True
+            visitor = RemoveQueryByStartingName(query_start=_page_info_key)
+            document_ast = visit(document_ast, visitor)
+            next_query = remove_unused_variables(document_ast=document_ast,
+            query=print_ast(document_ast))
+        else:
+            if not stored:
+                deleted_queries.append(None)
+            if has_cursor(document_ast, _page_info_key):
+                replace_cursor_value(document_ast, _page_info_key,
+                _page_info_value['nextCursor'], variables)
+            else:
+                add_cursor_to_input_field(document_ast, _page_info_key,
+                _page_info_value['nextCursor'])
+            next_query = print_ast(document_ast)
+    return next_query, deleted_queries, variables
+
+def build_prev_page_query(query, page_info, variables):
+    """Func to rewrite a paginated query to fetch the previous page, without side
+    effects so it can run in an executor
+
+    Args:
+        query (str): GraphQL query string
+        page_info (dict): page info of every root field
+        variables (dict): variables of the query
+
+    Returns:
+        Tuple: previous page query, updated variables
+    """
+    variables = dict(variables) if variables is not None else None
+    prev_query = query
+    for _page_info_key, _page_info_value in page_info.items():
+        document_ast = parse(prev_query)
+        if has_cursor(document_ast, _page_info_key):
+            replace_cursor_value(document_ast, _page_info_key,
+            _page_info_value['prevCursor'], variables)
+        else:
+            add_cursor_to_input_field(document_ast, _page_info_key,
+            _page_info_value['prevCursor'])
+        prev_query = print_ast(document_ast)
+    return prev_query, variables
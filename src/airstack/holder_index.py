@@ -0,0 +1,602 @@
+"""
+Module: holder_index.py
+Description: This module contains the holder membership index of collections built from holder crawls.
+"""
+
+import base64
+import copy
+import hashlib
+import json
+import math
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from airstack.constant import AirstackConstants
+
+
+_ARRAY_MAX = 4096
+_BITMAP_BYTES = 8192
+
+
+def _bit_indexes(bits):
+    """Func to get the indexes of the set bits of an integer, scanning its
+    binary string in C rather than testing every bit"""
+    binary = bin(bits)[:1:-1]
+    indexes = []
+    index = binary.find('1')
+    while index != -1:
+        indexes.append(index)
+        index = binary.find('1', index + 1)
+    return indexes
+
+
+def _to_int(container):
+    if isinstance(container, bytearray):
+        return int.from_bytes(container, 'little')
+    bits = bytearray(_BITMAP_BYTES)
+    for low in container:
+        bits[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _from_int(bits):
+    """Func to build the smallest container of the set bits of an integer"""
+    if not bits:
+        return None
+    lows = _bit_indexes(bits)
+    if len(lows) <= _ARRAY_MAX:
+        return array('H', lows)
+    return bytearray(bits.to_bytes(_BITMAP_BYTES, 'little'))
+
+
+def _combine(left, right, operation):
+    if isinstance(left, array) and isinstance(right, array):
+        lows = sorted(operation(set(left), set(right)))
+        if len(lows) <= _ARRAY_MAX:
+            return array('H', lows) if lows else None
+        return _from_int(_to_int(array('H', lows)))
+    return _from_int(operation(_to_int(left), _to_int(right)))
+
+
+class RoaringBitmap:
+    """Class for a roaring-style compressed bitmap of integer ids
+
+    Ids are split by their high 16 bits into containers of at most 65536
+    values: a sorted array of 2 byte lows while it holds up to 4096 ids, a
+    fixed 8 KiB bitmap above. Memory follows the number of ids held rather
+    than the largest id, an update only touches one container, and set
+    operations run container by container.
+    """
+
+    def __init__(self, ids=()):
+        """Init function for roaring bitmap
+
+        Args:
+            ids (iterable, optional): ids to add. Defaults to ().
+        """
+        self.containers = {}
+        for value in ids:
+            self.add(value)
+
+    def add(self, value):
+        """Func to add an id
+
+        Args:
+            value (int): id
+        """
+        high, low = value >> 16, value & 0xffff
+        container = self.containers.get(high)
+        if container is None:
+            self.containers[high] = array('H', [low])
+        elif isinstance(container, bytearray):
+            container[low >> 3] |= 1 << (low & 7)
+        else:
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                return
+            container.insert(index, low)
+            if len(container) > _ARRAY_MAX:
+                self.containers[high] = bytearray(
+                    _to_int(container).to_bytes(_BITMAP_BYTES, 'little'))
+
+    def discard(self, value):
+        """Func to remove an id if it is present
+
+        Args:
+            value (int): id
+        """
+        high, low = value >> 16, value & 0xffff
+        container = self.containers.get(high)
+        if container is None:
+            return
+        if isinstance(container, bytearray):
+            container[low >> 3] &= ~(1 << (low & 7)) & 0xff
+            if not any(container):
+                del self.containers[high]
+            return
+        index = bisect_left(container, low)
+        if index < len(container) and container[index] == low:
+            del container[index]
+            if not container:
+                del self.containers[high]
+
+    def __contains__(self, value):
+        container = self.containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xffff
+        if isinstance(container, bytearray):
+            return bool(container[low >> 3] & (1 << (low & 7)))
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def __len__(self):
+        return sum(len(container) if isinstance(container, array)
+                   else bin(int.from_bytes(container, 'little')).count('1')
+                   for container in self.containers.values())
+
+    def __bool__(self):
+        return bool(self.containers)
+
+    def __iter__(self):
+        for high in sorted(self.containers):
+            container = self.containers[high]
+            lows = container if isinstance(container, array) else \
+                _bit_indexes(int.from_bytes(container, 'little'))
+            base = high << 16
+            for low in lows:
+                yield base | low
+
+    def __eq__(self, other):
+        return isinstance(other, RoaringBitmap) and list(self) == list(other)
+
+    def __and__(self, other):
+        result = RoaringBitmap()
+        for high in self.containers.keys() & other.containers.keys():
+            container = _combine(self.containers[high], other.containers[high],
+                                 lambda left, right: left & right)
+            if container is not None:
+                result.containers[high] = container
+        return result
+
+    def __or__(self, other):
+        result = RoaringBitmap()
+        for high in self.containers.keys() | other.containers.keys():
+            left, right = self.containers.get(high), other.containers.get(high)
+            if left is None or right is None:
+                result.containers[high] = copy.copy(left if right is None else right)
+            else:
+                result.containers[high] = _combine(left, right,
+                                                   lambda left, right: left | right)
+        return result
+
+    def __sub__(self, other):
+        result = RoaringBitmap()
+        for high, left in self.containers.items():
+            right = other.containers.get(high)
+            container = copy.copy(left) if right is None else _combine(
+                left, right, lambda left, right: left & ~right if isinstance(left, int)
+                else left - right)
+            if container is not None:
+                result.containers[high] = container
+        return result
+
+    def memory(self):
+        """Func to get the bytes held by the containers
+
+        Returns:
+            int: container bytes
+        """
+        return sum(len(container) * container.itemsize if isinstance(container, array)
+                   else len(container) for container in self.containers.values())
+
+    def encode(self):
+        """Func to serialise the bitmap
+
+        Returns:
+            str: base64 of the zlib compressed containers
+        """
+        raw = bytearray()
+        for high in sorted(self.containers):
+            container = self.containers[high]
+            payload = container.tobytes() if isinstance(container, array) else bytes(container)
+            kind = 0 if isinstance(container, array) else 1
+            raw += struct.pack('<IBI', high, kind, len(payload)) + payload
+        return base64.b64encode(zlib.compress(bytes(raw))).decode('ascii')
+
+    @classmethod
+    def decode(cls, text):
+        """Func to load a serialised bitmap
+
+        Args:
+            text (str): output of `encode`
+
+        Returns:
+            RoaringBitmap: bitmap
+        """
+        bitmap = cls()
+        raw = zlib.decompress(base64.b64decode(text))
+        offset = 0
+        while offset < len(raw):
+            high, kind, length = struct.unpack_from('<IBI', raw, offset)
+            offset += struct.calcsize('<IBI')
+            payload = raw[offset:offset + length]
+            offset += length
+            if kind == 0:
+                container = array('H')
+                container.frombytes(payload)
+            else:
+                container = bytearray(payload)
+            bitmap.containers[high] = container
+        return bitmap
+
+
+class BloomFilter:
+    """Class for a bloom filter of addresses, answering most negatives without
+    touching the index
+    """
+
+    def __init__(self, capacity=AirstackConstants.HOLDER_BLOOM_CAPACITY,
+                 false_positive_rate=AirstackConstants.HOLDER_BLOOM_FALSE_POSITIVE_RATE,
+                 bits=None):
+        """Init function for bloom filter
+
+        Args:
+            capacity (int, optional): expected number of addresses.
+            Defaults to AirstackConstants.HOLDER_BLOOM_CAPACITY.
+            false_positive_rate (float, optional): false positive rate at capacity.
+            Defaults to AirstackConstants.HOLDER_BLOOM_FALSE_POSITIVE_RATE.
+            bits (bytearray, optional): saved filter. Defaults to None.
+        """
+        size = int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.size = max(8, size)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, value):
+        """Func to add a value
+
+        Args:
+            value (str): value
+        """
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(value))
+
+
+def _holds_token(token_holders, address_id):
+    if token_holders is None:
+        return False
+    if isinstance(token_holders, int):
+        return token_holders == address_id
+    return address_id in token_holders
+
+
+class HolderIndex:
+    """Class for a local index of which wallets hold which collections
+
+    Addresses are interned to integer ids and every collection keeps one
+    compressed RoaringBitmap of its holders, the single answer to membership,
+    counts, intersections, unions and differences. Rows with a tokenId also
+    record the holder of each token (its id, or a bitmap once a token has
+    several holders), so a balance dropping to zero only clears the holder
+    once it holds nothing of the collection; the number of tokens is kept
+    only for the holders of more than one. Rows without a
+    tokenId (fungible tokens) are recorded by the holder bitmap alone.
+    """
+
+    def __init__(self, path=None, bloom=False):
+        """Init function for holder index
+
+        Args:
+            path (str, optional): json file the index is saved to and loaded from.
+            Defaults to None.
+            bloom (bool, optional): keep a bloom filter per collection to reject
+            most non holders without the index. Defaults to False.
+        """
+        self.path = path
+        self.bloom = bloom
+        self.addresses = []
+        self.ids = {}
+        self.bitmaps = {}
+        self.tokens = {}
+        self.counts = {}
+        self.blooms = {}
+        if path is not None and os.path.exists(path):
+            self._load(path)
+
+    @staticmethod
+    def collection_key(blockchain, address):
+        """Func to build the key of a collection
+
+        Args:
+            blockchain (str): blockchain
+            address (str): token address
+
+        Returns:
+            str: collection key
+        """
+        return '{}:{}'.format(blockchain, (address or '').lower())
+
+    def intern(self, address):
+        """Func to get the integer id of an address, assigning one if it is new
+
+        Args:
+            address (str): wallet address
+
+        Returns:
+            int: address id
+        """
+        address = address.lower()
+        address_id = self.ids.get(address)
+        if address_id is None:
+            address_id = len(self.addresses)
+            self.addresses.append(address)
+            self.ids[address] = address_id
+        return address_id
+
+    def apply_balances(self, collection, rows):
+        """Func to update a collection from TokenBalance rows
+
+        Args:
+            collection (str): collection key
+            rows (list): TokenBalance rows with `owner { addresses }`, `tokenId` and
+            `amount`; rows with a zero amount remove the position
+        """
+        holders = self.bitmaps.setdefault(collection, RoaringBitmap())
+        tokens = self.tokens.setdefault(collection, {})
+        counts = self.counts.setdefault(collection, {})
+        for row in rows:
+            held = str(row.get('amount') or '0').strip('0.') != ''
+            token_id = row.get('tokenId')
+            for address in (row.get('owner') or {}).get('addresses') or []:
+                address_id = self.intern(address)
+                if token_id in (None, ''):
+                    if held and address_id not in holders:
+                        self._add_holder(collection, holders, address_id)
+                    elif not held:
+                        holders.discard(address_id)
+                        counts.pop(address_id, None)
+                    continue
+                token_holders = tokens.get(token_id)
+                if held:
+                    if token_holders is None:
+                        tokens[token_id] = address_id
+                    elif _holds_token(token_holders, address_id):
+                        continue
+                    elif isinstance(token_holders, int):
+                        tokens[token_id] = RoaringBitmap((token_holders, address_id))
+                    else:
+                        token_holders.add(address_id)
+                    if address_id in holders:
+                        counts[address_id] = counts.get(address_id, 1) + 1
+                    else:
+                        self._add_holder(collection, holders, address_id)
+                elif _holds_token(token_holders, address_id):
+                    if isinstance(token_holders, int):
+                        del tokens[token_id]
+                    else:
+                        token_holders.discard(address_id)
+                        if not token_holders:
+                            del tokens[token_id]
+                    held_tokens = counts.pop(address_id, 1) - 1
+                    if held_tokens > 1:
+                        counts[address_id] = held_tokens
+                    elif not held_tokens:
+                        holders.discard(address_id)
+
+    def holds(self, collection, address):
+        """Func to check if a wallet holds a collection
+
+        Args:
+            collection (str): collection key
+            address (str): wallet address
+
+        Returns:
+            bool: True if the wallet holds the collection
+        """
+        address = address.lower()
+        bloom = self.blooms.get(collection)
+        if bloom is not None and address not in bloom:
+            return False
+        address_id = self.ids.get(address)
+        if address_id is None:
+            return False
+        return address_id in self.bitmaps.get(collection, ())
+
+    def holders(self, collection):
+        """Func to get the holders of a collection
+
+        Args:
+            collection (str): collection key
+
+        Returns:
+            list: holder addresses
+        """
+        return self._addresses(self.bitmaps.get(collection, ()))
+
+    def count(self, collection):
+        """Func to count the holders of a collection
+
+        Args:
+            collection (str): collection key
+
+        Returns:
+            int: number of holders
+        """
+        return len(self.bitmaps.get(collection, ()))
+
+    def intersection(self, *collections):
+        """Func to get the wallets holding every collection
+
+        Args:
+            *collections (str): collection keys
+
+        Returns:
+            list: holder addresses
+        """
+        bitmaps = [self.bitmaps.get(collection, RoaringBitmap()) for collection in collections]
+        bitmaps.sort(key=lambda bitmap: len(bitmap.containers))
+        bits = bitmaps[0] if bitmaps else RoaringBitmap()
+        for bitmap in bitmaps[1:]:
+            bits &= bitmap
+        return self._addresses(bits)
+
+    def union(self, *collections):
+        """Func to get the wallets holding any of the collections
+
+        Args:
+            *collections (str): collection keys
+
+        Returns:
+            list: holder addresses
+        """
+        bits = RoaringBitmap()
+        for collection in collections:
+            bits |= self.bitmaps.get(collection, RoaringBitmap())
+        return self._addresses(bits)
+
+    def difference(self, collection, *others):
+        """Func to get the wallets holding a collection but none of the others
+
+        Args:
+            collection (str): collection key
+            *others (str): collection keys
+
+        Returns:
+            list: holder addresses
+        """
+        bits = self.bitmaps.get(collection, RoaringBitmap())
+        for other in others:
+            bits -= self.bitmaps.get(other, RoaringBitmap())
+        return self._addresses(bits)
+
+    def memory(self, collection):
+        """Func to get the bytes of ids held by a collection, without the Python
+        object overheads
+
+        Args:
+            collection (str): collection key
+
+        Returns:
+            int: bytes of the holder bitmap, token holders and counts
+        """
+        size = self.bitmaps.get(collection, RoaringBitmap()).memory()
+        for token_holders in self.tokens.get(collection, {}).values():
+            size += 8 if isinstance(token_holders, int) else token_holders.memory()
+        return size + 16 * len(self.counts.get(collection, {}))
+
+    async def refresh(self, delta_sync, variables):
+        """Async function to build or update a collection from the balances changed
+        since its previous refresh
+
+        Args:
+            delta_sync (DeltaSync): delta sync keeping the high-water marks
+            variables (dict): Variables required for the query.
+            - tokenAddress (Address): Token address.
+            - blockchain (TokenBlockchain): The blockchain type.
+
+        Returns:
+            str: error message or None
+        """
+        result = await delta_sync.sync_token_balances(variables)
+        if result.items:
+            collection = self.collection_key(variables.get('blockchain'),
+                                             variables.get('tokenAddress'))
+            self.apply_balances(collection, list(reversed(result.items)))
+        return result.error
+
+    def save(self, path=None):
+        """Func to save the index to its json file
+
+        Args:
+            path (str, optional): json file. Defaults to the path of the index.
+        """
+        path = path or self.path
+        state = {
+            'addresses': self.addresses,
+            'collections': {
+                collection: {
+                    'holders': bitmap.encode(),
+                    'tokens': [[token_id, token_holders if isinstance(token_holders, int)
+                                else token_holders.encode()] for token_id, token_holders
+                               in self.tokens.get(collection, {}).items()],
+                    'counts': [[address_id, count] for address_id, count
+                               in self.counts.get(collection, {}).items()],
+                    'bloom': self._encode_bloom(collection)
+                } for collection, bitmap in self.bitmaps.items()
+            }
+        }
+        temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary_path, 'w', encoding='utf-8') as index_file:
+            json.dump(state, index_file)
+        os.replace(temporary_path, path)
+
+    def _load(self, path):
+        with open(path, encoding='utf-8') as index_file:
+            state = json.load(index_file)
+        self.addresses = state['addresses']
+        self.ids = {address: address_id for address_id, address in enumerate(self.addresses)}
+        for collection, saved in state['collections'].items():
+            if 'holders' in saved:
+                self.bitmaps[collection] = RoaringBitmap.decode(saved['holders'])
+                self.tokens[collection] = {
+                    token_id: token_holders if isinstance(token_holders, int)
+                    else RoaringBitmap.decode(token_holders)
+                    for token_id, token_holders in saved['tokens']}
+                self.counts[collection] = dict(saved['counts'])
+            else:
+                self._load_positions(collection, saved['positions'])
+            if saved.get('bloom'):
+                capacity, false_positive_rate, bits = saved['bloom']
+                self.blooms[collection] = BloomFilter(capacity, false_positive_rate, bytearray(
+                    zlib.decompress(base64.b64decode(bits))))
+
+    def _load_positions(self, collection, positions):
+        """Func to load a collection saved as integer bitmap and positions by an
+        older version of the index"""
+        self.bitmaps[collection] = RoaringBitmap()
+        self.tokens[collection], self.counts[collection] = {}, {}
+        self.apply_balances(collection, [
+            {'owner': {'addresses': [self.addresses[address_id]]}, 'tokenId': token_id,
+             'amount': '1'} for address_id, token_ids in positions for token_id in token_ids])
+
+    def _add_holder(self, collection, holders, address_id):
+        holders.add(address_id)
+        if self.bloom:
+            self._bloom(collection).add(self.addresses[address_id])
+
+    def _bloom(self, collection):
+        """Func to get the bloom filter of a collection, creating it from every
+        holder already indexed so it never rejects one"""
+        bloom = self.blooms.get(collection)
+        if bloom is None:
+            holders = self.bitmaps.get(collection, RoaringBitmap())
+            bloom = self.blooms[collection] = BloomFilter(
+                max(AirstackConstants.HOLDER_BLOOM_CAPACITY, 2 * len(holders)))
+            for address_id in holders:
+                bloom.add(self.addresses[address_id])
+        return bloom
+
+    def _encode_bloom(self, collection):
+        bloom = self.blooms.get(collection)
+        if bloom is None:
+            return None
+        return [bloom.capacity, bloom.false_positive_rate,
+                base64.b64encode(zlib.compress(bytes(bloom.bits))).decode('ascii')]
+
+    def _addresses(self, bits):
+        return [self.addresses[address_id] for address_id in bits]
@@ -0,0 +1,256 @@
+"""
+Module: media_fetcher.py
+Description: This module contains the concurrent fetcher of nft media and metadata returned by the queries.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+from urllib.parse import unquote_to_bytes, urlsplit
+from airstack.constant import AirstackConstants
+
+
+class MediaResult:
+    """Class for the outcome of fetching one media url
+    """
+
+    def __init__(self, url, resolved_url=None, path=None, size=0, content_type=None,
+                 status_code=None, error=None, data=None):
+        """Init function for media result
+
+        Args:
+            url (str): url as returned by the query
+            resolved_url (str, optional): url actually downloaded, after ipfs gateway
+            rewriting. Defaults to None.
+            path (str, optional): file the content was streamed to. Defaults to None.
+            size (int, optional): content size in bytes. Defaults to 0.
+            content_type (str, optional): content type. Defaults to None.
+            status_code (int, optional): response status code. Defaults to None.
+            error (str, optional): error if there. Defaults to None.
+            data (object, optional): decoded json metadata. Defaults to None.
+        """
+        self.url = url
+        self.resolved_url = resolved_url
+        self.path = path
+        self.size = size
+        self.content_type = content_type
+        self.status_code = status_code
+        self.error = error
+        self.data = data
+
+
+def collect_media_urls(data, keys=AirstackConstants.MEDIA_URL_KEYS):
+    """Func to collect the media urls of a query response
+
+    Args:
+        data (dict|list): query response data
+        keys (tuple, optional): field names holding media urls.
+        Defaults to AirstackConstants.MEDIA_URL_KEYS.
+
+    Returns:
+        list: unique urls, in the order they were found
+    """
+    urls, seen, stack = [], set(), [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if isinstance(value, str) and key in keys and value and value not in seen:
+                    seen.add(value)
+                    urls.append(value)
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return urls
+
+
+class MediaFetcher:
+    """Class to download media and json metadata concurrently
+
+    Identical urls of a batch are fetched once, `ipfs://` urls are rotated
+    across gateways (falling over to the next one on failure), connections
+    are limited per host, content is streamed to disk and downloads above
+    `max_bytes` are aborted. Files already on disk are not downloaded again.
+    """
+
+    def __init__(self, output_dir, concurrency=AirstackConstants.MEDIA_CONCURRENCY,
+                 per_host=AirstackConstants.MEDIA_PER_HOST,
+                 max_bytes=AirstackConstants.MEDIA_MAX_BYTES,
+                 gateways=AirstackConstants.IPFS_GATEWAYS,
+                 timeout=AirstackConstants.MEDIA_TIMEOUT):
+        """Init function for media fetcher
+
+        Args:
+            output_dir (str): directory the content is streamed to
+            concurrency (int, optional): downloads at the same time.
+            per_host (int, optional): connections per host.
+            max_bytes (int, optional): size cap of a single download.
+            gateways (tuple, optional): ipfs gateway prefixes.
+            timeout (float, optional): total timeout of a single download.
+        """
+        self.output_dir = output_dir
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.max_bytes = max_bytes
+        self.gateways = list(gateways)
+        self.timeout = timeout
+        self._next_gateway = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    async def fetch(self, urls):
+        """Async function to fetch a batch of urls
+
+        Args:
+            urls (list): media or metadata urls, duplicates are fetched once
+
+        Returns:
+            dict: url to MediaResult
+        """
+        import asyncio
+        import aiohttp
+        unique_urls = list(dict.fromkeys(url for url in urls if url))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            async def fetch_one(url):
+                async with semaphore:
+                    return await self._fetch_url(session, url)
+            results = await asyncio.gather(*[fetch_one(url) for url in unique_urls])
+        return dict(zip(unique_urls, results))
+
+    async def fetch_from_response(self, data, keys=AirstackConstants.MEDIA_URL_KEYS):
+        """Async function to fetch every media url of a query response
+
+        Args:
+            data (dict|list): query response data, e.g. of get_nfts or get_nft_images
+            keys (tuple, optional): field names holding media urls.
+            Defaults to AirstackConstants.MEDIA_URL_KEYS.
+
+        Returns:
+            dict: url to MediaResult
+        """
+        return await self.fetch(collect_media_urls(data, keys))
+
+    def resolve(self, url):
+        """Func to get the http urls to try for a media url
+
+        Args:
+            url (str): media url
+
+        Returns:
+            list: candidate urls, one per gateway for ipfs urls
+        """
+        if url.startswith('ipfs://'):
+            path = url[len('ipfs://'):]
+            if path.startswith('ipfs/'):
+                path = path[len('ipfs/'):]
+            start = self._next_gateway
+            self._next_gateway = (self._next_gateway + 1) % len(self.gateways)
+            ordered = self.gateways[start:] + self.gateways[:start]
+            return [gateway + path for gateway in ordered]
+        return [url]
+
+    async def _fetch_url(self, session, url):
+        import asyncio
+        if url.startswith('data:'):
+            try:
+                return self._decode_data_url(url)
+            except (binascii.Error, ValueError, OSError) as exec:
+                return MediaResult(url, error=str(exec) or exec.__class__.__name__)
+
+        path = os.path.join(self.output_dir, hashlib.sha256(url.encode('utf-8')).hexdigest())
+        if os.path.exists(path):
+            return self._result_from_file(url, path)
+
+        result = MediaResult(url, error='Unsupported url')
+        for resolved_url in self.resolve(url):
+            if urlsplit(resolved_url).scheme not in ('http', 'https'):
+                break
+            try:
+                result = await self._download(session, url, resolved_url, path)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exec:
+                result = MediaResult(url, resolved_url=resolved_url, error=str(exec) or
+                                     exec.__class__.__name__)
+            if result.error in (None, AirstackConstants.MEDIA_TOO_LARGE_ERROR):
+                break
+        return result
+
+    async def _download(self, session, url, resolved_url, path):
+        temporary_path = '{}.{}.part'.format(path, os.getpid())
+        async with session.get(resolved_url) as response:
+            content_type = response.headers.get('Content-Type')
+            if response.status != AirstackConstants.SUCCESS_STATUS_CODE:
+                return MediaResult(url, resolved_url=resolved_url, status_code=response.status,
+                                   error=response.reason)
+            if (response.content_length or 0) > self.max_bytes:
+                return MediaResult(url, resolved_url=resolved_url, status_code=response.status,
+                                   error=AirstackConstants.MEDIA_TOO_LARGE_ERROR)
+            size = 0
+            try:
+                with open(temporary_path, 'wb') as media_file:
+                    async for chunk in response.content.iter_chunked(
+                            AirstackConstants.MEDIA_CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            return MediaResult(url, resolved_url=resolved_url,
+                                               status_code=response.status,
+                                               error=AirstackConstants.MEDIA_TOO_LARGE_ERROR)
+                        media_file.write(chunk)
+                os.replace(temporary_path, path)
+            finally:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+        with open(path + '.type', 'w', encoding='utf-8') as type_file:
+            type_file.write(content_type or '')
+        return self._result_from_file(url, path, resolved_url, response.status)
+
+    def _result_from_file(self, url, path, resolved_url=None, status_code=None):
+        content_type = None
+        if os.path.exists(path + '.type'):
+            with open(path + '.type', encoding='utf-8') as type_file:
+                content_type = type_file.read() or None
+        result = MediaResult(url, resolved_url=resolved_url, path=path,
+                             size=os.path.getsize(path), content_type=content_type,
+                             status_code=status_code)
+        if _is_json(content_type) or (content_type is None and result.size <=
+                                      AirstackConstants.MEDIA_JSON_SNIFF_BYTES):
+            with open(path, 'rb') as media_file:
+                result.data = _load_json(media_file.read())
+        return result
+
+    def _decode_data_url(self, url):
+        header, _, payload = url[len('data:'):].partition(',')
+        content_type = header.split(';')[0] or None
+        if header.endswith(';base64'):
+            payload = ''.join(unquote_to_bytes(payload).decode('ascii').split())
+            raw = base64.b64decode(payload + '=' * (-len(payload) % 4), validate=True)
+        else:
+            raw = unquote_to_bytes(payload)
+        result = MediaResult(url, size=len(raw), content_type=content_type)
+        if len(raw) > self.max_bytes:
+            result.error = AirstackConstants.MEDIA_TOO_LARGE_ERROR
+        elif _is_json(content_type):
+            result.data = _load_json(raw)
+        else:
+            result.path = os.path.join(self.output_dir,
+                                       hashlib.sha256(url.encode('utf-8')).hexdigest())
+            with open(result.path, 'wb') as media_file:
+                media_file.write(raw)
+        return result
+
+
+def _is_json(content_type):
+    return bool(content_type) and 'json' in content_type
+
+
+def _load_json(raw):
+    try:
+        return json.loads(raw.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError):
+        return None
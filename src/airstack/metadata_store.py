@@ -0,0 +1,297 @@
+"""
+Module: metadata_store.py
+Description: This module contains the persistent content-addressed store for immutable on-chain metadata.
+
+Usage:
+    python -m airstack.metadata_store compact <path>
+    python -m airstack.metadata_store stats <path>
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from airstack.constant import AirstackConstants
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+class MetadataStore:
+    """Class to keep immutable metadata on disk, shared by every process on the host
+
+    Values are serialised to JSON and stored once per content hash in an
+    append-only blob file that is read through a memory map; an SQLite index
+    maps every (method, blockchain, address, tokenId) key to its content hash.
+    Writers and compaction take an exclusive file lock, readers a shared one,
+    so several worker processes can use the same directory. Calls are
+    blocking (file locks, SQLite, fsync on compaction) and thread safe: the
+    async popular queries run them in the default executor of the loop. When the live
+    content is above `max_bytes` the least recently used keys are evicted,
+    and `compact` rewrites the blob file without the evicted content. Entries
+    holding fields that can change, such as `totalSupply`, are written with a
+    ttl and read as misses once it has passed.
+    """
+
+    def __init__(self, path, max_bytes=AirstackConstants.METADATA_STORE_MAX_BYTES):
+        """Init function for metadata store
+
+        Args:
+            path (str): directory of the store, created if missing
+            max_bytes (int, optional): live content size above which keys are evicted.
+            Defaults to AirstackConstants.METADATA_STORE_MAX_BYTES.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._pid = None
+        self._thread_lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._open()
+
+    @staticmethod
+    def make_key(method, blockchain, address, token_id=None):
+        """Func to build the key of a metadata entry
+
+        Args:
+            method (str): popular query method the metadata comes from
+            blockchain (str): blockchain
+            address (str): contract address
+            token_id (str, optional): token id. Defaults to None.
+
+        Returns:
+            str: store key
+        """
+        return '{}:{}:{}:{}'.format(method, blockchain, (address or '').lower(),
+                                    '' if token_id is None else token_id)
+
+    def get(self, key):
+        """Func to read a metadata entry
+
+        Args:
+            key (str): store key
+
+        Returns:
+            object: decoded metadata or None if it is not stored
+        """
+        self._check_process()
+        with self._locked(shared=True):
+            row = self._db.execute(
+                'SELECT b.position, b.length, m.generation FROM entries e '
+                'JOIN blobs b ON b.digest = e.digest, meta m WHERE e.key = ? '
+                'AND (e.expires IS NULL OR e.expires > ?)', (key, time.time())).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            offset, length, generation = row
+            self._map_blobs(generation, offset + length)
+            raw = self._map[offset:offset + length]
+            self._db.execute('UPDATE entries SET accessed = ? WHERE key = ?',
+                             (time.time(), key))
+            self.hits += 1
+        return json.loads(raw.decode('utf-8'))
+
+    def put(self, key, value, ttl=None):
+        """Func to write a metadata entry
+
+        Args:
+            key (str): store key
+            value (object): json serialisable metadata
+            ttl (float, optional): seconds the entry is served for, forever if missing.
+            Defaults to None.
+        """
+        self._check_process()
+        raw = json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(raw).hexdigest()
+        with self._locked(shared=False):
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                generation = self._generation()
+                if self._db.execute('SELECT 1 FROM blobs WHERE digest = ?',
+                                    (digest,)).fetchone() is None:
+                    with open(self._blob_path(generation), 'ab') as blob_file:
+                        offset = blob_file.seek(0, os.SEEK_END)
+                        blob_file.write(raw)
+                    self._db.execute('INSERT INTO blobs (digest, position, length) VALUES (?, ?, ?)',
+                                     (digest, offset, len(raw)))
+                now = time.time()
+                self._db.execute('INSERT OR REPLACE INTO entries (key, digest, accessed, expires) '
+                                 'VALUES (?, ?, ?, ?)',
+                                 (key, digest, now, None if ttl is None else now + ttl))
+                self._evict(key)
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            if os.path.getsize(self._blob_path(generation)) > \
+                    AirstackConstants.METADATA_STORE_COMPACT_RATIO * self.max_bytes:
+                self._compact()
+
+    def compact(self):
+        """Func to rewrite the blob file with only the live content
+
+        Returns:
+            dict: store stats after the compaction
+        """
+        self._check_process()
+        with self._locked(shared=False):
+            self._compact()
+        return self.stats()
+
+    def stats(self):
+        """Func to get the store stats
+
+        Returns:
+            dict: entry and blob counts, live and file sizes, hit and miss counters
+        """
+        self._check_process()
+        with self._thread_lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            blobs, live_bytes = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(length), 0) FROM blobs').fetchone()
+            blob_path = self._blob_path(self._generation())
+        return {
+            'entries': entries,
+            'blobs': blobs,
+            'live_bytes': live_bytes,
+            'file_bytes': os.path.getsize(blob_path) if os.path.exists(blob_path) else 0,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def close(self):
+        """Func to close the index, the memory map and the lock file
+        """
+        with self._thread_lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._db.close()
+            self._lock_file.close()
+
+    def _open(self):
+        self._pid = os.getpid()
+        self._map = None
+        self._map_generation = None
+        self._lock_file = open(os.path.join(self.path, 'store.lock'), 'a+b')
+        self._db = sqlite3.connect(os.path.join(self.path, 'index.db'), timeout=30,
+                                   isolation_level=None, check_same_thread=False)
+        with self._locked(shared=False):
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS meta (generation INTEGER NOT NULL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, '
+                             'position INTEGER NOT NULL, length INTEGER NOT NULL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, '
+                             'digest TEXT NOT NULL, accessed REAL NOT NULL)')
+            columns = [row[1] for row in self._db.execute('PRAGMA table_info(entries)')]
+            if 'expires' not in columns:
+                self._db.execute('ALTER TABLE entries ADD COLUMN expires REAL')
+            self._db.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)')
+            if self._db.execute('SELECT COUNT(*) FROM meta').fetchone()[0] == 0:
+                self._db.execute('INSERT INTO meta (generation) VALUES (0)')
+
+    def _check_process(self):
+        # connections, maps and locks must not be shared with a forked child
+        if self._pid != os.getpid():
+            self._open()
+
+    @contextmanager
+    def _locked(self, shared):
+        # flock is held per open file, so threads of this process also need a lock
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _generation(self):
+        return self._db.execute('SELECT generation FROM meta').fetchone()[0]
+
+    def _blob_path(self, generation):
+        return os.path.join(self.path, 'blobs.{}.bin'.format(generation))
+
+    def _map_blobs(self, generation, size):
+        """Func to (re)map the blob file when it was compacted or has grown"""
+        if self._map is not None and self._map_generation == generation and \
+                len(self._map) >= size:
+            return
+        if self._map is not None:
+            self._map.close()
+        with open(self._blob_path(generation), 'rb') as blob_file:
+            self._map = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._map_generation = generation
+
+    def _evict(self, key):
+        """Func to evict the least recently used keys, one at a time and never the
+        key just written, until the live content fits in max_bytes"""
+        live_bytes = self._db.execute('SELECT COALESCE(SUM(length), 0) FROM blobs').fetchone()[0]
+        while live_bytes > self.max_bytes:
+            row = self._db.execute('SELECT key, digest FROM entries WHERE key != ? '
+                                   'ORDER BY accessed LIMIT 1', (key,)).fetchone()
+            if row is None:
+                break
+            evicted_key, digest = row
+            self._db.execute('DELETE FROM entries WHERE key = ?', (evicted_key,))
+            if self._db.execute('SELECT 1 FROM entries WHERE digest = ?',
+                                (digest,)).fetchone() is None:
+                live_bytes -= self._db.execute('SELECT length FROM blobs WHERE digest = ?',
+                                               (digest,)).fetchone()[0]
+                self._db.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+
+    def _compact(self):
+        generation = self._generation()
+        new_generation = generation + 1
+        old_path, new_path = self._blob_path(generation), self._blob_path(new_generation)
+        if os.path.exists(old_path) and os.path.getsize(old_path):
+            self._map_blobs(generation, os.path.getsize(old_path))
+        offsets = []
+        with open(new_path, 'wb') as new_file:
+            for digest, offset, length in self._db.execute(
+                    'SELECT digest, position, length FROM blobs ORDER BY position').fetchall():
+                offsets.append((new_file.tell(), digest))
+                new_file.write(self._map[offset:offset + length])
+            new_file.flush()
+            os.fsync(new_file.fileno())
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            self._db.executemany('UPDATE blobs SET position = ? WHERE digest = ?', offsets)
+            self._db.execute('UPDATE meta SET generation = ?', (new_generation,))
+            self._db.execute('COMMIT')
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            os.remove(new_path)
+            raise
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if os.path.exists(old_path):
+            os.remove(old_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain an airstack metadata store')
+    parser.add_argument('command', choices=['compact', 'stats'])
+    parser.add_argument('path', help='directory of the store')
+    args = parser.parse_args()
+    store = MetadataStore(args.path)
+    result = store.compact() if args.command == 'compact' else store.stats()
+    store.close()
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Module: mirror.py
+Description: This module contains the local SQLite read-through mirror of popular query results.
+"""
+
+import json
+import sqlite3
+import time
+from airstack.constant import AirstackConstants
+
+
+class LocalMirror:
+    """Class to keep popular query results in a local SQLite database
+
+    Every page of a mirrored method is upserted with the query and page info
+    it was fetched with, keyed by (method, variables, page number). A later
+    call is answered from the database while the page is younger than the
+    staleness of its method, and navigating to a page that is missing or
+    stale goes to the api from the stored cursors. Fetching a page again
+    drops the pages after it, which were reached from its old cursors. In
+    offline mode every stored page is served whatever its age and nothing is
+    requested.
+    """
+
+    def __init__(self, path, staleness=None, offline=False):
+        """Init function for local mirror
+
+        Args:
+            path (str): SQLite database file, created if missing
+            staleness (dict, optional): method name to the seconds a page is served for,
+            merged over AirstackConstants.MIRROR_STALENESS. Defaults to None.
+            offline (bool, optional): serve stored pages of any age and never call the
+            api. Defaults to False.
+        """
+        self.path = path
+        self.staleness = dict(AirstackConstants.MIRROR_STALENESS, **(staleness or {}))
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS pages (method TEXT NOT NULL, variables TEXT NOT NULL, '
+            'page INTEGER NOT NULL, blockchain TEXT, address TEXT, fetched_at REAL NOT NULL, '
+            'query TEXT, page_info TEXT, data TEXT NOT NULL, '
+            'PRIMARY KEY (method, variables, page))')
+        self.connection.execute('DROP INDEX IF EXISTS pages_address')
+
+    @staticmethod
+    def variables_key(variables):
+        """Func to build the key of the variables of a call
+
+        Args:
+            variables (dict): variables of the query
+
+        Returns:
+            str: json encoded variables with sorted keys
+        """
+        return json.dumps(variables or {}, sort_keys=True)
+
+    def get(self, method, variables, page=0):
+        """Func to read a stored page if it is fresh enough
+
+        Args:
+            method (str): popular query method name
+            variables (dict): variables of the query
+            page (int, optional): page number from the first page. Defaults to 0.
+
+        Returns:
+            QueryResponse: stored page, None if it is missing or stale
+        """
+        row = self.connection.execute(
+            'SELECT fetched_at, query, page_info, data FROM pages '
+            'WHERE method = ? AND variables = ? AND page = ?',
+            (method, self.variables_key(variables), page)).fetchone()
+        if row is None or (not self.offline and
+                           time.time() - row[0] > self.staleness.get(method, 0)):
+            self.misses += 1
+            return None
+        self.hits += 1
+        from airstack.execute_query import QueryResponse
+        page_info = json.loads(row[2]) if row[2] else None
+        return QueryResponse(json.loads(row[3]), AirstackConstants.SUCCESS_STATUS_CODE, None,
+                             _has_cursor(page_info, 'nextCursor'),
+                             _has_cursor(page_info, 'prevCursor'),
+                             query=row[1], page_info=page_info)
+
+    def put(self, method, variables, page, query_response):
+        """Func to upsert a page, dropping the stored pages after it as they were
+        reached from other cursors
+
+        Args:
+            method (str): popular query method name
+            variables (dict): variables of the query
+            page (int): page number from the first page
+            query_response (QueryResponse): successful response of the page
+        """
+        variables = variables or {}
+        variables_key = self.variables_key(variables)
+        with self.connection:
+            self.connection.execute('BEGIN')
+            self.connection.execute(
+                'DELETE FROM pages WHERE method = ? AND variables = ? AND page > ?',
+                (method, variables_key, page))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (method, variables_key, page, variables.get('blockchain'),
+                 (variables.get('address') or variables.get('tokenAddress') or
+                  variables.get('owner') or '').lower() or None, time.time(),
+                 query_response.query, json.dumps(query_response.page_info)
+                 if query_response.page_info is not None else None,
+                 json.dumps(query_response.data)))
+
+    async def serve(self, client, method, variables, fetch):
+        """Async function to answer a popular query from the mirror, or from the api
+        and mirror the result
+
+        Args:
+            client (AirstackClient): api client
+            method (str): popular query method name
+            variables (dict): variables of the query
+            fetch (func): coroutine function calling the api
+
+        Returns:
+            QueryResponse: first page, navigating through the mirror
+        """
+        return await self._page(client, method, variables, 0, fetch)
+
+    def stats(self):
+        """Func to get the mirror counters
+
+        Returns:
+            dict: stored pages, hits and misses
+        """
+        pages = self.connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+        return {'pages': pages, 'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        """Func to close the database
+        """
+        self.connection.close()
+
+    async def _page(self, client, method, variables, page, fetch):
+        from airstack.execute_query import QueryResponse
+        query_response = self.get(method, variables, page)
+        if query_response is not None:
+            return self._navigable(client, method, variables, page, query_response, None)
+        if self.offline:
+            return QueryResponse(None, None, AirstackConstants.MIRROR_MISS_ERROR)
+        query_response = await fetch()
+        if query_response.error is not None:
+            return query_response
+        self.put(method, variables, page, query_response)
+        return self._navigable(client, method, variables, page, query_response, query_response)
+
+    def _navigable(self, client, method, variables, page, query_response, network_response):
+        """Func to route the page navigation of a response through the mirror, from
+        the coroutines of the api response or from the stored cursors"""
+        if query_response.page_info is None:
+            return query_response
+        network_next = network_response.get_next_page if network_response else None
+        network_prev = network_response.get_prev_page if network_response else None
+
+        async def fetch_next():
+            if network_next is not None:
+                return await network_next
+            execute_query = client.create_execute_query_object(
+                query=query_response.query, variables=variables)
+            return await execute_query.get_next_page(query_response.query, None,
+                                                     query_response.page_info)
+
+        async def fetch_prev():
+            if network_prev is not None:
+                return await network_prev
+            execute_query = client.create_execute_query_object(
+                query=query_response.query, variables=variables)
+            execute_query.deleted_queries.append(None)
+            return await execute_query.get_prev_page(query_response.query, None,
+                                                     query_response.page_info)
+
+        query_response.get_next_page = self._page(client, method, variables, page + 1,
+                                                  fetch_next)
+        query_response.get_prev_page = self._page(client, method, variables,
+                                                  max(0, page - 1), fetch_prev)
+        return query_response
+
+
+def _has_cursor(page_info, cursor):
+    if page_info is None:
+        return None
+    return any(value[cursor] != '' for value in page_info.values())
@@ -0,0 +1,145 @@
+"""
+Module: multi_chain.py
+Description: This module contains the fan-out of a popular query over several blockchains and the merge of their rows.
+"""
+
+_DONE = object()
+
+# popular query methods returning pages of rows: method -> (root field, rows field)
+MULTI_CHAIN_ROWS = {
+    'get_token_balances': ('TokenBalances', 'TokenBalance'),
+    'get_holders_of_collection': ('TokenBalances', 'TokenBalance'),
+    'get_holders_of_nft': ('TokenBalances', 'TokenBalance'),
+    'get_token_transfers': ('TokenTransfers', 'TokenTransfer'),
+    'get_nft_transfers': ('TokenTransfers', 'TokenTransfer'),
+    'get_nfts': ('TokenNfts', 'TokenNft'),
+    'get_ens_subdomains': ('Domains', 'Domain')
+}
+
+
+def response_rows(method, data):
+    """Func to get the rows of a popular query response
+
+    Args:
+        method (str): key of MULTI_CHAIN_ROWS
+        data (dict): query response data
+
+    Returns:
+        list: rows of the response
+    """
+    root, items = rows_spec(method)
+    return list(((data or {}).get(root) or {}).get(items) or [])
+
+
+def rows_spec(method):
+    """Func to get the fields holding the rows of a popular query method
+
+    Args:
+        method (str): popular query method name
+
+    Returns:
+        Tuple: root field, rows field
+
+    Raises:
+        ValueError: the method does not return pages of rows
+    """
+    if method not in MULTI_CHAIN_ROWS:
+        raise ValueError('{} does not return pages of rows, use one of: {}.'.format(
+            method, ', '.join(sorted(MULTI_CHAIN_ROWS))))
+    return MULTI_CHAIN_ROWS[method]
+
+
+async def stream_multi_chain(queries, method, variables, blockchains):
+    """Async iterator running a popular query on several blockchains concurrently
+
+    Every blockchain is paginated independently and its rows are yielded as
+    soon as a page arrives, so the order between blockchains is the order of
+    arrival. A failing blockchain yields its error and stops, the others go on.
+
+    Args:
+        queries (ExecutePopularQueries): popular queries object
+        method (str): popular query method name, a key of MULTI_CHAIN_ROWS
+        variables (dict): variables of the query, without `blockchain`
+        blockchains (list): blockchains to query
+
+    Yields:
+        Tuple: blockchain, row tagged with its `blockchain` or None, error or None
+    """
+    import asyncio
+    rows_spec(method)
+    pages = asyncio.Queue(maxsize=2 * max(1, len(blockchains)))
+
+    async def crawl(blockchain):
+        try:
+            await _crawl_pages(queries, method, dict(variables, blockchain=blockchain),
+                               blockchain, pages)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exec:
+            await pages.put((blockchain, None, str(exec)))
+        await pages.put((blockchain, _DONE, None))
+
+    tasks = [asyncio.ensure_future(crawl(blockchain)) for blockchain in blockchains]
+    running = len(tasks)
+    try:
+        while running:
+            blockchain, rows, error = await pages.get()
+            if rows is _DONE:
+                running -= 1
+            elif error is not None:
+                yield blockchain, None, error
+            else:
+                for row in rows:
+                    yield blockchain, dict(row, blockchain=blockchain), None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _crawl_pages(queries, method, variables, blockchain, pages):
+    query_response = await getattr(queries, method)(variables)
+    while True:
+        if query_response.error is not None:
+            await pages.put((blockchain, None, query_response.error))
+            return
+        await pages.put((blockchain, response_rows(method, query_response.data), None))
+        if not query_response.has_next_page:
+            return
+        query_response = await query_response.get_next_page
+
+
+async def execute_multi_chain(queries, method, variables, blockchains, order_by=None,
+                              descending=False):
+    """Async function to run a popular query on several blockchains and merge the rows
+
+    Ordered results are not streamed: with `order_by` every page of every
+    blockchain is collected before the rows are sorted.
+
+    Args:
+        queries (ExecutePopularQueries): popular queries object
+        method (str): popular query method name, a key of MULTI_CHAIN_ROWS
+        variables (dict): variables of the query, without `blockchain`
+        blockchains (list): blockchains to query
+        order_by (str, optional): row field the merged rows are sorted by, rows
+        without it last. Defaults to None.
+        descending (bool, optional): sort from the largest value. Defaults to False.
+
+    Returns:
+        Tuple: merged rows tagged with their `blockchain`, blockchain to error
+
+    Raises:
+        ValueError: the method does not return pages of rows
+    """
+    rows, errors = [], {}
+    async for blockchain, row, error in stream_multi_chain(queries, method, variables,
+                                                           blockchains):
+        if error is not None:
+            errors[blockchain] = error
+        else:
+            rows.append(row)
+    if order_by is not None:
+        present = [row for row in rows if row.get(order_by) is not None]
+        missing = [row for row in rows if row.get(order_by) is None]
+        present.sort(key=lambda row: row[order_by], reverse=descending)
+        rows = present + missing
+    return rows, errors
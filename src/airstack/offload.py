@@ -0,0 +1,197 @@
+"""
+Module: offload.py
+Description: This module contains the executor offloading of json decoding, pageInfo lookup and query rewriting, and the event loop lag monitor.
+"""
+
+import json
+import time
+from collections import deque
+from airstack.constant import AirstackConstants
+
+
+def decode_json(body):
+    """Func to decode a json response body
+
+    Args:
+        body (bytes): response body
+
+    Returns:
+        object: decoded json, or the body text if it is not json
+    """
+    text = body.decode('utf-8', errors='replace') if isinstance(body, bytes) else body
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+class PageData(dict):
+    """Class for response data decoded with the pageInfo of its root fields, so the
+    page does not have to be walked again on the event loop
+    """
+
+    def __init__(self, data, page_info):
+        """Init function for page data
+
+        Args:
+            data (dict): api response data
+            page_info (dict): pageInfo per root field
+        """
+        super().__init__(data)
+        self.page_info = page_info
+
+
+def decode_page(body):
+    """Func to decode a response body and find the pageInfo of its data
+
+    Args:
+        body (bytes): response body
+
+    Returns:
+        object: decoded json, with its data as PageData, or the body text if it is
+        not json
+    """
+    from airstack.generic import find_page_infos
+    decoded = decode_json(body)
+    if isinstance(decoded, dict) and isinstance(decoded.get('data'), dict):
+        decoded['data'] = PageData(decoded['data'], find_page_infos(decoded['data']))
+    return decoded
+
+
+class Offloader:
+    """Class to run cpu bound work off the event loop thread
+
+    Bodies larger than `threshold` bytes are decoded in the executor, along
+    with the pageInfo lookup of their data, and query rewriting for pagination
+    runs there too, so a multi-megabyte page does not block every other
+    request in flight. A process pool also
+    decodes in parallel with the loop; a thread pool only yields the GIL.
+    """
+
+    def __init__(self, executor=AirstackConstants.OFFLOAD_THREAD, max_workers=None,
+                 threshold=AirstackConstants.OFFLOAD_THRESHOLD_BYTES):
+        """Init function for offloader
+
+        Args:
+            executor (str|Executor, optional): 'thread', 'process' or an executor.
+            Defaults to 'thread'.
+            max_workers (int, optional): workers of the pool. Defaults to None.
+            threshold (int, optional): body size offloaded, in bytes.
+            Defaults to AirstackConstants.OFFLOAD_THRESHOLD_BYTES.
+        """
+        from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+        if isinstance(executor, Executor):
+            self.executor = executor
+        elif executor == AirstackConstants.OFFLOAD_PROCESS:
+            self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        elif executor == AirstackConstants.OFFLOAD_THREAD:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        else:
+            raise ValueError("executor must be 'thread', 'process' or an Executor.")
+        self.threshold = threshold
+        self.offloaded = 0
+        self.inline = 0
+
+    async def run(self, func, *args):
+        """Async function to run a function in the executor
+
+        Args:
+            func (func): picklable function for a process pool
+            *args: arguments of the function
+
+        Returns:
+            object: function result
+        """
+        import asyncio
+        self.offloaded += 1
+        return await asyncio.get_event_loop().run_in_executor(self.executor, func, *args)
+
+    async def decode_json(self, body):
+        """Async function to decode a response body, off the loop if it is large
+
+        Args:
+            body (bytes): response body
+
+        Returns:
+            object: decoded json, or the body text if it is not json. The data of a
+            large body is PageData.
+        """
+        if len(body) < self.threshold:
+            self.inline += 1
+            return decode_json(body)
+        return await self.run(decode_page, body)
+
+    def shutdown(self):
+        """Func to shut the executor down
+        """
+        self.executor.shutdown(wait=False)
+
+    def metrics(self):
+        """Func to get the offloading counters
+
+        Returns:
+            dict: offloaded and inline counters, and the size threshold
+        """
+        return {
+            'offloaded': self.offloaded,
+            'inline': self.inline,
+            'threshold': self.threshold
+        }
+
+
+class LoopLagMonitor:
+    """Class to measure how late the event loop wakes up from a sleep
+    """
+
+    def __init__(self, interval=AirstackConstants.LOOP_LAG_INTERVAL,
+                 window=AirstackConstants.LATENCY_WINDOW):
+        """Init function for loop lag monitor
+
+        Args:
+            interval (float, optional): seconds between two probes.
+            Defaults to AirstackConstants.LOOP_LAG_INTERVAL.
+            window (int, optional): number of samples kept.
+            Defaults to AirstackConstants.LATENCY_WINDOW.
+        """
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        """Func to start probing the running event loop
+        """
+        import asyncio
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._probe())
+
+    def stop(self):
+        """Func to stop probing
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _probe(self):
+        import asyncio
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def metrics(self):
+        """Func to get the loop lag stats
+
+        Returns:
+            dict: mean, p99 and max lag in seconds
+        """
+        if not self.samples:
+            return {'mean': None, 'p99': None, 'max': None}
+        ordered = sorted(self.samples)
+        return {
+            'mean': sum(ordered) / len(ordered),
+            'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            'max': self.max_lag
+        }
@@ -0,0 +1,168 @@
+"""
+Module: page_cache.py
+Description: This module contains the bounded cache of visited pages used for local prev/next navigation.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from airstack.constant import AirstackConstants
+
+
+class CachedPage:
+    """Class for a page kept in the page cache
+    """
+
+    def __init__(self, query, variables, data, status_code, page_info, size):
+        """Init function for cached page
+
+        Args:
+            query (str): paginated query of the page
+            variables (dict): variables the page was fetched with
+            data (dict): response data
+            status_code (int): response status code
+            page_info (dict): page info of every root field
+            size (int): estimated size in bytes
+        """
+        self.query = query
+        self.variables = variables
+        self.data = data
+        self.status_code = status_code
+        self.page_info = page_info
+        self.size = size
+        self.stored_at = time.monotonic()
+
+
+def navigation_key(direction, query, variables, page_info):
+    """Func to build the key of a move from a page
+
+    Args:
+        direction (str): 'next' or 'prev'
+        query (str): paginated query of the page moved from
+        variables (dict): variables of the page moved from
+        page_info (dict): page info of the page moved from
+
+    Returns:
+        tuple: navigation key
+    """
+    cursor = 'nextCursor' if direction == 'next' else 'prevCursor'
+    return (direction, page_key(query, variables),
+            tuple(sorted((key, value[cursor]) for key, value in page_info.items())))
+
+
+def page_key(query, variables):
+    """Func to build the key of a page
+
+    Args:
+        query (str): paginated query of the page
+        variables (dict): variables of the page
+
+    Returns:
+        str: page key
+    """
+    return '{}\0{}'.format(query, json.dumps(variables or {}, sort_keys=True))
+
+
+class PageCache:
+    """Class to keep the recently visited pages of one paginated query
+
+    Pages are kept least recently used first out, within `max_pages` pages
+    and `max_bytes` of estimated json size. Every move between two pages is
+    linked both ways (next from the first page, prev from the second one),
+    so stepping back and forth over recently seen pages needs neither a
+    request nor a query rewrite. Pages older than `staleness` seconds are
+    fetched again.
+    """
+
+    def __init__(self, max_pages=AirstackConstants.PAGE_CACHE_MAX_PAGES,
+                 max_bytes=AirstackConstants.PAGE_CACHE_MAX_BYTES,
+                 staleness=AirstackConstants.PAGE_CACHE_STALENESS):
+        """Init function for page cache
+
+        Args:
+            max_pages (int, optional): pages kept.
+            Defaults to AirstackConstants.PAGE_CACHE_MAX_PAGES.
+            max_bytes (int, optional): estimated size of the pages kept.
+            Defaults to AirstackConstants.PAGE_CACHE_MAX_BYTES.
+            staleness (float, optional): seconds a page is served for.
+            Defaults to AirstackConstants.PAGE_CACHE_STALENESS.
+        """
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.staleness = staleness
+        self.pages = OrderedDict()
+        self.links = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, query_response, variables):
+        """Func to keep a fetched page
+
+        Args:
+            query_response (QueryResponse): successful paginated response
+            variables (dict): variables the page was fetched with
+        """
+        key = page_key(query_response.query, variables)
+        size = len(json.dumps(query_response.data))
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self.pages[key] = CachedPage(query_response.query, dict(variables or {}),
+                                     query_response.data, query_response.status_code,
+                                     query_response.page_info, size)
+        self.bytes += size
+        while len(self.pages) > self.max_pages or self.bytes > self.max_bytes:
+            self._remove(next(iter(self.pages)))
+
+    def link(self, navigation, query, variables, deleted_queries):
+        """Func to remember which page a move leads to
+
+        Args:
+            navigation (tuple): navigation key
+            query (str): paginated query of the page moved to
+            variables (dict): variables of the page moved to
+            deleted_queries (list): deleted queries entries pushed by the move
+        """
+        self.links[navigation] = (page_key(query, variables), deleted_queries)
+        self.links.move_to_end(navigation)
+        while len(self.links) > 2 * self.max_pages:
+            self.links.popitem(last=False)
+
+    def follow(self, navigation):
+        """Func to get the page a move leads to, if it is kept and fresh
+
+        Args:
+            navigation (tuple): navigation key
+
+        Returns:
+            Tuple: CachedPage and the deleted queries entries of the move, or None
+        """
+        target = self.links.get(navigation)
+        page = self.pages.get(target[0]) if target is not None else None
+        if page is None or time.monotonic() - page.stored_at > self.staleness:
+            self.misses += 1
+            return None
+        self.pages.move_to_end(target[0])
+        self.hits += 1
+        return page, target[1]
+
+    def metrics(self):
+        """Func to get the cache counters
+
+        Returns:
+            dict: pages, bytes, hits, misses and hit rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            'pages': len(self.pages),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None
+        }
+
+    def _remove(self, key):
+        page = self.pages.pop(key, None)
+        if page is not None:
+            self.bytes -= page.size
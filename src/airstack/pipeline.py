@@ -0,0 +1,266 @@
+"""
+Module: pipeline.py
+Description: This module contains the staged processing pipeline with per-stage workers and bounded queues.
+"""
+
+import inspect
+import time
+from airstack.constant import AirstackConstants
+
+_DONE = object()
+
+
+async def iterate_pages(query_response):
+    """Async iterator of the pages of a paginated query, for a fetch stage
+
+    Args:
+        query_response (QueryResponse): first page
+
+    Yields:
+        QueryResponse: every page, the page with an error being the last one
+    """
+    while True:
+        yield query_response
+        if query_response.error is not None or not query_response.has_next_page:
+            return
+        query_response = await query_response.get_next_page
+
+
+class Stage:
+    """Class for one step of a pipeline and its counters
+
+    An 'async' stage runs `workers` coroutines on the event loop, a 'thread'
+    or 'process' stage runs its function on a pool of `workers` threads or
+    processes. A stage with `fan_out` emits every element of the iterable or
+    async iterator its function returns, e.g. every page of a query or every
+    row of a page. Results that are None are dropped.
+    """
+
+    def __init__(self, name, func, workers=1, kind=AirstackConstants.PIPELINE_ASYNC,
+                 queue_size=AirstackConstants.PIPELINE_QUEUE_SIZE, fan_out=False):
+        """Init function for stage
+
+        Args:
+            name (str): stage name in the stats
+            func (func): coroutine function, async generator function or function of
+            an item; picklable for a process stage
+            workers (int, optional): items processed at the same time. Defaults to 1.
+            kind (str, optional): 'async', 'thread' or 'process'. Defaults to 'async'.
+            queue_size (int, optional): items waiting for the stage.
+            Defaults to AirstackConstants.PIPELINE_QUEUE_SIZE.
+            fan_out (bool, optional): emit the elements of every result.
+            Defaults to False.
+        """
+        if kind not in (AirstackConstants.PIPELINE_ASYNC, AirstackConstants.OFFLOAD_THREAD,
+                        AirstackConstants.OFFLOAD_PROCESS):
+            raise ValueError("kind must be 'async', 'thread' or 'process'.")
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.kind = kind
+        self.queue_size = queue_size
+        self.fan_out = fan_out
+        self.processed = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.max_depth = 0
+        self.queue = None
+
+    def metrics(self, elapsed):
+        """Func to get the stage counters
+
+        Args:
+            elapsed (float): seconds the pipeline has been running
+
+        Returns:
+            dict: items processed, emitted and failed, throughput, utilization of
+            the workers, seconds blocked on the next queue, current and max depth
+            of the input queue
+        """
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'processed': self.processed,
+            'emitted': self.emitted,
+            'errors': self.errors,
+            'throughput': self.processed / elapsed if elapsed else None,
+            'utilization': self.busy / (elapsed * self.workers) if elapsed else None,
+            'blocked': self.blocked,
+            'depth': self.queue.qsize() if self.queue is not None else 0,
+            'max_depth': self.max_depth
+        }
+
+
+class Pipeline:
+    """Class to run items through a chain of stages
+
+    Stages are linked by bounded queues, so a slow stage fills the queue in
+    front of it and blocks the stages upstream down to the source instead of
+    letting items pile up in memory. Each stage has its own workers, and the
+    stats show where the time goes: the bottleneck is the stage with the
+    highest utilization, and the stages before it spend their time blocked.
+    Items are emitted in order of completion, not in order of arrival.
+    """
+
+    def __init__(self, stages):
+        """Init function for pipeline
+
+        Args:
+            stages (list): Stage objects, in processing order
+        """
+        if not stages:
+            raise ValueError("a pipeline needs at least one stage.")
+        self.stages = stages
+        self.started = None
+        self.finished = None
+
+    async def run(self, items):
+        """Async function to collect every result of the last stage
+
+        Args:
+            items (iterable): items fed to the first stage, or an async iterable
+
+        Returns:
+            Tuple: results, first error or None
+        """
+        results, error = [], None
+        async for result, result_error in self.stream(items):
+            if result_error is not None:
+                error = error or result_error
+            else:
+                results.append(result)
+        return results, error
+
+    async def stream(self, items):
+        """Async iterator of the results of the last stage
+
+        Args:
+            items (iterable): items fed to the first stage, or an async iterable
+
+        Yields:
+            Tuple: result or None, error message prefixed with the stage name or None
+        """
+        import asyncio
+        from airstack.offload import Offloader
+        self.started = time.monotonic()
+        self.finished = None
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.queue_size)
+        output = asyncio.Queue(maxsize=AirstackConstants.PIPELINE_QUEUE_SIZE)
+        offloaders = [Offloader(stage.kind, max_workers=stage.workers)
+                      if stage.kind != AirstackConstants.PIPELINE_ASYNC else None
+                      for stage in self.stages]
+        tasks = [asyncio.ensure_future(self._feed(items, output))]
+        remaining = [stage.workers for stage in self.stages]
+        for index, stage in enumerate(self.stages):
+            following = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            tasks.extend(asyncio.ensure_future(
+                self._worker(index, offloaders[index], following, output, remaining))
+                for _ in range(stage.workers))
+        try:
+            while True:
+                result, error = await output.get()
+                if result is _DONE:
+                    break
+                yield result, error
+        finally:
+            self.finished = time.monotonic()
+            for task in tasks:
+                task.cancel()
+            for offloader in offloaders:
+                if offloader is not None:
+                    offloader.shutdown()
+
+    def metrics(self):
+        """Func to get the pipeline stats
+
+        Returns:
+            dict: elapsed seconds, stats per stage and the name of the busiest stage
+        """
+        if self.started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished or time.monotonic()) - self.started
+        stages = {stage.name: stage.metrics(elapsed) for stage in self.stages}
+        busiest = max(self.stages, key=lambda stage: stages[stage.name]['utilization'] or 0)
+        return {
+            'elapsed': elapsed,
+            'stages': stages,
+            'bottleneck': busiest.name if busiest.processed else None
+        }
+
+    async def _feed(self, items, output):
+        first = self.stages[0]
+        try:
+            if hasattr(items, '__aiter__'):
+                async for item in items:
+                    await self._put(first, item)
+            else:
+                for item in items:
+                    await self._put(first, item)
+        except Exception as exec:
+            await output.put((None, 'source: {}'.format(exec)))
+        for _ in range(first.workers):
+            await first.queue.put(_DONE)
+
+    async def _worker(self, index, offloader, following, output, remaining):
+        stage = self.stages[index]
+        while True:
+            item = await stage.queue.get()
+            if item is _DONE:
+                break
+            stage.processed += 1
+            started = time.monotonic()
+            try:
+                if offloader is not None:
+                    result = await offloader.run(stage.func, item)
+                else:
+                    result = stage.func(item)
+                if inspect.isasyncgen(result):
+                    async for element in result:
+                        stage.busy += time.monotonic() - started
+                        await self._emit(stage, following, output, element)
+                        started = time.monotonic()
+                    continue
+                if inspect.isawaitable(result):
+                    result = await result
+                stage.busy += time.monotonic() - started
+                started = None
+                if stage.fan_out and result is not None:
+                    for element in result:
+                        await self._emit(stage, following, output, element)
+                else:
+                    await self._emit(stage, following, output, result)
+            except Exception as exec:
+                if started is not None:
+                    stage.busy += time.monotonic() - started
+                stage.errors += 1
+                await output.put((None, '{}: {}'.format(stage.name, exec)))
+        remaining[index] -= 1
+        if remaining[index]:
+            return
+        if following is None:
+            await output.put((_DONE, None))
+        else:
+            for _ in range(following.workers):
+                await following.queue.put(_DONE)
+
+    async def _emit(self, stage, following, output, result):
+        if result is None:
+            return
+        stage.emitted += 1
+        if following is None:
+            await output.put((result, None))
+            return
+        started = time.monotonic()
+        await self._put(following, result)
+        stage.blocked += time.monotonic() - started
+
+    @staticmethod
+    async def _put(stage, item):
+        await stage.queue.put(item)
+        stage.max_depth = max(stage.max_depth, stage.queue.qsize())
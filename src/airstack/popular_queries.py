@@ -3,23 +3,131 @@ Module: popular_queries.py
 Description: This module contains the methods of popular queries.
 """
 
-from airstack.execute_query import AirstackClient
+import inspect
+from airstack.execute_query import AirstackClient, QueryResponse
+from airstack.constant import AirstackConstants
+from airstack.entity_store import EntityStore
+
+_POPULAR_QUERIES = None
+
+
+def get_popular_queries():
+    """Func to get the registry of popular queries, built on first use
+
+    Returns:
+        dict: popular query name to the ExecutePopularQueries method
+    """
+    global _POPULAR_QUERIES
+    if _POPULAR_QUERIES is None:
+        _POPULAR_QUERIES = {
+            name: method for name, method in vars(ExecutePopularQueries).items()
+            if name.startswith('get_') and inspect.iscoroutinefunction(method)
+        }
+    return _POPULAR_QUERIES
 
 class ExecutePopularQueries():
     """Class to store popular queries function
     """
 
-    def __init__(self, url=None, api_key=None, timeout=None):
+    def __init__(self, url=None, api_key=None, timeout=None, client=None, priority=None,
+                 tenant=None):
         """Init function for popular queries
 
         Args:
             url (str, optional): base url for server. Defaults to None.
             api_key (str, required): api key. Defaults to None.
+            timeout (float, optional): timeout for api. Defaults to None.
+            client (AirstackClient, optional): client whose settings are shared.
+            Defaults to None.
+            priority (str, optional): 'interactive', 'normal' or 'bulk' scheduling class
+            of the queries. Defaults to 'normal'.
+            tenant (str, optional): tenant the client's requests are fairly shared with.
+            Defaults to None.
+
+        """
+        if client is None:
+            client = AirstackClient(url=url, api_key=api_key, timeout=timeout)
+        self.client = client
+        self.url = client.url
+        self.timeout = client.timeout
+        self.api_key = client.api_key
+        self.priority = priority
+        self.tenant = tenant
+
+    async def _get_stored_metadata(self, method, variables):
+        """Async function to look up immutable metadata in the client's metadata store,
+        in the default executor as the store blocks on file locks and SQLite
+
+        Args:
+            method (str): popular query method name
+            variables (dict): variables of the query
+
+        Returns:
+            Tuple: store key or None, QueryResponse or None if not stored
+        """
+        store = self.client.get_metadata_store()
+        if store is None:
+            return None, None
+        key = store.make_key(method, variables.get('blockchain'), variables.get('address'),
+                             variables.get('tokenId'))
+        import asyncio
+        data = await asyncio.get_event_loop().run_in_executor(None, store.get, key)
+        if data is None:
+            return key, None
+        return key, QueryResponse(data, AirstackConstants.SUCCESS_STATUS_CODE, None)
 
+    def _get_known_entity(self, key, query):
+        """Func to answer a lookup from the client's entity store
+
+        Args:
+            key (tuple): entity key
+            query (str): GraphQL query string of the lookup
+
+        Returns:
+            QueryResponse: response built from the known entity, None if a field is missing
+        """
+        if self.client.entity_store is None:
+            return None
+        from airstack.entity_store import selected_fields
+        root, fields = selected_fields(query)
+        entity = self.client.entity_store.lookup(key, fields)
+        if entity is None:
+            return None
+        return QueryResponse({root: entity}, AirstackConstants.SUCCESS_STATUS_CODE, None)
+
+    async def _mirrored(self, method, variables, fetch):
+        """Async function to answer a popular query through the client's local mirror
+
+        Args:
+            method (str): popular query method name
+            variables (dict): variables of the query
+            fetch (func): coroutine function calling the api
+
+        Returns:
+            QueryResponse: query response
+        """
+        mirror = self.client.get_mirror()
+        if mirror is None:
+            return await fetch()
+        return await mirror.serve(self.client, method, variables, fetch)
+
+    async def _store_metadata(self, key, query_response, ttl=None):
+        """Async function to save a successful metadata response in the client's
+        metadata store, in the default executor
+
+        Args:
+            key (str): store key, None if there is no store
+            query_response (QueryResponse): query response
+            ttl (float, optional): seconds the response is served for, forever if
+            missing. Defaults to None.
         """
-        self.url = url
-        self.timeout = timeout
-        self.api_key = api_key
+        if key is None or query_response.error is not None or not query_response.data:
+            return
+        if any(value is None for value in query_response.data.values()):
+            return
+        import asyncio
+        await asyncio.get_event_loop().run_in_executor(
+            None, self.client.get_metadata_store().put, key, query_response.data, ttl)
 
     async def get_token_balances(self, variables):
         """Func to get all tokens
@@ -87,8 +195,8 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
         return await execute_query_object.execute_paginated_query()
 
     async def get_token_details(self, variables):
@@ -127,9 +235,23 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
-        return await execute_query_object.execute_query()
+        async def fetch():
+            store_key, query_response = await self._get_stored_metadata(
+                'get_token_details', variables)
+            if query_response is not None:
+                return query_response
+            known_response = self._get_known_entity(EntityStore.token_key(
+                variables.get('blockchain'), variables.get('address')), _query)
+            if known_response is not None:
+                return known_response
+            execute_query_object = self.client.create_execute_query_object(
+            query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
+            query_response = await execute_query_object.execute_query(hedge=self.client.hedge)
+            await self._store_metadata(store_key, query_response,
+                                       AirstackConstants.METADATA_STORE_MUTABLE_TTL)
+            return query_response
+
+        return await self._mirrored('get_token_details', variables, fetch)
 
     async def get_nft_details(self, variables):
         """Func to get nft details for a given contract address and tokenId
@@ -208,9 +330,19 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
-        return await execute_query_object.execute_query()
+        store_key, query_response = await self._get_stored_metadata('get_nft_details', variables)
+        if query_response is not None:
+            return query_response
+        known_response = self._get_known_entity(EntityStore.nft_key(variables.get('blockchain'),
+            variables.get('address'), variables.get('tokenId')), _query)
+        if known_response is not None:
+            return known_response
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
+        query_response = await execute_query_object.execute_query(hedge=self.client.hedge)
+        await self._store_metadata(store_key, query_response,
+                                   AirstackConstants.METADATA_STORE_MUTABLE_TTL)
+        return query_response
 
     async def get_nfts(self, variables):
         """Func to get all nfts of a collection
@@ -271,9 +403,10 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
-        return await execute_query_object.execute_paginated_query()
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
+        return await self._mirrored('get_nfts', variables,
+                                    execute_query_object.execute_paginated_query)
 
     async def get_nft_images(self, variables):
         """Func to get image of a nft
@@ -299,9 +432,14 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
-        return await execute_query_object.execute_query()
+        store_key, query_response = await self._get_stored_metadata('get_nft_images', variables)
+        if query_response is not None:
+            return query_response
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
+        query_response = await execute_query_object.execute_query(hedge=self.client.hedge)
+        await self._store_metadata(store_key, query_response)
+        return query_response
 
     async def get_wallet_ens_and_social(self, variables):
         """Func to get all social profile and ENS name of an wallet
@@ -331,9 +469,9 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
-        return await execute_query_object.execute_query()
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
+        return await execute_query_object.execute_query(hedge=self.client.hedge)
 
     async def get_wallet_ens(self, variables):
         """Func to get the ENS name of an wallet address
@@ -370,9 +508,9 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
-        return await execute_query_object.execute_query()
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
+        return await execute_query_object.execute_query(hedge=self.client.hedge)
 
     async def get_balance_of_token(self, variables):
         """Func to get balance of wallet address for a particular token
@@ -436,9 +574,9 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
-        return await execute_query_object.execute_query()
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
+        return await execute_query_object.execute_query(hedge=self.client.hedge)
 
     async def get_holders_of_collection(self, variables):
         """Func to get owners of a token collection
@@ -504,9 +642,10 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
-        return await execute_query_object.execute_paginated_query()
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
+        return await self._mirrored('get_holders_of_collection', variables,
+                                    execute_query_object.execute_paginated_query)
 
     async def get_holders_of_nft(self, variables):
         """Func to get owner(s) of the NFT
@@ -572,8 +711,8 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
         return await execute_query_object.execute_paginated_query()
 
     async def get_primary_ens(self, variables):
@@ -601,9 +740,9 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
-        return await execute_query_object.execute_query()
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
+        return await execute_query_object.execute_query(hedge=self.client.hedge)
 
     async def get_ens_subdomains(self, variables):
         """Func to get sub domains for an address
@@ -647,9 +786,10 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
-        return await execute_query_object.execute_paginated_query()
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
+        return await self._mirrored('get_ens_subdomains', variables,
+                                    execute_query_object.execute_paginated_query)
 
     async def get_token_transfers(self, variables):
         """Func to get all transfer of a token
@@ -688,8 +828,8 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
         return await execute_query_object.execute_paginated_query()
 
     async def get_nft_transfers(self, variables):
@@ -730,6 +870,337 @@ class ExecutePopularQueries():
                 }
             }
         """
-        execute_query_object = AirstackClient.create_execute_query_object(self,
-        query=_query, variables=variables)
+        execute_query_object = self.client.create_execute_query_object(
+        query=_query, variables=variables, priority=self.priority, tenant=self.tenant)
         return await execute_query_object.execute_paginated_query()
+
+    async def get_token_balances_bulk(self, variables, chunk_size=None):
+        """Func to get all tokens of many wallets with `_in` filter queries
+
+        Args:
+            variables (dict): Variables required for the query.
+            - identities (list): The wallet address identities.
+            - tokenType (list): List of token types.
+            - blockchain (TokenBlockchain): The blockchain type.
+            - limit (int): The limit of items to retrieve per page.
+            chunk_size (int, optional): identities per request.
+            Defaults to AirstackConstants.BULK_CHUNK_SIZE.
+
+        Returns:
+            QueryResponse: data maps every identity to its TokenBalance rows, error lists
+            the errors of the chunks that failed
+        """
+        _query = """
+            query GetTokensHeldByWalletAddresses($identities: [Identity!], $tokenType: [TokenType!], $blockchain: TokenBlockchain!, $limit: Int) {
+                TokenBalances(
+                    input: {filter: {owner: {_in: $identities}, tokenType: {_in: $tokenType}}, blockchain: $blockchain, limit: $limit}
+                ) {
+                    TokenBalance {
+                    owner {
+                        identity
+                        addresses
+                    }
+                    amount
+                    formattedAmount
+                    blockchain
+                    tokenAddress
+                    tokenId
+                    token {
+                        name
+                        symbol
+                        decimals
+                        totalSupply
+                        baseURI
+                        contractMetaData {
+                        description
+                        image
+                        name
+                        }
+                        logo {
+                        large
+                        medium
+                        original
+                        small
+                        }
+                        projectDetails {
+                        collectionName
+                        description
+                        imageUrl
+                        }
+                    }
+                    tokenNfts {
+                        metaData {
+                        animationUrl
+                        backgroundColor
+                        description
+                        externalUrl
+                        image
+                        name
+                        youtubeUrl
+                        imageData
+                        }
+                        tokenURI
+                    }
+                    tokenType
+                    }
+                    pageInfo {
+                    nextCursor
+                    prevCursor
+                    }
+                }
+            }
+        """
+        from airstack.bulk import group_by_owner
+        identities = list(variables.get('identities') or [])
+        rows, errors = await self._fetch_identity_chunks(_query, variables, chunk_size)
+        return QueryResponse(group_by_owner(rows, list(dict.fromkeys(identities))),
+                             AirstackConstants.SUCCESS_STATUS_CODE if not errors else None,
+                             errors or None)
+
+    async def _fetch_identity_chunks(self, query, variables, chunk_size=None):
+        """Func to run a TokenBalances query with chunks of `identities` concurrently
+        and collect the rows of every page
+
+        Args:
+            query (str): TokenBalances query filtering on `_in: $identities`
+            variables (dict): variables of the query with every identity
+            chunk_size (int, optional): identities per request.
+            Defaults to AirstackConstants.BULK_CHUNK_SIZE.
+
+        Returns:
+            Tuple: rows, errors of the chunks that failed
+        """
+        import asyncio
+        from airstack.bulk import chunked, fetch_all_rows
+        chunks = chunked(variables.get('identities') or [],
+                         chunk_size or AirstackConstants.BULK_CHUNK_SIZE)
+
+        async def fetch_chunk(chunk):
+            chunk_variables = {key: value for key, value in variables.items()
+                               if key != 'identities'}
+            chunk_variables['identities'] = chunk
+            execute_query_object = self.client.create_execute_query_object(
+            query=query, variables=chunk_variables, priority=self.priority,
+            tenant=self.tenant)
+            return await fetch_all_rows(await execute_query_object.execute_paginated_query(),
+                                        'TokenBalances', 'TokenBalance')
+
+        results = await asyncio.gather(*[fetch_chunk(chunk) for chunk in chunks])
+        rows = [row for chunk_rows, _error in results for row in chunk_rows]
+        errors = [error for _rows, error in results if error is not None]
+        return rows, errors
+
+    async def get_token_details_bulk(self, variables, chunk_size=None):
+        """Func to get token details for many contract addresses with `_in` filter queries
+
+        Args:
+            variables (dict): Variables required for the query.
+            - addresses (list): Token addresses.
+            - blockchain (TokenBlockchain): The blockchain type.
+            chunk_size (int, optional): addresses per request.
+            Defaults to AirstackConstants.BULK_CHUNK_SIZE.
+
+        Returns:
+            QueryResponse: data maps every address to its Token or None, error lists
+            the errors of the chunks that failed
+        """
+        _query = """
+            query TokensDetails($addresses: [Address!], $blockchain: TokenBlockchain!, $limit: Int) {
+                Tokens(input: {filter: {address: {_in: $addresses}}, blockchain: $blockchain, limit: $limit}) {
+                    Token {
+                    name
+                    symbol
+                    decimals
+                    totalSupply
+                    type
+                    baseURI
+                    address
+                    blockchain
+                    logo {
+                    large
+                    medium
+                    original
+                    small
+                    }
+                    projectDetails {
+                    collectionName
+                    description
+                    imageUrl
+                    discordUrl
+                    externalUrl
+                    twitterUrl
+                    }
+                    }
+                    pageInfo {
+                    nextCursor
+                    prevCursor
+                    }
+                }
+            }
+        """
+        import asyncio
+        from airstack.bulk import chunked, distinct, fetch_all_rows, group_by_address
+        addresses = list(dict.fromkeys(variables.get('addresses') or []))
+        details, missing, store_keys = {}, [], {}
+        for address in distinct(addresses):
+            store_keys[address], stored_response = await self._get_stored_metadata(
+                'get_token_details', {'blockchain': variables.get('blockchain'),
+                                      'address': address})
+            if stored_response is not None:
+                details[address.lower()] = stored_response.data.get('Token')
+            else:
+                missing.append(address)
+        chunk_size = chunk_size or AirstackConstants.BULK_CHUNK_SIZE
+
+        async def fetch_chunk(chunk):
+            execute_query_object = self.client.create_execute_query_object(
+            query=_query, variables={'addresses': chunk,
+                                     'limit': min(chunk_size,
+                                                  AirstackConstants.MAX_QUERY_LIMIT),
+                                     'blockchain': variables.get('blockchain')},
+            priority=self.priority, tenant=self.tenant)
+            return await fetch_all_rows(await execute_query_object.execute_paginated_query(),
+                                        'Tokens', 'Token')
+
+        results = await asyncio.gather(*[fetch_chunk(chunk) for chunk in
+                                         chunked(missing, chunk_size)])
+        rows = [row for chunk_rows, _error in results for row in chunk_rows]
+        errors = [error for _rows, error in results if error is not None]
+        for address, token in group_by_address(rows, missing).items():
+            details[address.lower()] = token
+            if token is not None:
+                await self._store_metadata(store_keys[address], QueryResponse(
+                    {'Token': token}, AirstackConstants.SUCCESS_STATUS_CODE, None),
+                    AirstackConstants.METADATA_STORE_MUTABLE_TTL)
+        return QueryResponse({address: details.get(address.lower()) for address in addresses},
+                             AirstackConstants.SUCCESS_STATUS_CODE if not errors else None,
+                             errors or None)
+
+    async def get_portfolio(self, variables, chunk_size=None, token_details=False):
+        """Func to aggregate the token balances of many wallets on many blockchains
+
+        Every blockchain is queried concurrently with `_in` filters on the wallets,
+        and the balances are summed per token with exact decimal math, so the
+        latency is one paginated request per blockchain rather than one per wallet.
+
+        Args:
+            variables (dict): Variables required for the query.
+            - identities (list): The wallet address identities.
+            - blockchains (list): The blockchains.
+            - tokenType (list): List of token types.
+            - limit (int): The limit of items to retrieve per page.
+            chunk_size (int, optional): identities per request.
+            Defaults to AirstackConstants.BULK_CHUNK_SIZE.
+            token_details (bool, optional): add the full Token of every position, each
+            token looked up once through get_token_details_bulk. Defaults to False.
+
+        Returns:
+            QueryResponse: data is the list of positions, one per blockchain and token,
+            with the total `amount`, `formattedAmount` and the amount of every wallet
+            as decimal strings; error maps the blockchains that failed to their errors
+        """
+        _query = """
+            query GetPortfolio($identities: [Identity!], $tokenType: [TokenType!], $blockchain: TokenBlockchain!, $limit: Int) {
+                TokenBalances(
+                    input: {filter: {owner: {_in: $identities}, tokenType: {_in: $tokenType}}, blockchain: $blockchain, limit: $limit}
+                ) {
+                    TokenBalance {
+                    owner {
+                        identity
+                        addresses
+                    }
+                    amount
+                    formattedAmount
+                    tokenAddress
+                    tokenType
+                    token {
+                        name
+                        symbol
+                        decimals
+                    }
+                    }
+                    pageInfo {
+                    nextCursor
+                    prevCursor
+                    }
+                }
+            }
+        """
+        import asyncio
+        from airstack.bulk import distinct, group_by_owner
+        from airstack.portfolio import aggregate_portfolio
+        identities = distinct(variables.get('identities') or [])
+        blockchains = list(dict.fromkeys(variables.get('blockchains') or []))
+        balances, details, errors = {}, {}, {}
+
+        async def fetch_blockchain(blockchain):
+            chain_variables = {key: value for key, value in variables.items()
+                               if key != 'blockchains'}
+            chain_variables['blockchain'] = blockchain
+            rows, chain_errors = await self._fetch_identity_chunks(_query, chain_variables,
+                                                                   chunk_size)
+            balances[blockchain] = group_by_owner(rows, identities)
+            if token_details and rows:
+                addresses = [(row.get('tokenAddress') or '').lower() for row in rows]
+                query_response = await self.get_token_details_bulk(
+                    {'addresses': addresses, 'blockchain': blockchain}, chunk_size)
+                details[blockchain] = query_response.data
+                chain_errors.extend(query_response.error or [])
+            if chain_errors:
+                errors[blockchain] = chain_errors
+
+        await asyncio.gather(*[fetch_blockchain(blockchain) for blockchain in blockchains])
+        return QueryResponse(aggregate_portfolio(balances, details),
+                             AirstackConstants.SUCCESS_STATUS_CODE if not errors else None,
+                             errors or None)
+
+    def stream_multi_chain(self, method, variables, blockchains):
+        """Func to run a popular query on several blockchains concurrently, paginating
+        each one independently
+
+        Args:
+            method (str): popular query method name returning pages of rows, a key of
+            MULTI_CHAIN_ROWS, e.g. 'get_token_balances'
+            variables (dict): variables of the query, without `blockchain`
+            blockchains (list): blockchains to query
+
+        Returns:
+            async iterator: (blockchain, row tagged with its blockchain or None,
+            error or None) in order of arrival
+
+        Raises:
+            ValueError: the method does not return pages of rows
+        """
+        from airstack.multi_chain import rows_spec, stream_multi_chain
+        rows_spec(method)
+        return stream_multi_chain(self, method, variables, blockchains)
+
+    async def execute_multi_chain(self, method, variables, blockchains, order_by=None,
+                                  descending=False):
+        """Func to run a popular query on several blockchains concurrently and merge
+        every page of their rows
+
+        With `order_by` the rows are sorted once every page has arrived; use
+        `stream_multi_chain` for rows as they arrive, in no particular order.
+
+        Args:
+            method (str): popular query method name returning pages of rows, a key of
+            MULTI_CHAIN_ROWS, e.g. 'get_token_balances'
+            variables (dict): variables of the query, without `blockchain`
+            blockchains (list): blockchains to query
+            order_by (str, optional): row field the merged rows are sorted by, e.g.
+            'blockTimestamp'. Defaults to None.
+            descending (bool, optional): sort from the largest value. Defaults to False.
+
+        Returns:
+            QueryResponse: data is the list of rows tagged with their blockchain, error
+            maps the blockchains that failed to their error
+
+        Raises:
+            ValueError: the method does not return pages of rows
+        """
+        from airstack.multi_chain import execute_multi_chain
+        rows, errors = await execute_multi_chain(self, method, variables, blockchains,
+                                                 order_by, descending)
+        return QueryResponse(rows, AirstackConstants.SUCCESS_STATUS_CODE if not errors
+                             else None, errors or None)
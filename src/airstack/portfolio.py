@@ -0,0 +1,96 @@
+"""
+Module: portfolio.py
+Description: This module contains the aggregation of token balances of many wallets into a portfolio.
+"""
+
+from decimal import Decimal, InvalidOperation, localcontext
+
+_PRECISION = 80
+
+
+def balance_amount(row):
+    """Func to get the exact formatted amount of a TokenBalance row
+
+    The raw `amount` is scaled by the token decimals rather than reading the
+    float `formattedAmount`, which loses digits of 18 decimal tokens.
+
+    Args:
+        row (dict): TokenBalance row selecting `amount`, `formattedAmount` and
+        `token { decimals }`
+
+    Returns:
+        Decimal: formatted amount, 0 if the row has none
+    """
+    decimals = (row.get('token') or {}).get('decimals')
+    amount = row.get('amount')
+    try:
+        if amount not in (None, '') and decimals is not None:
+            return Decimal(str(amount)).scaleb(-int(decimals))
+        formatted_amount = row.get('formattedAmount')
+        if formatted_amount not in (None, ''):
+            return Decimal(str(formatted_amount))
+    except (InvalidOperation, ValueError):
+        pass
+    return Decimal(0)
+
+
+def aggregate_portfolio(balances, details=None):
+    """Func to sum the balances of every wallet per token in one pass
+
+    Args:
+        balances (dict): blockchain to a dict of identity to its TokenBalance rows
+        details (dict, optional): blockchain to a dict of token address to its Token,
+        replacing the `token` of the rows. Defaults to None.
+
+    Returns:
+        list: one position per blockchain and token, with the exact total `amount`
+        and `formattedAmount` and the `wallets` holding it as decimal strings
+    """
+    positions = {}
+    with localcontext() as context:
+        context.prec = _PRECISION
+        for blockchain, grouped in balances.items():
+            for identity, rows in grouped.items():
+                for row in rows:
+                    address = (row.get('tokenAddress') or '').lower()
+                    position = positions.get((blockchain, address))
+                    if position is None:
+                        position = positions[(blockchain, address)] = {
+                            'token': row.get('token'), 'tokenType': row.get('tokenType'),
+                            'amount': Decimal(0), 'formattedAmount': Decimal(0),
+                            'wallets': {}
+                        }
+                    formatted_amount = balance_amount(row)
+                    try:
+                        position['amount'] += Decimal(str(row.get('amount') or 0))
+                    except InvalidOperation:
+                        pass
+                    position['formattedAmount'] += formatted_amount
+                    position['wallets'][identity] = \
+                        position['wallets'].get(identity, Decimal(0)) + formatted_amount
+        return [_position(blockchain, address, position, (details or {}).get(blockchain, {}))
+                for (blockchain, address), position in sorted(positions.items())]
+
+
+def _position(blockchain, address, position, details):
+    token = position['token'] or details.get(address) or {}
+    return {
+        'blockchain': blockchain,
+        'tokenAddress': address,
+        'tokenType': position['tokenType'],
+        'name': token.get('name'),
+        'symbol': token.get('symbol'),
+        'decimals': token.get('decimals'),
+        'amount': _to_text(position['amount']),
+        'formattedAmount': _to_text(position['formattedAmount']),
+        'wallets': {identity: _to_text(amount) for identity, amount
+                    in position['wallets'].items()},
+        'token': details.get(address)
+    }
+
+
+def _to_text(amount):
+    text = '{:f}'.format(amount)
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return text
@@ -0,0 +1,226 @@
+"""
+Module: query_cost.py
+Description: This module contains the query cost estimator and the splitting of over-budget queries.
+"""
+
+from graphql import parse, print_ast, visit
+from graphql.language.ast import (
+    Document, Field, FragmentDefinition, FragmentSpread, InlineFragment, IntValue,
+    ObjectValue, OperationDefinition, SelectionSet, Variable
+)
+from graphql.language.visitor import Visitor
+from airstack.constant import AirstackConstants
+
+
+class QueryCost:
+    """Class for the estimated cost of a query
+    """
+
+    def __init__(self, roots, depth):
+        """Init function for query cost
+
+        Args:
+            roots (dict): root field alias or name to its estimated cost
+            depth (int): deepest selection depth of the query
+        """
+        self.roots = roots
+        self.depth = depth
+        self.aliases = len(roots)
+        self.total = sum(roots.values())
+
+
+class _VariableCollector(Visitor):
+    """Class to collect the variable and fragment names used by a selection set"""
+
+    def __init__(self):
+        self.variables = set()
+        self.fragments = set()
+
+    def enter_Variable(self, node, *args):
+        self.variables.add(node.name.value)
+
+    def enter_FragmentSpread(self, node, *args):
+        self.fragments.add(node.name.value)
+
+
+def _argument_limit(field, variables):
+    """Func to find the `limit` of a field, either as argument or inside `input`"""
+    for argument in field.arguments or []:
+        values = [argument] if argument.name.value == 'limit' else []
+        if argument.name.value == 'input' and isinstance(argument.value, ObjectValue):
+            values = [object_field for object_field in argument.value.fields
+                      if object_field.name.value == 'limit']
+        for value in values:
+            if isinstance(value.value, IntValue):
+                return int(value.value.value)
+            if isinstance(value.value, Variable):
+                limit = (variables or {}).get(value.value.name.value)
+                if limit is not None:
+                    return int(limit)
+            return AirstackConstants.DEFAULT_QUERY_LIMIT
+    return None
+
+
+def _selection_cost(selection_set, fragments, variables, multiplier, depth):
+    """Func to get the cost and depth of a selection set
+
+    Every selected field costs the product of the `limit` of its enclosing
+    fields, so a field nested in a list of 200 items costs 200.
+    """
+    cost, max_depth = 0, depth
+    for selection in selection_set.selections if selection_set else []:
+        if isinstance(selection, FragmentSpread):
+            fragment = fragments.get(selection.name.value)
+            sub_set = fragment.selection_set if fragment else None
+            sub_cost, sub_depth = _selection_cost(sub_set, fragments, variables,
+                                                  multiplier, depth)
+        elif isinstance(selection, InlineFragment):
+            sub_cost, sub_depth = _selection_cost(selection.selection_set, fragments,
+                                                  variables, multiplier, depth)
+        else:
+            limit = _argument_limit(selection, variables)
+            child_multiplier = multiplier * limit if limit else multiplier
+            sub_cost, sub_depth = _selection_cost(selection.selection_set, fragments,
+                                                  variables, child_multiplier, depth + 1)
+            sub_cost += multiplier
+        cost += sub_cost
+        max_depth = max(max_depth, sub_depth)
+    return cost, max_depth
+
+
+def _root_key(field):
+    return field.alias.value if field.alias else field.name.value
+
+
+def estimate_query_cost(query, variables=None):
+    """Func to estimate the cost of a query from its AST
+
+    The estimate counts every selected field, multiplied by the `limit` of the
+    lists it is nested in (AirstackConstants.DEFAULT_QUERY_LIMIT when the limit
+    is not known), per root field / alias.
+
+    Args:
+        query (str|Document): GraphQL query string or parsed document
+        variables (dict, optional): variables for the query. Defaults to None.
+
+    Returns:
+        QueryCost: estimated cost
+    """
+    document_ast = parse(query) if isinstance(query, str) else query
+    fragments = {definition.name.value: definition for definition in document_ast.definitions
+                 if isinstance(definition, FragmentDefinition)}
+    roots, depth = {}, 0
+    for definition in document_ast.definitions:
+        if not isinstance(definition, OperationDefinition):
+            continue
+        for selection in definition.selection_set.selections:
+            if not isinstance(selection, Field):
+                continue
+            limit = _argument_limit(selection, variables)
+            cost, root_depth = _selection_cost(selection.selection_set, fragments, variables,
+                                               limit or 1, 1)
+            roots[_root_key(selection)] = cost + 1
+            depth = max(depth, root_depth)
+    return QueryCost(roots, depth)
+
+
+def split_query(query, max_cost, variables=None):
+    """Func to split a multi-root query into queries under the cost budget
+
+    Root fields are packed greedily into chunks whose estimated cost stays
+    under `max_cost`; a root field that is over budget on its own gets a
+    chunk for itself. Every chunk keeps only the variables and fragments it
+    uses.
+
+    Args:
+        query (str): GraphQL query string with a single operation
+        max_cost (int): cost budget of a single request
+        variables (dict, optional): variables for the query. Defaults to None.
+
+    Returns:
+        list: (query string, variables) tuples, a single one if no split is needed
+    """
+    document_ast = parse(query)
+    operations = [definition for definition in document_ast.definitions
+                  if isinstance(definition, OperationDefinition)]
+    query_cost = estimate_query_cost(document_ast, variables)
+    if len(operations) != 1 or query_cost.total <= max_cost or query_cost.aliases < 2:
+        return [(query, variables)]
+
+    operation = operations[0]
+    fragments = {definition.name.value: definition for definition in document_ast.definitions
+                 if isinstance(definition, FragmentDefinition)}
+    chunks, chunk, chunk_cost = [], [], 0
+    for selection in operation.selection_set.selections:
+        cost = query_cost.roots.get(_root_key(selection), 0) if \
+            isinstance(selection, Field) else 0
+        if chunk and chunk_cost + cost > max_cost:
+            chunks.append(chunk)
+            chunk, chunk_cost = [], 0
+        chunk.append(selection)
+        chunk_cost += cost
+    if chunk:
+        chunks.append(chunk)
+
+    return [_build_chunk(operation, chunk, fragments, variables) for chunk in chunks]
+
+
+def _build_chunk(operation, selections, fragments, variables):
+    """Func to print the query of a chunk of root selections"""
+    collector = _VariableCollector()
+    selection_set = SelectionSet(selections=selections)
+    visit(selection_set, collector)
+
+    used_fragments, pending = [], list(collector.fragments)
+    while pending:
+        name = pending.pop()
+        if name in used_fragments or name not in fragments:
+            continue
+        used_fragments.append(name)
+        fragment_collector = _VariableCollector()
+        visit(fragments[name], fragment_collector)
+        collector.variables |= fragment_collector.variables
+        pending.extend(fragment_collector.fragments)
+
+    variable_definitions = [definition for definition in operation.variable_definitions or []
+                            if definition.variable.name.value in collector.variables]
+    chunk_operation = OperationDefinition(
+        operation=operation.operation, selection_set=selection_set, name=operation.name,
+        variable_definitions=variable_definitions, directives=operation.directives)
+    chunk_document = Document(definitions=[chunk_operation] + [
+        fragments[name] for name in used_fragments])
+    chunk_variables = None if variables is None else {
+        key: value for key, value in variables.items() if key in collector.variables}
+    return print_ast(chunk_document), chunk_variables
+
+
+def merge_responses(responses):
+    """Func to merge the responses of split queries back into one, in the shape of
+    the response of the unsplit query
+
+    Args:
+        responses (list): QueryResponse objects of every chunk
+
+    Returns:
+        Tuple: merged data or None, status code, error or None
+    """
+    data, errors, failed = {}, [], None
+    for response in responses:
+        chunk_data = response.data
+        if response.error is not None and isinstance(chunk_data, dict) and \
+                'errors' in chunk_data:
+            # a chunk with partial errors carries the whole response body
+            chunk_data = chunk_data.get('data')
+            errors.extend(response.error if isinstance(response.error, list) else
+                          [response.error])
+        elif failed is None and (response.error is not None or
+                                 response.status_code != AirstackConstants.SUCCESS_STATUS_CODE):
+            failed = response
+        if chunk_data:
+            data.update(chunk_data)
+    if failed is not None:
+        # the unsplit query would have failed with the first failing chunk
+        return None, failed.status_code, failed.error
+    if errors:
+        return {'data': data, 'errors': errors}, AirstackConstants.SUCCESS_STATUS_CODE, errors
+    return data, AirstackConstants.SUCCESS_STATUS_CODE, None
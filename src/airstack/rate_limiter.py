@@ -0,0 +1,52 @@
+"""
+Module: rate_limiter.py
+Description: This module contains the token bucket used to keep requests within a rate budget.
+"""
+
+import time
+
+
+class TokenBucket:
+    """Class to allow `rate` requests per second with bursts up to `burst`
+    """
+
+    def __init__(self, rate, burst=None):
+        """Init function for token bucket
+
+        Args:
+            rate (float): tokens added per second
+            burst (float, optional): bucket size. Defaults to one second of tokens.
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self, tokens=1):
+        """Func to take tokens if they are available
+
+        Args:
+            tokens (float, optional): tokens to take. Defaults to 1.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds to wait for them
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    async def acquire(self, tokens=1):
+        """Async function to wait until tokens are available and take them
+
+        Args:
+            tokens (float, optional): tokens to take. Defaults to 1.
+        """
+        import asyncio
+        wait = self.try_acquire(tokens)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self.try_acquire(tokens)
@@ -0,0 +1,124 @@
+"""
+Module: schema_validation.py
+Description: This module contains the offline validation of queries against a cached schema.
+"""
+
+import json
+from collections import OrderedDict
+from airstack.constant import AirstackConstants
+
+
+def load_schema(schema):
+    """Func to build a client schema from an introspection snapshot
+
+    Args:
+        schema (str|dict): path of the introspection json file, or its content.
+        Both the raw `{"data": {"__schema": ...}}` response and `{"__schema": ...}`
+        are accepted.
+
+    Returns:
+        GraphQLSchema: schema usable for validation
+    """
+    from graphql import build_client_schema
+    if isinstance(schema, str):
+        with open(schema, encoding='utf-8') as schema_file:
+            schema = json.load(schema_file)
+    if 'data' in schema:
+        schema = schema['data']
+    return build_client_schema(schema)
+
+
+async def download_schema(client, path):
+    """Async function to fetch the introspection snapshot and save it locally
+
+    Args:
+        client (AirstackClient): api client
+        path (str): path of the introspection json file
+
+    Returns:
+        str: error message or None
+    """
+    from graphql import introspection_query
+    execute_query = client.create_execute_query_object(query=introspection_query)
+    query_response = await execute_query.execute_query(validate=False)
+    if query_response.error is not None:
+        return query_response.error
+    with open(path, 'w', encoding='utf-8') as schema_file:
+        json.dump(query_response.data, schema_file)
+    return None
+
+
+class SchemaValidator:
+    """Class to validate queries and variables before they are sent
+
+    Document validation is cached per query string, so re-running the same
+    query only checks the variables.
+    """
+
+    def __init__(self, schema, cache_size=AirstackConstants.SCHEMA_CACHE_SIZE):
+        """Init function for schema validator
+
+        Args:
+            schema (str|dict|GraphQLSchema): introspection snapshot path, content or
+            an already built schema.
+            cache_size (int, optional): number of validated documents to keep.
+            Defaults to AirstackConstants.SCHEMA_CACHE_SIZE.
+        """
+        from graphql import GraphQLSchema
+        self.schema = schema if isinstance(schema, GraphQLSchema) else load_schema(schema)
+        self.cache_size = cache_size
+        self._documents = OrderedDict()
+
+    def validate(self, query, variables=None):
+        """Func to validate a query and its variables
+
+        Args:
+            query (str): GraphQL query string
+            variables (dict, optional): variables for the query. Defaults to None.
+
+        Returns:
+            list: errors in the format of the api errors, None if the query is valid
+        """
+        document_ast, errors = self._validate_document(query)
+        if errors:
+            return errors
+
+        from graphql import GraphQLError
+        from graphql.execution.values import get_variable_values
+        for definition in document_ast.definitions:
+            if getattr(definition, 'operation', None) is None:
+                continue
+            try:
+                get_variable_values(self.schema, definition.variable_definitions or [],
+                                    variables or {})
+            except GraphQLError as error:
+                return [_format_error(error)]
+            except (ValueError, TypeError) as error:
+                # graphql-core 2 coerces Int and Float variables with int() and float()
+                return [{'message': 'Variable values are invalid: {}'.format(error)}]
+        return None
+
+    def _validate_document(self, query):
+        if query in self._documents:
+            self._documents.move_to_end(query)
+            return self._documents[query]
+
+        from graphql import parse, validate, GraphQLError
+        try:
+            document_ast = parse(query)
+            errors = [_format_error(error) for error in validate(self.schema, document_ast)]
+        except GraphQLError as error:
+            document_ast, errors = None, [_format_error(error)]
+
+        self._documents[query] = (document_ast, errors or None)
+        if len(self._documents) > self.cache_size:
+            self._documents.popitem(last=False)
+        return document_ast, errors or None
+
+
+def _format_error(error):
+    formatted = {'message': error.message}
+    if getattr(error, 'locations', None):
+        formatted['locations'] = [{'line': location.line, 'column': location.column}
+                                  for location in error.locations]
+    return formatted
@@ -1,7 +1,6 @@
 __author__ = 'sarvesh.singh'
 
-import json
-import aiohttp
+from airstack.offload import decode_json
 from airstack.constant import AirstackConstants
 
 
@@ -12,37 +11,46 @@ class SendRequest:
 
     @staticmethod
     async def send_post_request(url=None, headers=None, data=None,
-                                timeout=True):
+                                timeout=True, offloader=None, transport=None):
         """Async function to send post request
 
         Args:
             url (str, optional): server url. Defaults to None.
             headers (dict, optional): headers. Defaults to None.
             data (dict, optional): json request body. Defaults to None.
-            timeout (int, optional): timeout for api. Defaults to True.
+            timeout (aiohttp.ClientTimeout, optional): timeout for api. Defaults to True.
+            offloader (Offloader, optional): decodes large bodies off the event loop.
+            Defaults to None.
+            transport (Transport, optional): sends the request. Defaults to an aiohttp
+            session per request.
 
         Returns:
             Tuple: JSON response or None, response status code, error message or None
         """
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(url=url, headers=headers,
-                                        data=data,
-                                        timeout=timeout) as response:
-                    content = await response.text()
-                    try:
-                        nt = json.loads(content)
-                    except json.JSONDecodeError:
-                        nt = json.loads(json.dumps(content))
-
-                    if response.status != AirstackConstants.SUCCESS_STATUS_CODE:
-                        if response.status == AirstackConstants.UNPROCESSABLE_STATUS_CODE:
-                            return None, response.status, response.reason
-                        return None, response.status, nt["error"]
-
-                    if "errors" in nt:
-                        return nt, response.status, nt["errors"]
-
-                    return nt["data"], response.status, None
-            except Exception as exec:
-                return None, response.status, str(exec)
+        import asyncio
+        status = None
+        if transport is None:
+            from airstack.transport import AiohttpTransport
+            transport = AiohttpTransport()
+        try:
+            status, reason, content = await transport.post(url, headers, data, timeout)
+            if offloader is not None:
+                nt = await offloader.decode_json(content)
+            else:
+                nt = decode_json(content)
+
+            if status != AirstackConstants.SUCCESS_STATUS_CODE:
+                if status == AirstackConstants.UNPROCESSABLE_STATUS_CODE:
+                    return None, status, reason
+                return None, status, nt["error"]
+
+            if "errors" in nt:
+                return nt, status, nt["errors"]
+
+            return nt["data"], status, None
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            return None, None, AirstackConstants.TIMEOUT_ERROR
+        except Exception as exec:
+            return None, status, str(exec)
@@ -0,0 +1,348 @@
+"""
+Module: transport.py
+Description: This module contains the transports sending request bodies to the api: aiohttp, HTTP/2 and in-process.
+"""
+
+import abc
+import json
+import time
+from http import HTTPStatus
+from urllib.parse import urlsplit
+from airstack.constant import AirstackConstants
+
+
+def timeout_seconds(timeout):
+    """Func to read the limits of a request timeout
+
+    Args:
+        timeout (aiohttp.ClientTimeout|float): timeout of the request, None for none
+
+    Returns:
+        Tuple: total, connect and read timeouts in seconds or None
+    """
+    if timeout is None or timeout is True:
+        return None, None, None
+    if isinstance(timeout, (int, float)):
+        return timeout, None, None
+    return timeout.total, timeout.sock_connect, timeout.sock_read
+
+
+class Transport(abc.ABC):
+    """Class for the way request bodies are sent to the api
+
+    A transport only moves bytes: `post` returns the status code, reason and
+    body of the response, and raises asyncio.TimeoutError on a timeout or
+    any other exception on a connection error. Subclasses implement `_post`.
+
+    Decoding, error mapping, endpoint failover, the circuit breaker and the
+    admission queue are the same whatever the transport.
+    """
+
+    def __init__(self):
+        """Init function for transport
+        """
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.busy = 0.0
+
+    async def post(self, url, headers, data, timeout):
+        """Async function to post a request body
+
+        Args:
+            url (str): server url
+            headers (dict): headers
+            data (str): json request body
+            timeout (aiohttp.ClientTimeout|float): timeout of the request
+
+        Returns:
+            Tuple: response status code, reason, body bytes
+        """
+        self.requests += 1
+        self.in_flight += 1
+        self.bytes_sent += len(data or '')
+        started = time.monotonic()
+        try:
+            status, reason, body = await self._post(url, headers, data, timeout)
+        except BaseException:
+            self.failures += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.busy += time.monotonic() - started
+        self.bytes_received += len(body)
+        return status, reason, body
+
+    @abc.abstractmethod
+    async def _post(self, url, headers, data, timeout):
+        """Async function sending a request body, implemented by every transport
+
+        Args:
+            url (str): server url
+            headers (dict): headers
+            data (str): json request body
+            timeout (aiohttp.ClientTimeout|float): timeout of the request
+
+        Returns:
+            Tuple: response status code, reason, body bytes
+        """
+
+    async def close(self):
+        """Async function to close the connections of the transport
+        """
+
+    def metrics(self):
+        """Func to get the transport counters
+
+        Returns:
+            dict: transport name, requests, failed requests, requests in flight,
+            bytes sent and received, mean seconds per request
+        """
+        return {
+            'transport': type(self).__name__,
+            'requests': self.requests,
+            'failures': self.failures,
+            'in_flight': self.in_flight,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'mean_latency': self.busy / self.requests if self.requests else None
+        }
+
+
+class AiohttpTransport(Transport):
+    """Class to send requests with aiohttp over HTTP/1.1
+
+    Without `keepalive` every request opens its own session, as the SDK always
+    did. With it a pooled session keeps up to `limit` connections open across
+    requests and must be closed with `close()`.
+    """
+
+    def __init__(self, keepalive=False, limit=AirstackConstants.MAX_CONCURRENCY):
+        """Init function for aiohttp transport
+
+        Args:
+            keepalive (bool, optional): reuse a pooled session. Defaults to False.
+            limit (int, optional): connections of the pooled session.
+            Defaults to AirstackConstants.MAX_CONCURRENCY.
+        """
+        super().__init__()
+        self.keepalive = keepalive
+        self.limit = limit
+        self._session = None
+        self._loop = None
+
+    async def _post(self, url, headers, data, timeout):
+        import aiohttp
+        if not self.keepalive:
+            async with aiohttp.ClientSession() as session:
+                return await self._send(session, url, headers, data, timeout)
+        return await self._send(self._get_session(), url, headers, data, timeout)
+
+    @staticmethod
+    async def _send(session, url, headers, data, timeout):
+        async with session.post(url=url, headers=headers, data=data,
+                                timeout=timeout) as response:
+            return response.status, response.reason, await response.read()
+
+    def _get_session(self):
+        """Func to get the pooled session of the running event loop"""
+        import asyncio
+        import aiohttp
+        loop = asyncio.get_event_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit))
+            self._loop = loop
+        return self._session
+
+    async def close(self):
+        """Async function to close the pooled session
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class HttpxTransport(Transport):
+    """Class to send requests with httpx, multiplexing concurrent requests over
+    HTTP/2 connections
+
+    Needs the `http2` extra: pip install "airstack[http2]".
+    """
+
+    def __init__(self, http2=True, limit=AirstackConstants.MAX_CONCURRENCY):
+        """Init function for httpx transport
+
+        Args:
+            http2 (bool, optional): negotiate HTTP/2. Defaults to True.
+            limit (int, optional): connections of the pool. Defaults to
+            AirstackConstants.MAX_CONCURRENCY.
+
+        Raises:
+            ImportError: httpx, or h2 for HTTP/2, is not installed
+        """
+        super().__init__()
+        try:
+            import httpx  # noqa: F401
+            if http2:
+                import h2  # noqa: F401
+        except ImportError as exec:
+            raise ImportError('The http2 transport needs httpx[http2], install it with '
+                              'pip install "airstack[http2]".') from exec
+        self.http2 = http2
+        self.limit = limit
+        self._client = None
+        self._loop = None
+
+    async def _post(self, url, headers, data, timeout):
+        import asyncio
+        import httpx
+        total, connect, read = timeout_seconds(timeout)
+        try:
+            response = await asyncio.wait_for(self._get_client().post(
+                url, headers=headers, content=data,
+                timeout=httpx.Timeout(total, connect=connect, read=read)), total)
+        except httpx.TimeoutException as exec:
+            raise asyncio.TimeoutError() from exec
+        return response.status_code, response.reason_phrase, response.content
+
+    def _get_client(self):
+        """Func to get the client of the running event loop"""
+        import asyncio
+        import httpx
+        loop = asyncio.get_event_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._client = httpx.AsyncClient(http2=self.http2, limits=httpx.Limits(
+                max_connections=self.limit))
+            self._loop = loop
+        return self._client
+
+    async def close(self):
+        """Async function to close the connections of the client
+        """
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+class ASGITransport(Transport):
+    """Class to send requests to an ASGI application in the same process, for
+    tests and benchmarks without a network
+    """
+
+    def __init__(self, app):
+        """Init function for ASGI transport
+
+        Args:
+            app (func): ASGI 3 application
+        """
+        super().__init__()
+        self.app = app
+
+    async def _post(self, url, headers, data, timeout):
+        import asyncio
+        parts = urlsplit(url)
+        body = data.encode('utf-8') if isinstance(data, str) else (data or b'')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'POST',
+            'scheme': parts.scheme or 'http',
+            'path': parts.path or '/',
+            'raw_path': (parts.path or '/').encode('utf-8'),
+            'query_string': parts.query.encode('utf-8'),
+            'root_path': '',
+            'headers': [(key.lower().encode('latin-1'), str(value).encode('latin-1'))
+                        for key, value in (headers or {}).items()],
+            'server': (parts.hostname or 'localhost', parts.port or 80),
+            'client': ('127.0.0.1', 0)
+        }
+        received = [False]
+        disconnected = asyncio.Event()
+        response = {'status': None, 'body': []}
+
+        async def receive():
+            if not received[0]:
+                received[0] = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+
+        async def call():
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                disconnected.set()
+
+        await asyncio.wait_for(call(), timeout_seconds(timeout)[0])
+        if response['status'] is None:
+            raise ConnectionError('The ASGI application sent no response.')
+        return response['status'], _reason(response['status']), b''.join(response['body'])
+
+
+class CallableTransport(Transport):
+    """Class to answer requests with a function in the same process, for tests and
+    benchmarks without a network
+    """
+
+    def __init__(self, handler):
+        """Init function for callable transport
+
+        Args:
+            handler (func): function or coroutine function of (url, headers, request
+            body dict) returning a response body dict, or a tuple of status code and
+            body dict, str or bytes
+        """
+        super().__init__()
+        self.handler = handler
+
+    async def _post(self, url, headers, data, timeout):
+        import asyncio
+        result = self.handler(url, headers, json.loads(data) if data else None)
+        if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+            result = await asyncio.wait_for(result, timeout_seconds(timeout)[0])
+        status = AirstackConstants.SUCCESS_STATUS_CODE
+        if isinstance(result, tuple):
+            status, result = result
+        if isinstance(result, (dict, list)):
+            result = json.dumps(result)
+        if isinstance(result, str):
+            result = result.encode('utf-8')
+        return status, _reason(status), result or b''
+
+
+def build_transport(transport):
+    """Func to build the transport of a client
+
+    Args:
+        transport (str|Transport): None for a session per request, 'aiohttp' for a
+        pooled HTTP/1.1 session, 'http2' for multiplexed HTTP/2, or a transport
+
+    Returns:
+        Transport: transport
+    """
+    if transport is None:
+        return AiohttpTransport()
+    if isinstance(transport, Transport):
+        return transport
+    if transport == AirstackConstants.TRANSPORT_AIOHTTP:
+        return AiohttpTransport(keepalive=True)
+    if transport == AirstackConstants.TRANSPORT_HTTP2:
+        return HttpxTransport(http2=True)
+    raise ValueError("transport must be 'aiohttp', 'http2' or a Transport.")
+
+
+def _reason(status):
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ''
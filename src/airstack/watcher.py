@@ -0,0 +1,316 @@
+"""
+Module: watcher.py
+Description: This module contains the change watcher polling wallets and collections with adaptive intervals.
+"""
+
+import hashlib
+import heapq
+import json
+import time
+from airstack.constant import AirstackConstants
+from airstack.rate_limiter import TokenBucket
+
+
+class ChangeEvent:
+    """Class for the changes of a watched target between two snapshots
+    """
+
+    def __init__(self, key, added, removed, changed, error=None):
+        """Init function for change event
+
+        Args:
+            key (str): watched target key
+            added (list): rows that appeared
+            removed (list): rows that disappeared
+            changed (list): (previous row, current row) tuples
+            error (str, optional): error if the poll failed. Defaults to None.
+        """
+        self.key = key
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.error = error
+        self.timestamp = time.time()
+
+
+class WatchTarget:
+    """Class for a watched wallet or collection and its last snapshot
+    """
+
+    def __init__(self, key, method, variables, rows_path, row_id, interval):
+        """Init function for watch target
+
+        Args:
+            key (str): target key
+            method (str): popular query method polled
+            variables (dict): variables of the query
+            rows_path (tuple): root and item field of the rows in the response
+            row_id (func): function returning the identity of a row
+            interval (float): initial polling interval in seconds
+        """
+        self.key = key
+        self.method = method
+        self.variables = variables
+        self.rows_path = rows_path
+        self.row_id = row_id
+        self.interval = interval
+        self.next_poll_at = time.monotonic()
+        self.page_hashes = None
+        self.rows = {}
+        self.active = True
+
+
+def _wallet_row_id(row):
+    return (row.get('blockchain'), row.get('tokenAddress'), row.get('tokenId'))
+
+
+def _holder_row_id(row):
+    owner = row.get('owner') or {}
+    return (tuple(owner.get('addresses') or ()), row.get('tokenId'))
+
+
+def _snapshot_row(row):
+    """Func to freeze a row when its snapshot is taken, as the rows of a response
+    may be changed by the code consuming it"""
+    text = json.dumps(row, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest(), text
+
+
+class Watcher:
+    """Class to watch wallets and collections for changes within a request budget
+
+    Every target is polled on its own interval: it is halved when a poll
+    finds changes and grows by `backoff` when nothing changed, between
+    `min_interval` and `max_interval`. Every row is hashed and serialised when
+    its page arrives and every page hashed from its rows, so an unchanged
+    snapshot is detected without diffing rows. All polls share a
+    token bucket of `requests_per_second`, and changes are delivered through
+    the `events` async iterator.
+    """
+
+    def __init__(self, client, min_interval=AirstackConstants.WATCH_MIN_INTERVAL,
+                 max_interval=AirstackConstants.WATCH_MAX_INTERVAL,
+                 backoff=AirstackConstants.WATCH_BACKOFF,
+                 requests_per_second=AirstackConstants.WATCH_REQUESTS_PER_SECOND,
+                 max_concurrent_polls=AirstackConstants.WATCH_MAX_CONCURRENT_POLLS):
+        """Init function for watcher
+
+        Args:
+            client (AirstackClient): api client
+            min_interval (float, optional): shortest polling interval in seconds.
+            max_interval (float, optional): longest polling interval in seconds.
+            backoff (float, optional): interval growth factor for idle targets.
+            requests_per_second (float, optional): global request budget.
+            max_concurrent_polls (int, optional): targets polled at the same time.
+        """
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_concurrent_polls = max_concurrent_polls
+        self.budget = TokenBucket(requests_per_second)
+        self.targets = {}
+        self.polls = 0
+        self.unchanged_polls = 0
+        self.requests = 0
+        self._schedule = []
+        self._poll_tasks = set()
+        self._wakeup = None
+        self._stopped = False
+
+    def watch_wallet(self, variables, interval=None):
+        """Func to watch the token balances of a wallet
+
+        Args:
+            variables (dict): variables of get_token_balances.
+            interval (float, optional): initial interval. Defaults to min_interval.
+
+        Returns:
+            str: target key
+        """
+        return self._add_target('get_token_balances', variables, _wallet_row_id, interval)
+
+    def watch_collection(self, variables, interval=None):
+        """Func to watch the holders of a collection
+
+        Args:
+            variables (dict): variables of get_holders_of_collection.
+            interval (float, optional): initial interval. Defaults to min_interval.
+
+        Returns:
+            str: target key
+        """
+        return self._add_target('get_holders_of_collection', variables, _holder_row_id,
+                                interval)
+
+    def unwatch(self, key):
+        """Func to stop watching a target
+
+        Args:
+            key (str): target key
+        """
+        target = self.targets.pop(key, None)
+        if target is not None:
+            target.active = False
+
+    def stop(self):
+        """Func to stop the events iterator
+        """
+        self._stopped = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def metrics(self):
+        """Func to get the watcher counters
+
+        Returns:
+            dict: targets, polls, unchanged polls and requests
+        """
+        return {
+            'targets': len(self.targets),
+            'polls': self.polls,
+            'unchanged_polls': self.unchanged_polls,
+            'requests': self.requests
+        }
+
+    async def events(self):
+        """Async iterator of the change events of every watched target
+
+        Yields:
+            ChangeEvent: changes found by a poll, or a poll error
+        """
+        import asyncio
+        queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._stopped = False
+        runner = asyncio.ensure_future(self._run(queue))
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                done, _pending = await asyncio.wait([getter, runner],
+                                                    return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    runner.result()
+                    return
+                yield getter.result()
+        finally:
+            runner.cancel()
+            for task in list(self._poll_tasks):
+                task.cancel()
+
+    def _add_target(self, method, variables, row_id, interval):
+        key = '{}:{}'.format(method, json.dumps(variables, sort_keys=True))
+        if key not in self.targets:
+            target = WatchTarget(key, method, dict(variables), ('TokenBalances', 'TokenBalance'),
+                                 row_id, interval or self.min_interval)
+            self.targets[key] = target
+            heapq.heappush(self._schedule, (target.next_poll_at, key))
+            if self._wakeup is not None:
+                self._wakeup.set()
+        return key
+
+    async def _run(self, queue):
+        import asyncio
+        semaphore = asyncio.Semaphore(self.max_concurrent_polls)
+        while not self._stopped:
+            if not self._schedule:
+                await self._sleep(None)
+                continue
+            due_at, key = self._schedule[0]
+            target = self.targets.get(key)
+            if target is None or due_at != target.next_poll_at:
+                heapq.heappop(self._schedule)
+                continue
+            delay = due_at - time.monotonic()
+            if delay > 0:
+                await self._sleep(delay)
+                continue
+            heapq.heappop(self._schedule)
+            await semaphore.acquire()
+            task = asyncio.ensure_future(self._poll(target, queue, semaphore))
+            self._poll_tasks.add(task)
+            task.add_done_callback(self._poll_tasks.discard)
+
+    async def _sleep(self, delay):
+        import asyncio
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _poll(self, target, queue, semaphore):
+        changed = False
+        try:
+            page_hashes, rows, error = await self._fetch_snapshot(target)
+            if not target.active:
+                return
+            self.polls += 1
+            if error is not None:
+                queue.put_nowait(ChangeEvent(target.key, [], [], [], error))
+            elif target.page_hashes is None:
+                target.page_hashes, target.rows = page_hashes, rows
+            elif page_hashes == target.page_hashes:
+                self.unchanged_polls += 1
+            else:
+                event = self._diff(target, rows)
+                target.page_hashes, target.rows = page_hashes, rows
+                changed = bool(event.added or event.removed or event.changed)
+                if changed:
+                    queue.put_nowait(event)
+        except Exception as exec:
+            queue.put_nowait(ChangeEvent(target.key, [], [], [], str(exec)))
+        finally:
+            semaphore.release()
+            # a failed or cancelled poll must not drop the target from the schedule
+            if target.active:
+                if changed:
+                    target.interval = max(self.min_interval, target.interval / 2)
+                else:
+                    target.interval = min(self.max_interval, target.interval * self.backoff)
+                target.next_poll_at = time.monotonic() + target.interval
+                heapq.heappush(self._schedule, (target.next_poll_at, target.key))
+                if self._wakeup is not None:
+                    self._wakeup.set()
+
+    async def _fetch_snapshot(self, target):
+        """Async function to fetch every page of a target
+
+        Returns:
+            Tuple: page hashes, row identity to (row hash, row json), error or None
+        """
+        queries = self.client.queries_object()
+        await self.budget.acquire()
+        self.requests += 1
+        query_response = await getattr(queries, target.method)(target.variables)
+        page_hashes, rows = [], {}
+        root, items = target.rows_path
+        while True:
+            if query_response.error is not None:
+                return None, None, query_response.error
+            page_rows = ((query_response.data or {}).get(root) or {}).get(items) or []
+            page_hash = hashlib.sha1()
+            for row in page_rows:
+                row_hash, text = _snapshot_row(row)
+                page_hash.update(row_hash.encode('ascii'))
+                rows[target.row_id(row)] = (row_hash, text)
+            page_hashes.append(page_hash.hexdigest())
+            if not query_response.has_next_page:
+                break
+            await self.budget.acquire()
+            self.requests += 1
+            query_response = await query_response.get_next_page
+        return page_hashes, rows, None
+
+    @staticmethod
+    def _diff(target, rows):
+        previous = target.rows
+        added = [json.loads(text) for row_key, (_row_hash, text) in rows.items()
+                 if row_key not in previous]
+        removed = [json.loads(text) for row_key, (_row_hash, text) in previous.items()
+                   if row_key not in rows]
+        changed = [(json.loads(previous[row_key][1]), json.loads(text))
+                   for row_key, (row_hash, text) in rows.items()
+                   if row_key in previous and previous[row_key][0] != row_hash]
+        return ChangeEvent(target.key, added, removed, changed)
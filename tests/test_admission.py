@@ -0,0 +1,48 @@
+import asyncio
+
+from airstack.admission import AdmissionQueue
+from airstack.constant import AirstackConstants
+from airstack.execute_query import AirstackClient
+from airstack.transport import CallableTransport
+
+
+async def slow_handler(url, headers, body):
+    await asyncio.sleep(0.01)
+    return {'data': {'Wallet': {'identity': 'a.eth'}}}
+
+
+def test_client_limits_are_opt_in():
+    async def run():
+        client = AirstackClient(api_key='key', transport=CallableTransport(slow_handler))
+        responses = await asyncio.gather(*[
+            client.create_execute_query_object(query='query { Wallet { identity } }')
+            .execute_query(validate=False) for _ in range(300)])
+        metrics = client.metrics()
+        await client.close()
+        return responses, metrics
+
+    responses, metrics = asyncio.run(run())
+    assert all(response.error is None for response in responses)
+    assert metrics['circuit_breaker'] is None
+    assert metrics['admission']['shed'] == 0
+    assert metrics['admission']['max_concurrency'] is None
+
+
+def test_bounded_queue_sheds_beyond_its_limits():
+    async def run():
+        admission = AdmissionQueue(max_concurrency=1, max_queue=1)
+        first = await admission.acquire()
+        second = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        third = await admission.acquire()
+        admission.release()
+        return first, await second, third, admission.shed
+
+    assert asyncio.run(run()) == (True, True, False, 1)
+
+
+def test_client_breaker_is_enabled_on_request():
+    client = AirstackClient(api_key='key', circuit_breaker=True, max_concurrency=2,
+                            max_queue=AirstackConstants.MAX_QUEUE)
+    assert client.circuit_breaker is not None
+    assert client.admission.max_concurrency == 2
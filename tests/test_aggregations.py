@@ -0,0 +1,17 @@
+from decimal import Decimal
+
+from airstack.aggregations import TopK, to_decimal
+
+
+def test_to_decimal_rejects_missing_invalid_and_non_finite_amounts():
+    for value in (None, '', 'abc', 'NaN', 'sNaN', 'Infinity', '-inf', float('nan')):
+        assert to_decimal(value) == Decimal(0)
+    assert to_decimal('1.50') == Decimal('1.50')
+    assert to_decimal(2) == Decimal(2)
+
+
+def test_top_k_survives_nan_amounts():
+    top = TopK('amount', k=2)
+    for amount in ('NaN', '5', 'sNaN', '7', '1'):
+        top.add({'amount': amount})
+    assert [row['amount'] for row in top.result()] == ['7', '5']
@@ -0,0 +1,39 @@
+import argparse
+import asyncio
+import io
+
+from airstack import cli
+from airstack.execute_query import AirstackClient
+
+
+def test_ndjson_line_numbers_match_the_input_file():
+    lines = ['{"id": "a", "method": "get_token_details"}\n', '\n',
+             'not json\n', '{"id": "b", "method": "get_token_details"}\n']
+    requests = list(cli.read_requests(lines, 'ndjson'))
+    assert [(request['line'], request['id']) for request in requests] == [
+        (1, 'a'), (3, None), (4, 'b')]
+    assert 'error' in requests[1]
+
+
+def test_csv_line_numbers_count_the_header():
+    lines = ['id,method\n', 'a,get_token_details\n', 'b,get_token_details\n']
+    requests = list(cli.read_requests(lines, 'csv'))
+    assert [(request['line'], request['id']) for request in requests] == [(2, 'a'), (3, 'b')]
+
+
+def test_run_closes_the_client(monkeypatch, tmp_path):
+    closed = []
+    close = AirstackClient.close
+
+    async def tracked_close(client):
+        closed.append(client)
+        await close(client)
+
+    monkeypatch.setattr(AirstackClient, 'close', tracked_close)
+    args = argparse.Namespace(
+        url=None, api_key='key', timeout=1, concurrency=1, requests_per_second=None,
+        mirror=str(tmp_path / 'mirror.db'), metadata_store=None, pages=1, retries=0,
+        retry_backoff=0, cache=False, progress=0, format='ndjson')
+    metrics = asyncio.run(cli.run(args, ['{"id": "a"}\n'], io.StringIO(), None))
+    assert metrics['errors'] == 1
+    assert len(closed) == 1
@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+from airstack.coordinator import Coordinator, CoordinatorServer
+
+BODY = '{"query": "query { Wallet { identity } }", "variables": null}'
+RESPONSE = ({'Wallet': {'identity': 'a.eth'}}, 200, None)
+
+
+def run_with_server(socket_path, scenario, **kwargs):
+    async def run():
+        server = CoordinatorServer(str(socket_path), **kwargs)
+        await server.start()
+        first, second = Coordinator(str(socket_path)), Coordinator(str(socket_path))
+        try:
+            return await asyncio.wait_for(scenario(server, first, second), 5)
+        finally:
+            await first.close()
+            await second.close()
+            await server.close()
+    return asyncio.run(run())
+
+
+def test_identical_requests_are_sent_once_for_the_host(tmp_path):
+    async def scenario(server, first, second):
+        sent = []
+        release = asyncio.Event()
+
+        async def send():
+            sent.append(1)
+            await release.wait()
+            return RESPONSE
+
+        owner = asyncio.ensure_future(first.send('key', BODY, send))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.ensure_future(second.send('key', BODY, send))
+        await asyncio.sleep(0.05)
+        release.set()
+        results = await asyncio.gather(owner, waiter)
+        cached = await second.send('key', BODY, send)
+        return sent, results, cached, second.metrics(), server.metrics()
+
+    sent, results, cached, metrics, server_metrics = run_with_server(
+        tmp_path / 'c.sock', scenario)
+    assert len(sent) == 1
+    assert results == [RESPONSE, RESPONSE]
+    assert cached == RESPONSE
+    assert metrics['shared'] == 1 and metrics['hits'] == 2
+    assert server_metrics['misses'] == 1 and server_metrics['shared'] == 1
+    assert server_metrics['in_flight'] == 0
+
+
+def test_failed_owner_hands_the_request_over(tmp_path):
+    async def scenario(server, first, second):
+        release = asyncio.Event()
+
+        async def failing_send():
+            await release.wait()
+            return None, 500, 'Internal Server Error'
+
+        async def send():
+            return RESPONSE
+
+        owner = asyncio.ensure_future(first.send('key', BODY, failing_send))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.ensure_future(second.send('key', BODY, send))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await owner, await waiter, second.metrics()
+
+    failed, result, metrics = run_with_server(tmp_path / 'c.sock', scenario)
+    assert failed == (None, 500, 'Internal Server Error')
+    assert result == RESPONSE
+    assert metrics['misses'] == 1
+
+
+def test_dropped_owner_hands_the_request_over(tmp_path):
+    async def scenario(server, first, second):
+        async def hanging_send():
+            await asyncio.sleep(60)
+
+        async def send():
+            return RESPONSE
+
+        owner = asyncio.ensure_future(first.send('key', BODY, hanging_send))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.ensure_future(second.send('key', BODY, send))
+        await asyncio.sleep(0.05)
+        # the owner process goes away without completing its request
+        await first.close()
+        result = await waiter
+        owner.cancel()
+        # answered after the complete message sent on the same connection
+        return result, await second.metrics_of_server()
+
+    result, server_metrics = run_with_server(tmp_path / 'c.sock', scenario)
+    assert result == RESPONSE
+    assert server_metrics['in_flight'] == 0
+
+
+def test_bucket_paces_every_process(tmp_path):
+    async def scenario(server, first, second):
+        started = time.monotonic()
+        await asyncio.gather(*[client.acquire() for client in (first, second) * 3])
+        return time.monotonic() - started, server.metrics()
+
+    elapsed, server_metrics = run_with_server(tmp_path / 'c.sock', scenario,
+                                              requests_per_second=50, burst=1)
+    assert server_metrics['granted'] == 6
+    assert elapsed >= 0.09
+
+
+def test_requests_are_sent_uncoordinated_without_the_sidecar(tmp_path):
+    async def run():
+        coordinator = Coordinator(str(tmp_path / 'missing.sock'))
+
+        async def send():
+            return RESPONSE
+
+        result = await coordinator.send('key', BODY, send)
+        await coordinator.close()
+        return result, coordinator.metrics()
+
+    result, metrics = asyncio.run(run())
+    assert result == RESPONSE
+    assert metrics['unavailable'] == 1
+
+
+def test_clients_share_requests_through_the_sidecar(tmp_path):
+    from airstack.execute_query import AirstackClient
+    from airstack.transport import CallableTransport
+    socket_path = str(tmp_path / 'c.sock')
+    bodies = []
+
+    async def handler(url, headers, body):
+        bodies.append(body)
+        await asyncio.sleep(0.05)
+        return {'data': RESPONSE[0]}
+
+    async def run():
+        server = CoordinatorServer(socket_path)
+        await server.start()
+        clients = [AirstackClient(api_key='key', transport=CallableTransport(handler),
+                                  coordinator=socket_path) for _ in range(2)]
+        try:
+            return await asyncio.gather(*[
+                client.create_execute_query_object(query='query { Wallet { identity } }')
+                .execute_query(validate=False) for client in clients])
+        finally:
+            for client in clients:
+                await client.close()
+            await server.close()
+
+    responses = asyncio.run(run())
+    assert len(bodies) == 1
+    assert [response.data for response in responses] == [RESPONSE[0], RESPONSE[0]]
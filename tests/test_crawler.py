@@ -0,0 +1,75 @@
+import asyncio
+import re
+
+from airstack.crawler import PartitionedCrawler
+from airstack.execute_query import AirstackClient
+from airstack.transport import CallableTransport
+
+CURSOR = re.compile(r'cursor:\s*"([^"]*)"')
+
+
+def holders(count, same_block=1):
+    return [{'owner': {'addresses': ['0x{:x}'.format(index)]}, 'tokenId': str(index),
+             'lastUpdatedBlock': 100 + index // same_block,
+             'lastUpdatedTimestamp': '2023-01-01T00:00:00Z'}
+            for index in range(count)]
+
+
+def serve(rows, requests):
+    async def handler(url, headers, body):
+        await asyncio.sleep(0.001)
+        variables = body['variables']
+        requests.append(variables)
+        if 'tokenIds' in variables:
+            selected = [row for row in rows if row['tokenId'] in variables['tokenIds']]
+        else:
+            selected = [row for row in rows
+                        if variables['from'] <= row['lastUpdatedBlock'] < variables['to']]
+        selected.sort(key=lambda row: row['lastUpdatedBlock'])
+        cursor = CURSOR.search(body['query'])
+        offset = int(cursor.group(1)) if cursor and cursor.group(1) else 0
+        limit = variables['limit']
+        page = selected[offset:offset + limit]
+        more = offset + limit < len(selected)
+        return {'data': {'TokenBalances': {
+            'TokenBalance': page,
+            'pageInfo': {'nextCursor': str(offset + limit) if more else '',
+                         'prevCursor': ''}}}}
+    return handler
+
+
+def crawl(rows, partition, start, end, **kwargs):
+    requests = []
+
+    async def run():
+        client = AirstackClient(api_key='key', transport=CallableTransport(serve(rows, requests)))
+        crawler = PartitionedCrawler(client, **kwargs)
+        try:
+            result = await crawler.crawl_holders(
+                {'tokenAddress': '0xab', 'blockchain': 'ethereum'}, start, end, partition)
+        finally:
+            await client.close()
+        return result, crawler
+
+    (result, error), crawler = asyncio.run(run())
+    return result, error, crawler, requests
+
+
+def test_block_partition_yields_every_row_once_after_splits():
+    # 25 rows per block, so the rows at a split point span several pages
+    rows = holders(400, same_block=25)
+    result, error, crawler, _ = crawl(rows, 'block', 100, 120, concurrency=4, shards=1,
+                                      limit=10)
+    assert error is None
+    assert crawler.splits > 0 and crawler.duplicates > 0
+    assert sorted(row['tokenId'] for row in result) == sorted(row['tokenId'] for row in rows)
+
+
+def test_token_partition_shards_by_token_id():
+    rows = holders(450)
+    result, error, crawler, requests = crawl(rows, 'token', 0, 450, concurrency=3, limit=100)
+    assert error is None
+    assert len(result) == 450
+    assert crawler.splits == 0 and crawler.duplicates == 0
+    shards = {tuple(variables['tokenIds']) for variables in requests}
+    assert sorted(len(shard) for shard in shards) == [50, 200, 200]
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from airstack.constant import AirstackConstants
+from airstack.deadline import Deadline, build_timeout
+from airstack.execute_query import AirstackClient
+from airstack.transport import CallableTransport
+
+QUERY = 'query Q { Wallet(input: {identity: "vitalik.eth", blockchain: ethereum}) { identity } }'
+
+
+def test_timeout_capped_by_deadline():
+    timeout = build_timeout(total=30, deadline=Deadline(0.5))
+    assert 0 < timeout.total <= 0.5
+
+
+def test_expired_deadline_never_gives_zero_timeout():
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    timeout = build_timeout(total=30, deadline=deadline)
+    assert timeout.total == AirstackConstants.DEADLINE_MIN_TIMEOUT
+
+
+def test_expired_deadline_is_not_sent():
+    calls = []
+
+    def handler(url, headers, body):
+        calls.append(body)
+        return {'data': {'Wallet': {'identity': 'vitalik.eth'}}}
+
+    async def run():
+        client = AirstackClient(api_key='key', transport=CallableTransport(handler))
+        deadline = Deadline(0.01)
+        await asyncio.sleep(0.02)
+        query_object = client.create_execute_query_object(QUERY, deadline=deadline)
+        query_response = await query_object.execute_query()
+        await client.close()
+        return query_response
+
+    query_response = asyncio.run(run())
+    assert query_response.error == AirstackConstants.DEADLINE_EXCEEDED_ERROR
+    assert calls == []
+
+
+def test_request_within_deadline():
+    def handler(url, headers, body):
+        return {'data': {'Wallet': {'identity': 'vitalik.eth'}}}
+
+    async def run():
+        client = AirstackClient(api_key='key', transport=CallableTransport(handler))
+        query_object = client.create_execute_query_object(QUERY, deadline=5)
+        query_response = await query_object.execute_query()
+        await client.close()
+        return query_response
+
+    query_response = asyncio.run(run())
+    assert query_response.error is None
+    assert query_response.data == {'Wallet': {'identity': 'vitalik.eth'}}
@@ -0,0 +1,49 @@
+from airstack.entity_store import EntityStore, selected_fields
+
+KEY = EntityStore.token_key('ethereum', '0xab')
+
+
+def balances(project_details):
+    return {'TokenBalances': {'TokenBalance': [{
+        'blockchain': 'ethereum', 'tokenAddress': '0xAB',
+        'token': {'name': 'X', 'projectDetails': project_details}}]}}
+
+
+def test_responses_are_not_shared():
+    store = EntityStore()
+    first = balances({'imageUrl': 'i'})
+    second = balances({'imageUrl': 'i', 'discordUrl': 'd'})
+    store.normalize(first)
+    store.normalize(second)
+    first_token = first['TokenBalances']['TokenBalance'][0]['token']
+    second_token = second['TokenBalances']['TokenBalance'][0]['token']
+    assert first_token is not second_token
+    assert first_token['projectDetails'] == {'imageUrl': 'i'}
+    first_token['name'] = 'changed'
+    assert store.lookup(KEY, ['name']) == {'name': 'X'}
+
+
+def test_lookup_needs_nested_fields():
+    store = EntityStore()
+    store.normalize(balances({'imageUrl': 'i'}))
+    fields = ('name', ('projectDetails', ('imageUrl', 'discordUrl')))
+    assert store.lookup(KEY, fields) is None
+    store.normalize(balances({'discordUrl': 'd'}))
+    assert store.lookup(KEY, fields) == {
+        'name': 'X', 'projectDetails': {'imageUrl': 'i', 'discordUrl': 'd'}}
+
+
+def test_lookup_returns_a_copy():
+    store = EntityStore()
+    store.normalize(balances({'imageUrl': 'i'}))
+    selection = store.lookup(KEY, ('name', ('projectDetails', ('imageUrl',))))
+    selection['projectDetails']['imageUrl'] = 'changed'
+    assert store.lookup(KEY, (('projectDetails', ('imageUrl',)),)) == {
+        'projectDetails': {'imageUrl': 'i'}}
+
+
+def test_selected_fields():
+    root, fields = selected_fields(
+        'query Q { Token(input: {}) { name projectDetails { imageUrl } } }')
+    assert root == 'Token'
+    assert fields == ('name', ('projectDetails', ('imageUrl',)))
@@ -0,0 +1,82 @@
+import json
+import random
+
+from airstack.holder_index import HolderIndex, RoaringBitmap
+
+
+def rows(owner, token_ids, amount='1'):
+    return [{'owner': {'addresses': [owner]}, 'tokenId': token_id, 'amount': amount}
+            for token_id in token_ids]
+
+
+def test_roaring_bitmap_set_operations():
+    random.seed(1)
+    left_ids = set(random.sample(range(300000), 20000)) | set(range(70000, 76000))
+    right_ids = set(random.sample(range(300000), 20000)) | set(range(72000, 80000))
+    left, right = RoaringBitmap(left_ids), RoaringBitmap(right_ids)
+    assert len(left) == len(left_ids)
+    assert list(left & right) == sorted(left_ids & right_ids)
+    assert list(left | right) == sorted(left_ids | right_ids)
+    assert list(left - right) == sorted(left_ids - right_ids)
+    assert RoaringBitmap.decode(left.encode()) == left
+    for value in list(left_ids)[:5000]:
+        left.discard(value)
+    assert list(left) == sorted(list(left_ids)[5000:])
+
+
+def test_memory_follows_holders_not_ids():
+    bitmap = RoaringBitmap([10 ** 9])
+    assert bitmap.memory() == 2
+    assert 10 ** 9 in bitmap and 10 ** 9 + 1 not in bitmap
+
+
+def test_holder_cleared_once_every_token_is_gone():
+    index = HolderIndex()
+    index.apply_balances('c', rows('0xA', ['1', '2']) + rows('0xB', ['3']))
+    assert index.count('c') == 2
+    index.apply_balances('c', rows('0xa', ['1'], '0'))
+    assert index.holds('c', '0xA')
+    index.apply_balances('c', rows('0xa', ['2'], '0'))
+    assert not index.holds('c', '0xA')
+    assert index.holders('c') == ['0xb']
+
+
+def test_shared_token_and_fungible_rows():
+    index = HolderIndex()
+    index.apply_balances('nft', rows('0xA', ['1']) + rows('0xB', ['1']))
+    index.apply_balances('nft', rows('0xA', ['1'], '0'))
+    assert index.holders('nft') == ['0xb']
+    index.apply_balances('erc20', rows('0xA', [None], '5') + rows('0xB', [None], '1'))
+    index.apply_balances('erc20', rows('0xB', [None], '0'))
+    assert index.holders('erc20') == ['0xa']
+    assert index.intersection('nft', 'erc20') == []
+    assert sorted(index.union('nft', 'erc20')) == ['0xa', '0xb']
+    assert index.difference('erc20', 'nft') == ['0xa']
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'index.json')
+    index = HolderIndex(path)
+    index.apply_balances('c', rows('0xA', ['1', '2']) + rows('0xB', ['1']))
+    index.save()
+    loaded = HolderIndex(path)
+    assert loaded.holders('c') == index.holders('c')
+    loaded.apply_balances('c', rows('0xA', ['1'], '0'))
+    assert loaded.holds('c', '0xA')
+
+
+def test_load_previous_format(tmp_path):
+    path = tmp_path / 'index.json'
+    path.write_text(json.dumps({'addresses': ['0xa', '0xb'], 'collections': {
+        'c': {'bitmap': '', 'positions': [[0, ['1']], [1, [None]]], 'bloom': None}}}))
+    index = HolderIndex(str(path))
+    assert index.holders('c') == ['0xa', '0xb']
+
+
+def test_bloom_created_after_holders():
+    index = HolderIndex()
+    index.apply_balances('c', rows('0xA', ['1']))
+    index.bloom = True
+    index.apply_balances('c', rows('0xB', ['2']))
+    assert index.holds('c', '0xA') and index.holds('c', '0xB')
+    assert not index.holds('c', '0xC')
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+
+from airstack.execute_query import AirstackClient
+from airstack.metadata_store import MetadataStore
+from airstack.transport import CallableTransport
+
+
+def test_put_and_get(tmp_path):
+    store = MetadataStore(str(tmp_path))
+    key = store.make_key('get_token_details', 'ethereum', '0xAB')
+    store.put(key, {'Token': {'name': 'X'}})
+    assert store.get(key) == {'Token': {'name': 'X'}}
+    assert store.get(store.make_key('get_token_details', 'ethereum', '0xcd')) is None
+    store.close()
+
+
+def test_eviction_keeps_latest_write(tmp_path):
+    store = MetadataStore(str(tmp_path), max_bytes=200)
+    for index in range(20):
+        store.put('key{}'.format(index), {'index': index, 'pad': 'x' * 30})
+    assert store.get('key19') == {'index': 19, 'pad': 'x' * 30}
+    assert 0 < store.stats()['live_bytes'] <= 200
+    store.close()
+
+
+def test_ttl(tmp_path):
+    store = MetadataStore(str(tmp_path))
+    store.put('key', {'a': 1}, ttl=-1)
+    assert store.get('key') is None
+    store.close()
+
+
+def test_threads_share_a_store(tmp_path):
+    store = MetadataStore(str(tmp_path))
+    errors = []
+
+    def work(worker):
+        try:
+            for index in range(50):
+                store.put('{}:{}'.format(worker, index), {'value': index})
+                assert store.get('{}:{}'.format(worker, index)) == {'value': index}
+        except Exception as exec:  # pragma: no cover - reported below
+            errors.append(exec)
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert store.stats()['entries'] == 200
+    store.close()
+
+
+def test_token_details_served_from_store(tmp_path):
+    calls = []
+
+    def handler(url, headers, body):
+        calls.append(body)
+        return {'data': {'Token': {'name': 'X', 'address': '0xab',
+                                   'blockchain': 'ethereum'}}}
+
+    async def run():
+        client = AirstackClient(api_key='key', transport=CallableTransport(handler),
+                                metadata_store=str(tmp_path))
+        queries = client.queries_object()
+        variables = {'address': '0xAB', 'blockchain': 'ethereum'}
+        first = await queries.get_token_details(variables)
+        second = await queries.get_token_details(variables)
+        await client.close()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.data == second.data
+    assert len(calls) == 1
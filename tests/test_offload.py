@@ -0,0 +1,51 @@
+import asyncio
+import pickle
+
+import pytest
+
+from airstack.execute_query import AirstackClient
+from airstack.offload import PageData, decode_page
+from airstack.transport import CallableTransport
+
+QUERY = """
+query Balances {
+  TokenBalances(input: {filter: {owner: {_eq: "a.eth"}}, blockchain: ethereum, limit: 1}) {
+    TokenBalance { amount }
+    pageInfo { nextCursor prevCursor }
+  }
+}
+"""
+
+
+def handler(url, headers, body):
+    return {'data': {'TokenBalances': {'TokenBalance': [{'amount': '1'}],
+                                       'pageInfo': {'nextCursor': 'n', 'prevCursor': ''}}}}
+
+
+def test_decode_page_finds_page_info_in_the_worker():
+    body = b'{"data": {"A": {"pageInfo": {"nextCursor": "n"}}}}'
+    decoded = pickle.loads(pickle.dumps(decode_page(body)))
+    assert isinstance(decoded['data'], PageData)
+    assert decoded['data'].page_info == {'A': {'nextCursor': 'n'}}
+    assert decode_page(b'not json') == 'not json'
+
+
+def test_large_pages_are_decoded_and_flattened_off_the_loop():
+    async def run():
+        client = AirstackClient(api_key='key', transport=CallableTransport(handler),
+                                executor='thread', offload_threshold=0, monitor_loop_lag=True)
+        query_response = await client.create_execute_query_object(
+            query=QUERY).execute_paginated_query()
+        query_response.get_next_page.close()
+        query_response.get_prev_page.close()
+        offloaded = client.offloader.offloaded
+        await client.close()
+        return client, query_response, offloaded
+
+    client, query_response, offloaded = asyncio.run(run())
+    assert isinstance(query_response.data, PageData)
+    assert query_response.has_next_page and not query_response.has_prev_page
+    assert offloaded == 1
+    assert client.loop_lag._task is None
+    with pytest.raises(RuntimeError):
+        client.offloader.executor.submit(print)
@@ -0,0 +1,28 @@
+from airstack.constant import AirstackConstants
+from airstack.execute_query import QueryResponse
+from airstack.query_cost import merge_responses
+
+ERROR = {'message': 'Invalid address'}
+
+
+def test_chunks_are_merged():
+    assert merge_responses([QueryResponse({'a': 1}, 200, None),
+                            QueryResponse({'b': 2}, 200, None)]) == ({'a': 1, 'b': 2}, 200, None)
+
+
+def test_partial_errors_keep_the_unsplit_shape():
+    data, status_code, error = merge_responses([
+        QueryResponse({'a': 1}, 200, None),
+        QueryResponse({'data': {'b': None}, 'errors': [ERROR]}, 200, [ERROR])])
+    assert data == {'data': {'a': 1, 'b': None}, 'errors': [ERROR]}
+    assert status_code == 200
+    assert error == [ERROR]
+
+
+def test_first_failed_chunk_fails_the_query():
+    responses = [QueryResponse({'a': 1}, 200, None),
+                 QueryResponse(None, 429, 'Too Many Requests'),
+                 QueryResponse(None, None, AirstackConstants.TIMEOUT_ERROR),
+                 QueryResponse({'b': 2}, 200, None)]
+    assert merge_responses(responses) == (None, 429, 'Too Many Requests')
+    assert merge_responses(responses[2:]) == (None, None, AirstackConstants.TIMEOUT_ERROR)
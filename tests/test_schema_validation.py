@@ -0,0 +1,42 @@
+from graphql import build_ast_schema, parse
+
+from airstack.schema_validation import SchemaValidator
+
+SCHEMA = build_ast_schema(parse("""
+type Token {
+    name: String
+    totalSupply: String
+}
+
+type Query {
+    Token(address: String!, limit: Int): Token
+}
+
+schema {
+    query: Query
+}
+"""))
+
+QUERY = 'query Q($a: String!, $l: Int) { Token(address: $a, limit: $l) { name } }'
+
+
+def test_valid_query():
+    assert SchemaValidator(SCHEMA).validate(QUERY, {'a': 'x', 'l': 3}) is None
+
+
+def test_unknown_field():
+    errors = SchemaValidator(SCHEMA).validate(QUERY.replace('name', 'symbol'), {'a': 'x'})
+    assert len(errors) == 1
+    assert 'symbol' in errors[0]['message']
+
+
+def test_missing_required_variable():
+    errors = SchemaValidator(SCHEMA).validate(QUERY, {'l': 3})
+    assert len(errors) == 1
+    assert '$a' in errors[0]['message']
+
+
+def test_wrong_typed_variable():
+    errors = SchemaValidator(SCHEMA).validate(QUERY, {'a': 'x', 'l': 'abc'})
+    assert len(errors) == 1
+    assert set(errors[0]) == {'message'}
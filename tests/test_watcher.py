@@ -0,0 +1,27 @@
+import asyncio
+
+from airstack.watcher import Watcher
+
+
+def test_failed_poll_is_reported_and_rescheduled():
+    watcher = Watcher(client=None, min_interval=0.01, max_interval=0.01)
+    calls = []
+
+    async def fetch_snapshot(target):
+        calls.append(target.key)
+        if len(calls) == 1:
+            raise RuntimeError('boom')
+        if len(calls) == 3:
+            watcher.stop()
+        return [], {}, None
+
+    watcher._fetch_snapshot = fetch_snapshot
+    key = watcher.watch_wallet({'identity': 'a.eth'})
+
+    async def run():
+        return [event async for event in watcher.events()]
+
+    events = asyncio.run(asyncio.wait_for(run(), 5))
+    assert [(event.key, event.error) for event in events] == [(key, 'boom')]
+    assert len(calls) == 3
+    assert watcher.polls == 2